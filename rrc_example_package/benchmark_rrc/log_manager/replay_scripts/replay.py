@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 
 import os
-import shelve
 import argparse
+import multiprocessing
+import subprocess
 import robot_fingers
 import trifinger_simulation
 import pybullet as p
@@ -15,21 +16,23 @@ from trifinger_cameras.utils import convert_image
 from scipy.spatial.transform import Rotation as R
 import cv2
 import json
+from env.log_store import load_store
 
 
 def load_data(path):
-    data = {}
+    """Load the custom logs stored in ``<logdir>/custom_data``.
+
+    Column tables are memory-mapped, see :mod:`env.log_store`.
+    """
     try:
-        with shelve.open(path) as f:
-            for key, val in f.items():
-                data[key] = val
+        return load_store(path)
     except Exception:
         return {}
-    return data
 
 
 class SphereMarker:
-    def __init__(self, radius, position, color=(0, 1, 0, 0.5)):
+    def __init__(self, radius, position, color=(0, 1, 0, 0.5),
+                 pybullet_client_id=0):
         """
         Create a sphere marker for visualization
 
@@ -38,16 +41,20 @@ class SphereMarker:
             position: Position (x, y, z)
             orientation: Orientation as quaternion (x, y, z, w)
             color: Color of the cube as a tuple (r, b, g, q)
+            pybullet_client_id: Id of the pybullet client
             """
+        self._pybullet_client_id = pybullet_client_id
         self.shape_id = p.createVisualShape(
             shapeType=p.GEOM_SPHERE,
             radius=radius,
             rgbaColor=color,
+            physicsClientId=self._pybullet_client_id,
         )
         self.body_id = p.createMultiBody(
             baseVisualShapeIndex=self.shape_id,
             basePosition=position,
             baseOrientation=[0, 0, 0, 1],
+            physicsClientId=self._pybullet_client_id,
         )
 
     def set_state(self, position):
@@ -58,7 +65,8 @@ class SphereMarker:
         """
         orientation = [0, 0, 0, 1]
         p.resetBasePositionAndOrientation(
-            self.body_id, position, orientation
+            self.body_id, position, orientation,
+            physicsClientId=self._pybullet_client_id,
         )
 
     def __del__(self):
@@ -67,13 +75,15 @@ class SphereMarker:
         """
         # At this point it may be that pybullet was already shut down. To avoid
         # an error, only remove the object if the simulation is still running.
-        if p.isConnected():
-            p.removeBody(self.body_id)
+        if p.isConnected(physicsClientId=self._pybullet_client_id):
+            p.removeBody(self.body_id,
+                         physicsClientId=self._pybullet_client_id)
 
 
 class VisualCubeOrientation:
     '''visualize cube orientation by three cylinder'''
-    def __init__(self, cube_position, cube_orientation, cube_halfwidth=0.0325):
+    def __init__(self, cube_position, cube_orientation, cube_halfwidth=0.0325,
+                 pybullet_client_id=0):
         self.markers = []
         self.cube_halfwidth = cube_halfwidth
 
@@ -103,7 +113,8 @@ class VisualCubeOrientation:
                                length=cube_halfwidth*2,
                                position=cube_position + bias,
                                orientation=orientation,
-                               color=color)
+                               color=color,
+                               pybullet_client_id=pybullet_client_id)
             )
 
     def set_state(self, position, orientation):
@@ -120,7 +131,8 @@ class CylinderMarker:
     """Visualize a cylinder."""
 
     def __init__(
-        self, radius, length, position, orientation, color=(0, 1, 0, 0.5)):
+        self, radius, length, position, orientation, color=(0, 1, 0, 0.5),
+        pybullet_client_id=0):
         """
         Create a cylinder marker for visualization
 
@@ -130,18 +142,21 @@ class CylinderMarker:
             position: Position (x, y, z)
             orientation: Orientation as quaternion (x, y, z, w)
             color: Color of the cube as a tuple (r, b, g, q)
+            pybullet_client_id: Id of the pybullet client
         """
-
+        self._pybullet_client_id = pybullet_client_id
         self.shape_id = p.createVisualShape(
             shapeType=p.GEOM_CYLINDER,
             radius=radius,
             length=length,
-            rgbaColor=color
+            rgbaColor=color,
+            physicsClientId=self._pybullet_client_id,
         )
         self.body_id = p.createMultiBody(
             baseVisualShapeIndex=self.shape_id,
             basePosition=position,
-            baseOrientation=orientation
+            baseOrientation=orientation,
+            physicsClientId=self._pybullet_client_id,
         )
 
     def set_state(self, position, orientation):
@@ -154,7 +169,8 @@ class CylinderMarker:
         p.resetBasePositionAndOrientation(
             self.body_id,
             position,
-            orientation
+            orientation,
+            physicsClientId=self._pybullet_client_id,
         )
 
 
@@ -181,75 +197,93 @@ class CubeDrawer:
         return images
 
 
-class VideoRecorder:
-    def __init__(self, fps, image_size=(270, 270)):
-        self.fps = fps
+class SimCameraViews:
+    """Render the views of the simulated cameras and an additional top view."""
+
+    def __init__(self, image_size=(270, 270), pybullet_client_id=0,
+                 renderer=p.ER_BULLET_HARDWARE_OPENGL):
         self.image_size = image_size
-        self.frame_size = None
-        self.cameras = camera.TriFingerCameras(image_size=image_size)
+        self.renderer = renderer
+        self._pybullet_client_id = pybullet_client_id
+        self.cameras = camera.TriFingerCameras(
+            image_size=image_size, pybullet_client_id=pybullet_client_id)
         self._add_new_camera()
-        self.frames = []
 
     def _add_new_camera(self):
         self.cameras.cameras.append(
             camera.Camera(
                 camera_position=[0.0, 0.0, 0.24],
-                camera_orientation=p.getQuaternionFromEuler((0, np.pi, 0))
+                camera_orientation=p.getQuaternionFromEuler((0, np.pi, 0)),
+                pybullet_client_id=self._pybullet_client_id,
             )
         )
 
     def get_views(self):
-        images = [cam.get_image() for cam in self.cameras.cameras]
+        images = [cam.get_image(renderer=self.renderer)
+                  for cam in self.cameras.cameras]
         three_views = np.concatenate((*images,), axis=1)
         return three_views
 
-    def capture_frame(self):
-        three_views = self.get_views()
-        self.add_frame(three_views)
-        return three_views
 
-    def add_frame(self, frame):
-        if self.frame_size is None:
-            self.frame_size = frame.shape[:2]
-        assert frame.shape[:2] == self.frame_size
-        self.frames.append(frame)
-
-    def save_video(self, filepath):
-        out = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*'XVID'),
-                              self.fps, (self.frame_size[1], self.frame_size[0]))
-        for frame in self.frames:
-            out.write(frame)
-        out.release()
+class FFmpegWriter:
+    """Encode frames by piping raw BGR images to an ffmpeg process.
 
+    Frames are not kept in memory, the encoder runs in parallel to the
+    rendering.
+    """
 
-def get_synced_log_data(logdir, goal, difficulty):
-    log = robot_fingers.TriFingerPlatformLog(os.path.join(logdir, "robot_data.dat"),
-                                             os.path.join(logdir, "camera_data.dat"))
-    log_camera = tricamera.LogReader(os.path.join(logdir, "camera_data.dat"))
-    stamps = log_camera.timestamps
+    def __init__(self, filepath, fps, codec='mpeg4', quality=2):
+        self.filepath = filepath
+        self.fps = fps
+        self.codec = codec
+        self.quality = quality
+        self.frame_size = None
+        self._process = None
+
+    def _start(self, frame_size):
+        height, width = frame_size
+        self._process = subprocess.Popen(
+            ['ffmpeg', '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+             '-s', '{}x{}'.format(width, height), '-r', str(self.fps),
+             '-i', '-',
+             '-c:v', self.codec, '-q:v', str(self.quality),
+             self.filepath],
+            stdin=subprocess.PIPE,
+        )
 
-    obs = {'robot': [], 'cube': [], 'images': [], 't': [], 'desired_action': [],
-           'stamp': [], 'acc_reward': []}
-    ind = 0
-    acc_reward = 0.0
-    for t in range(log.get_first_timeindex(), log.get_last_timeindex()):
-        camera_observation = log.get_camera_observation(t)
-        acc_reward -= move_cube.evaluate_state(
-            move_cube.Pose(**goal), camera_observation.filtered_object_pose,
-            difficulty
+    def write(self, frame):
+        if self.frame_size is None:
+            self.frame_size = frame.shape[:2]
+            self._start(self.frame_size)
+        assert frame.shape[:2] == self.frame_size
+        self._process.stdin.write(
+            np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+
+    def close(self):
+        if self._process is None:
+            return
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError('ffmpeg failed to encode {}'.format(
+                self.filepath))
+        self._process = None
+
+
+def concat_videos(segment_paths, video_path):
+    """Concatenate video segments without re-encoding."""
+    list_file = video_path + '.segments.txt'
+    with open(list_file, 'w') as f:
+        for path in segment_paths:
+            f.write("file '{}'\n".format(os.path.abspath(path)))
+    try:
+        subprocess.run(
+            ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat',
+             '-safe', '0', '-i', list_file, '-c', 'copy', video_path],
+            check=True,
         )
-        if 1000 * log.get_timestamp_ms(t) >= stamps[ind]:
-            robot_observation = log.get_robot_observation(t)
-            obs['robot'].append(robot_observation)
-            obs['cube'].append(camera_observation.filtered_object_pose)
-            obs['images'].append([convert_image(camera.image)
-                                  for camera in camera_observation.cameras])
-            obs['desired_action'].append(log.get_desired_action(t))
-            obs['acc_reward'].append(acc_reward)
-            obs['t'].append(t)
-            obs['stamp'].append(log.get_timestamp_ms(t))
-            ind += 1
-    return obs
+    finally:
+        os.remove(list_file)
 
 
 def get_goal(logdir):
@@ -274,67 +308,204 @@ def vstack_frames(frames):
         )
     return np.concatenate(padded_frames, axis=0)
 
-def main(logdir, video_path):
-    goal, difficulty = get_goal(logdir)
-    data = get_synced_log_data(logdir, goal, difficulty)
-    fps = len(data['t']) / (data['stamp'][-1] - data['stamp'][0])
-    video_recorder = VideoRecorder(fps)
+def get_synced_steps(logdir, goal, difficulty):
+    """Get time indices of the camera frames and the accumulated reward.
+
+    Robot observations and images are not loaded, so the result can be split
+    into segments which are rendered independently (see
+    :func:`render_segment`).
+
+    Returns:
+        List of tuples ``(t, acc_reward)`` and list of the timestamps.
+    """
+    log = robot_fingers.TriFingerPlatformLog(os.path.join(logdir, "robot_data.dat"),
+                                             os.path.join(logdir, "camera_data.dat"))
+    log_camera = tricamera.LogReader(os.path.join(logdir, "camera_data.dat"))
+    stamps = log_camera.timestamps
+    goal_pose = move_cube.Pose(**goal)
+
+    steps = []
+    frame_stamps = []
+    ind = 0
+    acc_reward = 0.0
+    for t in range(log.get_first_timeindex(), log.get_last_timeindex()):
+        camera_observation = log.get_camera_observation(t)
+        acc_reward -= move_cube.evaluate_state(
+            goal_pose, camera_observation.filtered_object_pose, difficulty
+        )
+        if ind < len(stamps) and 1000 * log.get_timestamp_ms(t) >= stamps[ind]:
+            steps.append((t, acc_reward))
+            frame_stamps.append(log.get_timestamp_ms(t))
+            ind += 1
+    return steps, frame_stamps
+
+
+def _connect_headless_renderer(pybullet_client_id):
+    """Try to enable hardware rendering without GUI.
+
+    Returns:
+        The renderer to be used for camera images.
+    """
+    try:
+        import pkgutil
+        egl = pkgutil.get_loader('eglRenderer')
+        plugin = p.loadPlugin(egl.get_filename(), "_eglRendererPlugin",
+                              physicsClientId=pybullet_client_id)
+        if plugin >= 0:
+            return p.ER_BULLET_HARDWARE_OPENGL
+    except Exception:
+        pass
+    return p.ER_TINY_RENDERER
+
+
+def render_frame(platform, sim_views, cube_drawer, marker_cube_ori,
+                 t, acc_reward, robot_observation, cube_pose, images,
+                 desired_action):
+    """Render one comparison frame (desired, observed, real, real + cube)."""
+    platform.simfinger.reset_finger_positions_and_velocities(desired_action.position)
+    platform.cube.set_state(cube_pose.position, cube_pose.orientation)
+    marker_cube_ori.set_state(cube_pose.position, cube_pose.orientation)
+    frame_desired = sim_views.get_views()
+    frame_desired = cv2.cvtColor(frame_desired, cv2.COLOR_RGB2BGR)
+    platform.simfinger.reset_finger_positions_and_velocities(robot_observation.position)
+    frame_observed = sim_views.get_views()
+    frame_observed = cv2.cvtColor(frame_observed, cv2.COLOR_RGB2BGR)
+    frame_real = np.concatenate(images, axis=1)
+    frame_real_cube = np.concatenate(cube_drawer.add_cube(images, cube_pose),
+                                     axis=1)
+
+    frame = vstack_frames((frame_desired, frame_observed, frame_real, frame_real_cube))
+    # add text
+    frame = add_text(frame, text="step: {:06d}".format(t), position=(10, 40))
+    frame = add_text(frame, text="acc reward: {:.3f}".format(acc_reward), position=(10, 70))
+    frame = add_text(
+        frame,
+        text="tip force {}".format(
+            np.array2string(robot_observation.tip_force, precision=3),
+        ),
+        position=(10, 100),
+    )
+    return frame
+
+
+def render_segment(logdir, goal, steps, fps, video_path, visualization=False):
+    """Render the frames of the given steps and encode them to a video file.
+
+    Every call uses its own pybullet client, so segments can be rendered in
+    parallel processes.
+
+    Args:
+        logdir: Path to the log directory.
+        goal: Goal pose (dict with "position" and "orientation").
+        steps: List of ``(t, acc_reward)`` tuples of the frames to render.
+        fps: Frame rate of the video.
+        video_path: Output video file.
+        visualization: If true, the pybullet GUI is used for rendering.
+    """
+    log = robot_fingers.TriFingerPlatformLog(os.path.join(logdir, "robot_data.dat"),
+                                             os.path.join(logdir, "camera_data.dat"))
     cube_drawer = CubeDrawer(logdir)
 
-    initial_object_pose = move_cube.Pose(data['cube'][0].position,
-                                         data['cube'][0].orientation)
+    initial_cube = log.get_camera_observation(steps[0][0]).filtered_object_pose
+    initial_object_pose = move_cube.Pose(initial_cube.position,
+                                         initial_cube.orientation)
     platform = trifinger_simulation.TriFingerPlatform(
-        visualization=True,
+        visualization=visualization,
         initial_object_pose=initial_object_pose,
     )
-    markers = []
-    marker_cube_ori = VisualCubeOrientation(data['cube'][0].position,
-                                            data['cube'][0].orientation)
-    marker_goal_ori = VisualCubeOrientation(goal['position'], goal['orientation'])
-
+    client_id = platform.simfinger._pybullet_client_id
+    if visualization:
+        renderer = p.ER_BULLET_HARDWARE_OPENGL
+        p.configureDebugVisualizer(p.COV_ENABLE_GUI, 0,
+                                   physicsClientId=client_id)
+        p.resetDebugVisualizerCamera(cameraDistance=0.6, cameraYaw=0,
+                                     cameraPitch=-40,
+                                     cameraTargetPosition=[0, 0, 0],
+                                     physicsClientId=client_id)
+    else:
+        renderer = _connect_headless_renderer(client_id)
+
+    sim_views = SimCameraViews(pybullet_client_id=client_id,
+                               renderer=renderer)
+    marker_cube_ori = VisualCubeOrientation(initial_cube.position,
+                                            initial_cube.orientation,
+                                            pybullet_client_id=client_id)
+    marker_goal_ori = VisualCubeOrientation(goal['position'], goal['orientation'],
+                                            pybullet_client_id=client_id)
     visual_objects.CubeMarker(
         width=0.065,
         position=goal['position'],
-        orientation=goal['orientation']
+        orientation=goal['orientation'],
+        pybullet_client_id=client_id,
     )
 
-    p.configureDebugVisualizer(p.COV_ENABLE_GUI, 0)
-    p.resetDebugVisualizerCamera(cameraDistance=0.6, cameraYaw=0, cameraPitch=-40, cameraTargetPosition=[0,0,0])
-
-    for i, t in enumerate(data['t']):
-        platform.simfinger.reset_finger_positions_and_velocities(data['desired_action'][i].position)
-        platform.cube.set_state(data['cube'][i].position, data['cube'][i].orientation)
-        marker_cube_ori.set_state(data['cube'][i].position, data['cube'][i].orientation)
-        frame_desired = video_recorder.get_views()
-        frame_desired = cv2.cvtColor(frame_desired, cv2.COLOR_RGB2BGR)
-        platform.simfinger.reset_finger_positions_and_velocities(data['robot'][i].position)
-        frame_observed = video_recorder.get_views()
-        frame_observed = cv2.cvtColor(frame_observed, cv2.COLOR_RGB2BGR)
-        frame_real = np.concatenate(data['images'][i], axis=1)
-        frame_real_cube = np.concatenate(cube_drawer.add_cube(data['images'][i],
-                                                              data['cube'][i]),
-                                         axis=1)
-
-        frame = vstack_frames((frame_desired, frame_observed, frame_real, frame_real_cube))
-        # frame = np.concatenate((frame_desired, frame_observed,
-        #                         frame_real, frame_real_cube), axis=0)
-        # add text
-        frame = add_text(frame, text="step: {:06d}".format(t), position=(10, 40))
-        frame = add_text(frame, text="acc reward: {:.3f}".format(data["acc_reward"][i]), position=(10, 70))
-        frame = add_text(
-            frame,
-            text="tip force {}".format(
-                np.array2string(data["robot"][i].tip_force, precision=3),
-            ),
-            position=(10, 100),
-        )
-        video_recorder.add_frame(frame)
-    video_recorder.save_video(video_path)
+    writer = FFmpegWriter(video_path, fps)
+    try:
+        for t, acc_reward in steps:
+            camera_observation = log.get_camera_observation(t)
+            images = [convert_image(camera.image)
+                      for camera in camera_observation.cameras]
+            frame = render_frame(
+                platform, sim_views, cube_drawer, marker_cube_ori,
+                t, acc_reward,
+                log.get_robot_observation(t),
+                camera_observation.filtered_object_pose,
+                images,
+                log.get_desired_action(t),
+            )
+            writer.write(frame)
+    finally:
+        writer.close()
+    return video_path
+
+
+def split_steps(steps, n_segments):
+    """Split the list of steps into at most n_segments contiguous ranges."""
+    n_segments = max(1, min(n_segments, len(steps)))
+    bounds = np.linspace(0, len(steps), n_segments + 1).astype(int)
+    return [steps[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def main(logdir, video_path, n_workers=None):
+    """Render a comparison video of the log in ``logdir``.
+
+    The episode is split into time ranges which are rendered by ``n_workers``
+    headless worker processes (defaults to the number of CPUs).  Each worker
+    encodes its range to a segment file which are concatenated in the end.
+    """
+    goal, difficulty = get_goal(logdir)
+    steps, stamps = get_synced_steps(logdir, goal, difficulty)
+    fps = len(steps) / (stamps[-1] - stamps[0])
+
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    segments = split_steps(steps, n_workers)
+    if len(segments) == 1:
+        render_segment(logdir, goal, steps, fps, video_path)
+        return
+
+    base, ext = os.path.splitext(video_path)
+    segment_paths = ['{}.part{:03d}{}'.format(base, i, ext)
+                     for i in range(len(segments))]
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(len(segments)) as pool:
+        pool.starmap(render_segment, [
+            (logdir, goal, segment, fps, path)
+            for segment, path in zip(segments, segment_paths)
+        ])
+    try:
+        concat_videos(segment_paths, video_path)
+    finally:
+        for path in segment_paths:
+            if os.path.exists(path):
+                os.remove(path)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("logdir", help="path to the log directory")
     parser.add_argument("video_path", help="video file to save (.avi file)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of rendering processes (default: number of CPUs)")
     args = parser.parse_args()
-    main(args.logdir, args.video_path)
+    main(args.logdir, args.video_path, args.workers)
@@ -12,11 +12,13 @@ import torch
 import sys
 # sys.path.append("../")
 import pickle as pkl
+import time
 
 from botorch.models import SingleTaskGP
 from botorch.fit import fit_gpytorch_model
-from botorch.acquisition import ExpectedImprovement
+from botorch.acquisition import ExpectedImprovement, qExpectedImprovement
 from botorch.optim import optimize_acqf
+from botorch.optim.initializers import gen_batch_initial_conditions
 from gpytorch.mlls import ExactMarginalLogLikelihood
 from gpytorch.constraints import GreaterThan
 
@@ -31,9 +33,10 @@ from distutils.spawn import find_executable
 
 from utils.functionality import run_param_rollout_real, run_param_rollout
 from utils.functionality import push_github, modify_and_push_json
+from utils.local_executor import LocalRolloutExecutor, run_param_rollouts_local
 from utils.sampling_functions import define_sample_fct
 
-from const import SIMULATION, GITHUB_BRANCH, DIFFICULTY_LEVEL, SAMPLE_FCT, NUM_INIT_SAMPLES, NUM_ROLLOUTS_PER_SAMPLE, NUM_ITERATIONS, NUM_ACQ_RESTARTS, ACQ_SAMPLES
+from const import SIMULATION, GITHUB_BRANCH, DIFFICULTY_LEVEL, SAMPLE_FCT, NUM_INIT_SAMPLES, NUM_ROLLOUTS_PER_SAMPLE, NUM_ITERATIONS, NUM_ACQ_RESTARTS, ACQ_SAMPLES, ACQ_BATCH_SIZE, USE_LOCAL_EXECUTOR, GP_REFIT_EVERY, ACQ_WARM_START_CANDIDATES, NUM_ACQ_RESTARTS_WARM
 from utils import normalization_tools
 
 logger = logging.getLogger(__file__)
@@ -66,17 +69,45 @@ class GaussianProcess(object):
         self.param_normalizer = param_normalizer
         self.data_normalizer = normalization_tools.Standardizer()
         self.gp = None
+        self.num_train = 0
 
-    def fit(self, x_train, y_train):
+    def fit(self, x_train, y_train, refit=True):
+        """Fit the GP to the training data.
+
+        If refit is False and the data only got extended since the last call,
+        the GP is conditioned on the new observations without optimizing the
+        hyperparameters again (the normalization of the data is kept as well).
+        Otherwise the hyperparameters are optimized, starting from the ones of
+        the previous fit.
+        """
         # normalize parameter (=input) data
         x_train_norm = self.param_normalizer.project_to(x_train)
+
+        if (not refit and self.gp is not None and x_train.shape[0] > self.num_train):
+            x_new_norm = x_train_norm[self.num_train:]
+            y_new_norm = self.data_normalizer.standardize_wo_calculation(y_train[self.num_train:])
+            self.gp.eval()
+            # the prediction caches have to exist before conditioning
+            with torch.no_grad():
+                self.gp.posterior(x_new_norm)
+            self.gp = self.gp.condition_on_observations(x_new_norm, y_new_norm)
+            self.num_train = x_train.shape[0]
+            return self.gp
+
         # normalize the data
         y_train_norm = self.data_normalizer.standardize(y_train)
 
+        previous_gp = self.gp
         self.gp = SingleTaskGP(x_train_norm, y_train_norm)
         self.gp.likelihood.noise_covar.register_constraint("raw_noise", GreaterThan(1e-5))
+        if previous_gp is not None:
+            # warm start from the previous hyperparameters
+            hyperparameters = {k: v for k, v in previous_gp.state_dict().items()
+                               if not k.startswith(('outcome_transform', 'input_transform'))}
+            self.gp.load_state_dict(hyperparameters, strict=False)
         mll = ExactMarginalLogLikelihood(self.gp.likelihood, self.gp)
         fit_gpytorch_model(mll)
+        self.num_train = x_train.shape[0]
         return self.gp
 
     def predict(self, x):
@@ -95,6 +126,18 @@ class GaussianProcess(object):
 def to_tensor(x):
     return torch.from_numpy(x).float()
 
+def initial_conditions(acq, bounds, q, num_restarts, raw_samples, previous_candidates=None):
+    """Initial conditions for optimize_acqf, reusing previous candidates.
+
+    The first restarts are started from the best candidates of the previous
+    iteration, the remaining ones are generated from random raw samples.
+    """
+    ics = gen_batch_initial_conditions(acq, bounds, q=q, num_restarts=num_restarts, raw_samples=raw_samples)
+    if previous_candidates is not None:
+        n = min(previous_candidates.shape[0], num_restarts)
+        ics[:n] = previous_candidates[:n]
+    return ics
+
 def update_data(idx, x_train, y_train, x_bank, y_bank):
     indexes = [*range(x_bank.shape[0])]
     indexes.pop(idx)
@@ -229,8 +272,11 @@ class RRC_v1(object):
 
     param_normalizer = normalization_tools.UnitCubeProjector(x_min,x_max)
 
+    # LocalRolloutExecutor used to run the rollouts in simulation (optional)
+    executor = None
+
     @staticmethod
-    def function(x,path,globcount,run_eval):
+    def function(x,path,globcount,run_eval,executor=None):
         if True:
             # create directory for this run
             if (run_eval):
@@ -240,6 +286,17 @@ class RRC_v1(object):
                 input("Copy files now,..")
 
             result = np.zeros((np.shape(x)[0],1))
+            if (SIMULATION and run_eval and executor is not None):
+                # evaluate all parameters at once with the local workers,...
+                paths_curr_params = []
+                for i in range(np.shape(x)[0]):
+                    path_curr_params = (path) + str(globcount) + '/' + str(i) + '/'
+                    os.makedirs(path_curr_params)
+                    with open((path_curr_params+'params.pkl'),'wb') as f:
+                        pkl.dump(np.asarray(x[i,:]),f)
+                    paths_curr_params.append(path_curr_params)
+                return run_param_rollouts_local(executor, x, globcount, str(path+'pos.pkl'), paths_curr_params)
+
             # for very parameter run the evaluation,...
             for i in range(np.shape(x)[0]):
                 path_curr_params = (path) + str(globcount) + '/' + str(i) + '/'
@@ -264,7 +321,7 @@ class RRC_v1(object):
 
     def __call__(self, x, path, globcount=None, run_eval=True):
         #noise_std = 0.
-        return self.function(x,path,globcount,run_eval) #+ noise_std * np.random.randn(*x.shape)
+        return self.function(x,path,globcount,run_eval,self.executor) #+ noise_std * np.random.randn(*x.shape)
 
     def x_sample(self, n=1):
         return np.random.uniform(self.x_min, self.x_max, (n, self.d_x)).reshape((n, self.d_x))
@@ -334,6 +391,9 @@ def main(args, res_dir):
         x_bounds = to_tensor(x_vert)
         y_bounds = to_tensor(y_vert)
     globcount_thres = -1
+    if (SIMULATION and USE_LOCAL_EXECUTOR and hasattr(task, 'executor')):
+        # persistent simulation workers, shared by all iterations
+        task.executor = LocalRolloutExecutor()
     for s in range(args.n_seeds):
         with open(logging_txt_file,"w") as f:
             f.write("SEED: " + str(s) + '\n')
@@ -368,9 +428,14 @@ def main(args, res_dir):
 
         logger.info("seed iter best opt | y_chosen | y_optimal")
 
+        # best candidates of the last acquisition (normalized) used as initial conditions
+        previous_candidates = None
+
         # Bayesian Optimization Loop
         for i in tqdm(range(task.num_iter), total=task.num_iter):
-            _model = model.fit(X_train, y_train)
+            t_start = time.perf_counter()
+            _model = model.fit(X_train, y_train, refit=(i % GP_REFIT_EVERY == 0))
+            t_fit = time.perf_counter()
 
             # # FROM FABIO:
             # # Acquisition functions
@@ -394,19 +459,31 @@ def main(args, res_dir):
             #     raw_samples=self.acq_samples,
             # )
 
-            acq = ExpectedImprovement(_model, best_f=model.data_normalizer.standardize_wo_calculation(y_train).max().item(), maximize=True)
+            best_f = model.data_normalizer.standardize_wo_calculation(y_train).max().item()
+            if (ACQ_BATCH_SIZE == 1):
+                acq = ExpectedImprovement(_model, best_f=best_f, maximize=True)
+            else:
+                # SEE DOCS: Expected imrpovement only supports q=1 -> use the Monte-Carlo version for batches
+                acq = qExpectedImprovement(_model, best_f=best_f)
 
             # Optimize acquisition function
-            # q represents addidional points to sample
-            # SEE DOCS: Expected imrpovement only supports q=1
-            candidate, acq_value = optimize_acqf(
+            # q represents addidional points to sample (evaluated in parallel)
+            acq_bounds = torch.stack([torch.zeros(np.shape(task.param_normalizer.bound_lo)[0]), torch.ones(np.shape(task.param_normalizer.bound_lo)[0])]).to(dtype=torch.float32).to(TORCH_DEVICE)
+            num_restarts = task.num_acq_restarts if previous_candidates is None else NUM_ACQ_RESTARTS_WARM
+            candidates, acq_values = optimize_acqf(
                 acq_function=acq,
-                bounds=torch.stack([torch.zeros(np.shape(task.param_normalizer.bound_lo)[0]), torch.ones(np.shape(task.param_normalizer.bound_lo)[0])]).to(dtype=torch.float32).to(TORCH_DEVICE),
-                q=1,
-                num_restarts=task.num_acq_restarts,
-                raw_samples=task.num_acq_samples
+                bounds=acq_bounds,
+                q=ACQ_BATCH_SIZE,
+                num_restarts=num_restarts,
+                raw_samples=task.num_acq_samples,
+                batch_initial_conditions=initial_conditions(acq, acq_bounds, ACQ_BATCH_SIZE, num_restarts, task.num_acq_samples, previous_candidates),
+                return_best_only=False
             )
+            order = torch.argsort(acq_values.view(-1), descending=True)
+            previous_candidates = candidates[order[:ACQ_WARM_START_CANDIDATES]].detach()
+            candidate, acq_value = candidates[order[0]], acq_values[order[0]]
             candidate = model.param_normalizer.project_back(candidate)
+            t_acq = time.perf_counter()
 
 
             with torch.no_grad():
@@ -418,7 +495,8 @@ def main(args, res_dir):
                     y_new = to_tensor(task(x_new.cpu().numpy(), reference_path, globcount, run_eval=True)).to(
                         TORCH_DEVICE)
                 globcount += 1
-                y_est_m, y_est_v = model.predict(x_new.view(1, -1).to(TORCH_DEVICE))
+                t_rollout = time.perf_counter()
+                y_est_m, y_est_v = model.predict(x_new.view(-1, task.d_x).to(TORCH_DEVICE))
                 y_opt_m, y_opt_v = model.predict(to_tensor(task.x_opt).view(1, -1).to(TORCH_DEVICE))
                 y_opt_est[s, i] = y_opt_m.cpu().numpy()
 
@@ -429,11 +507,15 @@ def main(args, res_dir):
 
                 # Update best observed value list
                 y_history[s, i+1] = y_train.max().item()
-                logger.info(f"{s:2} {i+1:3} {y_history[s, i+1]:.4f} {y_opt:.4f} | {np.asscalar(y_est_m.cpu().numpy()):.4f}+/-{np.asscalar(torch.sqrt(y_est_v).cpu().numpy()):.4f} | {np.asscalar(y_opt_m.cpu().numpy()):.4f}+/-{np.asscalar(torch.sqrt(y_opt_v).cpu().numpy()):.4f}")
+                y_est_s = torch.sqrt(y_est_v).view(-1)
+                for j in range(x_new.shape[0]):
+                    logger.info(f"{s:2} {i+1:3} {y_history[s, i+1]:.4f} {y_opt:.4f} | {y_est_m[j].item():.4f}+/-{y_est_s[j].item():.4f} | {y_opt_m.item():.4f}+/-{torch.sqrt(y_opt_v).item():.4f}")
                 with open(logging_txt_file, "a") as f:
                     f.write("iteration: " + str(globcount) + '\n')
                     f.write("max val: " + str(y_train.max().item()) + '\n')
                     f.write("params:  " + str(X_train[y_train.argmax().item(), :].tolist()) + '\n')
+                    f.write(f"time fit: {t_fit - t_start:.2f}s acq: {t_acq - t_fit:.2f}s rollouts: {t_rollout - t_acq:.2f}s (n_train={X_train.shape[0]})\n")
+                logger.info(f"{s:2} {i+1:3} time fit {t_fit - t_start:.2f}s | acq {t_acq - t_fit:.2f}s | rollouts {t_rollout - t_acq:.2f}s")
 
 
                 if task.plot_model and args.plot:
@@ -463,6 +545,9 @@ def main(args, res_dir):
                         bbox_inches='tight', format='png')
                     plt.close(f)
 
+    if getattr(task, 'executor', None) is not None:
+        task.executor.shutdown()
+
     save_metrics(y_history, y_opt, y_opt_est, res_dir)
 
 
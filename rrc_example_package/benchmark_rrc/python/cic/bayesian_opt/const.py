@@ -12,9 +12,15 @@ SAMPLE_FCT = 'sample_lift_w_orientations_directions'#'sample_rot_ground_directio
 NUM_INIT_SAMPLES = 4
 NUM_ROLLOUTS_PER_SAMPLE = 4
 NUM_LOCAL_THREADS = 15 # only has an effect when running in simulation
+USE_LOCAL_EXECUTOR = True # run simulated rollouts in a pool of local worker processes instead of one container per rollout
+MAX_ROLLOUT_RETRIES = 3 # number of times a failed rollout is restarted by the local executor
 NUM_ITERATIONS = 50
 NUM_ACQ_RESTARTS = 500
 ACQ_SAMPLES = 1000
+NUM_ACQ_RESTARTS_WARM = 100 # restarts once the best candidates of the previous iteration are reused
+ACQ_WARM_START_CANDIDATES = 10 # number of previous candidates used as initial conditions of the acquisition
+GP_REFIT_EVERY = 5 # optimize the GP hyperparameters every n iterations, only condition on new data in between
+ACQ_BATCH_SIZE = 1 # number of candidates (q) proposed per BO iteration; q > 1 uses qExpectedImprovement
 
 EPISODE_LEN_SIM = 25000
 EPISODE_LEN_REAL = 60000
@@ -9,16 +9,29 @@ import json
 
 """Functions for sampling, validating and evaluating "move cube" goals."""
 import json
-import pickle as pkl
 
 import numpy as np
 from scipy.spatial.transform import Rotation
 
+from env.log_store import load_table
+
 
 
 _ARENA_RADIUS = 0.195
 _max_height = 0.1
 
+def load_cube_poses(logdir):
+    """Load the observed cube positions and orientations of a simulated run.
+
+    The observations are memory-mapped from the log store written by the
+    environment (see :mod:`env.log_store`).
+    """
+    observations = load_table(os.path.join(logdir, 'custom_data'),
+                              'observations')
+    return (observations['achieved_goal/position'],
+            observations['achieved_goal/orientation'])
+
+
 def todegree(w):
     return w*180/np.pi
 
@@ -180,16 +193,14 @@ def compute_reward_rot_lift(logdir, simulation):
 
     else:
         min_length = 10000#45000 #less since less rate
-        path = os.path.join(logdir, 'observations.pkl')
-        with open(path, 'rb') as handle:
-            observations = pkl.load(handle)
+        cube_positions, cube_orientations = load_cube_poses(logdir)
         reward = 0.0
         ex_state = move_cube.sample_goal(difficulty=-1)
         count = 0
-        for i in range(indice,len(observations)):
+        for i in range(indice,len(cube_positions)):
             count += 1
-            ex_state.position = observations[i]["achieved_goal"]["position"]
-            ex_state.orientation = observations[i]["achieved_goal"]["orientation"]
+            ex_state.position = cube_positions[i]
+            ex_state.orientation = cube_orientations[i]
             reward -= reward_rot_lift(
                 goal_pose, ex_state, difficulty
 
@@ -234,16 +245,14 @@ def compute_reward_rot_ground(logdir, simulation):
 
     else:
         min_length = 10000#45000 #less since less rate
-        path = os.path.join(logdir, 'observations.pkl')
-        with open(path, 'rb') as handle:
-            observations = pkl.load(handle)
+        cube_positions, cube_orientations = load_cube_poses(logdir)
         reward = 0.0
         ex_state = move_cube.sample_goal(difficulty=-1)
         count = 0
-        for i in range(indice,len(observations)):
+        for i in range(indice,len(cube_positions)):
             count += 1
-            ex_state.position = observations[i]["achieved_goal"]["position"]
-            ex_state.orientation = observations[i]["achieved_goal"]["orientation"]
+            ex_state.position = cube_positions[i]
+            ex_state.orientation = cube_orientations[i]
             reward -= evaluate_state_orientation(
                 goal_pose, ex_state, difficulty
 
@@ -289,16 +298,14 @@ def compute_reward_18(logdir, simulation):
 
     else:
         min_length = 10000
-        path = os.path.join(logdir, 'observations.pkl')
-        with open(path, 'rb') as handle:
-            observations = pkl.load(handle)
+        cube_positions, cube_orientations = load_cube_poses(logdir)
         reward = 0.0
         count = 0
         ex_state = move_cube.sample_goal(difficulty=-1)
-        for i in range(len(observations)):
+        for i in range(len(cube_positions)):
             count += 1
-            ex_state.position = observations[i]["achieved_goal"]["position"]
-            ex_state.orientation = observations[i]["achieved_goal"]["orientation"]
+            ex_state.position = cube_positions[i]
+            ex_state.orientation = cube_orientations[i]
             reward -= evaluate_state(
                 goal_pose, ex_state, difficulty
 
@@ -343,16 +350,14 @@ def compute_reward_adaptive(logdir, simulation, TOTALTIMESTEPS):
 
     else:
         min_length = TOTALTIMESTEPS
-        path = os.path.join(logdir, 'observations.pkl')
-        with open(path, 'rb') as handle:
-            observations = pkl.load(handle)
+        cube_positions, cube_orientations = load_cube_poses(logdir)
         reward = 0.0
         count = 0
         ex_state = move_cube.sample_goal(difficulty=-1)
-        for i in range(len(observations)):
+        for i in range(len(cube_positions)):
             count += 1
-            ex_state.position = observations[i]["achieved_goal"]["position"]
-            ex_state.orientation = observations[i]["achieved_goal"]["orientation"]
+            ex_state.position = cube_positions[i]
+            ex_state.orientation = cube_orientations[i]
             reward -= evaluate_state(
                 goal_pose, ex_state, difficulty
 
@@ -397,16 +402,14 @@ def compute_reward_adaptive_ORIENT(logdir, simulation, TOTALTIMESTEPS):
 
     else:
         min_length = TOTALTIMESTEPS
-        path = os.path.join(logdir, 'observations.pkl')
-        with open(path, 'rb') as handle:
-            observations = pkl.load(handle)
+        cube_positions, cube_orientations = load_cube_poses(logdir)
         reward = 0.0
         count = 0
         ex_state = move_cube.sample_goal(difficulty=-1)
-        for i in range(len(observations)):
+        for i in range(len(cube_positions)):
             count += 1
-            ex_state.position = observations[i]["achieved_goal"]["position"]
-            ex_state.orientation = observations[i]["achieved_goal"]["orientation"]
+            ex_state.position = cube_positions[i]
+            ex_state.orientation = cube_orientations[i]
             reward -= evaluate_state(
                 goal_pose, ex_state, difficulty
 
@@ -452,16 +455,14 @@ def compute_reward_adaptive_behind(logdir, simulation, TOTALTIMESTEPS):
 
     else:
         min_length = TOTALTIMESTEPS
-        path = os.path.join(logdir, 'observations.pkl')
-        with open(path, 'rb') as handle:
-            observations = pkl.load(handle)
+        cube_positions, cube_orientations = load_cube_poses(logdir)
         reward = 0.0
         count = 0
         ex_state = move_cube.sample_goal(difficulty=-1)
-        for i in range(len(observations)-TOTALTIMESTEPS-1,len(observations)):
+        for i in range(len(cube_positions)-TOTALTIMESTEPS-1,len(cube_positions)):
             count += 1
-            ex_state.position = observations[i]["achieved_goal"]["position"]
-            ex_state.orientation = observations[i]["achieved_goal"]["orientation"]
+            ex_state.position = cube_positions[i]
+            ex_state.orientation = cube_orientations[i]
             reward -= evaluate_state(
                 goal_pose, ex_state, difficulty
 
@@ -493,14 +494,12 @@ def compute_reward(logdir, simulation):
             )
         return reward, True
     else:
-        path = os.path.join(logdir, 'observations.pkl')
-        with open(path, 'rb') as handle:
-            observations = pkl.load(handle)
+        cube_positions, cube_orientations = load_cube_poses(logdir)
         reward = 0.0
         ex_state = move_cube.sample_goal(difficulty=-1)
-        for i in range(len(observations)):
-            ex_state.position = observations[i]["achieved_goal"]["position"]
-            ex_state.orientation = observations[i]["achieved_goal"]["orientation"]
+        for i in range(len(cube_positions)):
+            ex_state.position = cube_positions[i]
+            ex_state.orientation = cube_orientations[i]
             reward -= evaluate_state(
                 goal_pose, ex_state, difficulty
 
@@ -508,6 +507,43 @@ def compute_reward(logdir, simulation):
         return reward, True
 
 
+DECISION_FUNCTIONS = {
+    'standart': compute_reward,
+    'standart_18': compute_reward_18,
+    'rot_lift': compute_reward_rot_lift,
+    'rot_ground': compute_reward_rot_ground,
+    'standart_15': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 15000),
+    'standart_11': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 11000),
+    'standart_10': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 10000),
+    'standart_20': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 20000),
+    'standart_30': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 30000),
+    'standart_40': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 40000),
+    'standart_ORIENT_40': lambda logdir, sim: compute_reward_adaptive_ORIENT(logdir, sim, 40000),
+    'standart_45': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 45000),
+    'standart_50': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 50000),
+    'standart_60': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 60000),
+    'standart_70': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 70000),
+    'standart_behind_10': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 10000),
+    'standart_behind_15': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 15000),
+    'standart_behind_20': lambda logdir, sim: compute_reward_adaptive(logdir, sim, 20000),
+}
+
+
+def evaluate_run(logdir, simulation, decision_function):
+    """Compute the reward of a run and store it in ``<logdir>/reward.json``.
+
+    Returns:
+        Tuple (reward, valid).
+    """
+    reward, valid_eval = 0, False
+    if decision_function in DECISION_FUNCTIONS:
+        reward, valid_eval = DECISION_FUNCTIONS[decision_function](logdir, simulation)
+
+    with open(os.path.join(logdir, 'reward.json'), 'w') as f:
+        json.dump({'reward': reward, 'valid': int(valid_eval)}, f)
+    return reward, valid_eval
+
+
 if __name__ == '__main__':
     # we assume those 4 input args,...
     #simulation, path, decision_function
@@ -517,47 +553,4 @@ if __name__ == '__main__':
     parser.add_argument("decisionfunction", help="path to the log directory")
     args = parser.parse_args()
 
-    valid_eval = False
-    if (args.decisionfunction=='standart'):
-        reward, valid_eval = compute_reward(args.logdir, args.simulation)
-    elif (args.decisionfunction=='standart_18'):
-        reward, valid_eval = compute_reward_18(args.logdir, args.simulation)
-    elif (args.decisionfunction=='rot_lift'):
-        reward, valid_eval = compute_reward_rot_lift(args.logdir, args.simulation)
-    elif (args.decisionfunction == 'rot_ground'):
-        reward, valid_eval = compute_reward_rot_ground(args.logdir, args.simulation)
-    elif (args.decisionfunction == 'standart_15'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,15000)
-    elif (args.decisionfunction == 'standart_11'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,11000)
-    elif (args.decisionfunction == 'standart_10'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,10000)
-    elif (args.decisionfunction == 'standart_20'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,20000)
-    elif (args.decisionfunction == 'standart_30'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,30000)
-    elif (args.decisionfunction == 'standart_40'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,40000)
-    elif (args.decisionfunction == 'standart_ORIENT_40'):
-        reward, valid_eval = compute_reward_adaptive_ORIENT(args.logdir, args.simulation,40000)
-    elif (args.decisionfunction == 'standart_45'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,45000)
-    elif (args.decisionfunction == 'standart_50'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,50000)
-    elif (args.decisionfunction == 'standart_60'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,60000)
-    elif (args.decisionfunction == 'standart_70'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation,70000)
-    elif (args.decisionfunction == 'standart_behind_10'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation, 10000)
-    elif (args.decisionfunction == 'standart_behind_15'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation, 15000)
-    elif (args.decisionfunction == 'standart_behind_20'):
-        reward, valid_eval = compute_reward_adaptive(args.logdir, args.simulation, 20000)
-
-        compute_reward_adaptive_behind
-
-
-
-    with open(os.path.join(args.logdir, 'reward.json'), 'w') as f:
-        json.dump({'reward': reward, 'valid': int(valid_eval)}, f)
\ No newline at end of file
+    evaluate_run(args.logdir, args.simulation, args.decisionfunction)
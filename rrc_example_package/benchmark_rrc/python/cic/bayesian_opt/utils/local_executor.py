@@ -0,0 +1,174 @@
+"""Run simulated BO rollouts in a pool of persistent local worker processes.
+
+Instead of starting one container per rollout and polling the output
+directories (see :func:`utils.functionality.run_param_rollout`), the episodes
+are run directly in worker processes which stay alive for the whole
+optimization, so the simulation stack only has to be imported once per
+worker.  Results are returned through futures and failed rollouts (e.g.
+crashed workers or invalid runs) are restarted automatically.
+
+This requires that the BO is started in an environment in which the
+simulation stack is installed (e.g. inside of the singularity image).
+"""
+import functools
+import json
+import multiprocessing
+import os
+import pickle as pkl
+import shutil
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+sys.path.append("../")
+from const import DIFFICULTY_LEVEL, EVALUATE_TRAJ, NUM_LOCAL_THREADS, MAX_ROLLOUT_RETRIES
+
+# directory containing the packages env, mp and cic
+PYTHON_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+
+def _init_worker(python_root):
+    if python_root not in sys.path:
+        sys.path.append(python_root)
+    # import the simulation stack once when the worker is started
+    from cic.bayesian_opt.utils import run_local_episode_bo, evaluate_trajectory  # noqa: F401
+
+
+def _run_rollout(bo_params, init_information, difficulty, output_path, decision_function):
+    """Run one episode in a worker and return (valid, reward)."""
+    from cic.bayesian_opt.utils import run_local_episode_bo, evaluate_trajectory
+
+    if os.path.exists(output_path):
+        shutil.rmtree(output_path)
+    os.makedirs(output_path)
+
+    run_local_episode_bo.run_episode(difficulty, init_information, bo_params, output_path)
+    reward, valid = evaluate_trajectory.evaluate_run(output_path, 1, decision_function)
+    return bool(valid), float(reward)
+
+
+class LocalRolloutExecutor(object):
+    """Pool of persistent worker processes evaluating BO parameters.
+
+    Args:
+        n_workers: Number of worker processes, i.e. rollouts run in parallel.
+        max_retries: How often a failed rollout is restarted before the error
+            is passed on to the future returned by :meth:`submit`.
+    """
+
+    def __init__(self, n_workers=NUM_LOCAL_THREADS, max_retries=MAX_ROLLOUT_RETRIES):
+        self.n_workers = n_workers
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._pool = self._make_pool()
+
+    def _make_pool(self):
+        return ProcessPoolExecutor(max_workers=self.n_workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker,
+                                   initargs=(PYTHON_ROOT,))
+
+    def submit(self, bo_params, init_information, output_path):
+        """Start a rollout with the given parameters and initial/goal pose.
+
+        Args:
+            bo_params: The parameters to be optimized.
+            init_information: Column of the position file.
+            output_path: Directory to which the logs of the run are written.
+                It is recreated if it already exists.
+
+        Returns:
+            Future resolving to the reward of the rollout.
+        """
+        result = Future()
+        result.set_running_or_notify_cancel()
+        args = (np.asarray(bo_params, dtype=float),
+                np.asarray(init_information, dtype=float),
+                DIFFICULTY_LEVEL, output_path, EVALUATE_TRAJ)
+        self._attempt(result, args, 0)
+        return result
+
+    def _attempt(self, result, args, n_failed):
+        try:
+            with self._lock:
+                pool = self._pool
+                future = pool.submit(_run_rollout, *args)
+        except Exception as e:
+            result.set_exception(e)
+            return
+        future.add_done_callback(
+            functools.partial(self._on_done, result, args, n_failed, pool))
+
+    def _on_done(self, result, args, n_failed, pool, future):
+        error = future.exception()
+        if error is None:
+            valid, reward = future.result()
+            if valid:
+                result.set_result(reward)
+                return
+            error = RuntimeError('Rollout in {} is not valid'.format(args[3]))
+
+        if isinstance(error, BrokenProcessPool):
+            # a worker died (e.g. the simulation crashed), all other pending
+            # runs of the pool fail as well and are restarted in a new pool
+            with self._lock:
+                if self._pool is pool:
+                    pool.shutdown(wait=False)
+                    self._pool = self._make_pool()
+
+        if n_failed >= self.max_retries:
+            result.set_exception(error)
+            return
+        print("RUN NOT FINISHED -> STARTING AGAIN ({})".format(error))
+        self._attempt(result, args, n_failed + 1)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def run_param_rollouts_local(executor, x, iter, initial_pos_path, general_paths):
+    """Evaluate several parameter vectors at once with the local executor.
+
+    All rollouts of all parameter vectors are submitted at once, so the
+    workers stay busy until the last one is finished.
+
+    Args:
+        executor: The :class:`LocalRolloutExecutor`.
+        x: Array of shape (n, d_x) with one parameter vector per row.
+        iter: Index of the BO iteration.
+        initial_pos_path: Path to the position file (one column per rollout).
+        general_paths: List with the result directory of each parameter
+            vector.
+
+    Returns:
+        Array of shape (n, 1) with the mean reward of each parameter vector.
+    """
+    with open(initial_pos_path, 'rb') as f:
+        arr = pkl.load(f)
+    num_runs = np.shape(arr)[1]
+
+    futures = []
+    for i in range(np.shape(x)[0]):
+        futures.append([
+            executor.submit(x[i, :], arr[:, j], general_paths[i] + str(iter) + '_output_' + str(j))
+            for j in range(num_runs)
+        ])
+
+    result = np.zeros((len(futures), 1))
+    for i, runs in enumerate(futures):
+        resulting_rewards = np.asarray([f.result() for f in runs])
+        with open(general_paths[i] + str(iter) + '_rew.txt', 'a') as f:
+            f.write("Mean reward " + str(np.mean(resulting_rewards)) + '\n')
+            f.write(json.dumps(resulting_rewards.tolist()))
+        result[i, :] = np.mean(resulting_rewards)
+    return result
@@ -65,15 +65,29 @@ def main():
 
     print ("The current index is : " + str(curr_idx))
     init_information = np.asarray(init_arr_params[:, curr_idx], dtype=float)
+
+    print ("The specified goal is: ", init_information[7:10])
+    print ("The parameters to be optimized are: " + str(bo_params))
+
+    run_episode(difficulty, init_information, bo_params, output_path)
+
+
+def run_episode(difficulty, init_information, bo_params, output_path):
+    """Run one episode with the given BO parameters and log to output_path.
+
+    Args:
+        difficulty: Difficulty level of the goal.
+        init_information: Column of the position file (initial pose and goal
+            of the cube).
+        bo_params: The parameters to be optimized.
+        output_path: Existing directory to which the logs are written.
+    """
     # Override goal pose:
     goal_pose_json = json.dumps({
         'position': init_information[7:10].tolist(),
         'orientation': init_information[10:14].tolist()
     })
 
-    print ("The specified goal is: ", init_information[7:10])
-    print ("The parameters to be optimized are: " + str(bo_params))
-
     # TODO: here: manipulate the params such that the right ones are optimized,...
 
     env = _init_env(goal_pose_json, difficulty, path=output_path)
@@ -111,6 +125,7 @@ def main():
 
         action = state_machine(obs)
         obs, _, done, _ = env.step(action)
+    env.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+'''
+Benchmark of the low-level controller computations of TriFingerKin.
+
+Runs the computations of one control step of the grasp primitives (impedance control of the three
+fingers and the additional forces/torques on the object) for random configurations, once with the
+cached kinematic state and once with the previous implementation which recomputed the jacobians in
+every call and inverted the stacked 36x36 matrices. Both results are checked to be equal.
+
+Usage: python3 -m cic.benchmark_kinematics [--steps N]
+'''
+import argparse
+import os
+import time
+
+import numpy as np
+import pinocchio as pin
+
+from cic.control_main_class import TriFingerKin
+
+
+class LegacyTriFingerKin(TriFingerKin):
+    '''Previous implementation without cached kinematic state (for comparison only).'''
+
+    def imp_ctrl(self, q, force_dir, joint_id, vel, pos, v, K_xy, K_z):
+        q = self.trafo_q(q)
+        v = self.trafo_q(v)
+        m = 1.0
+        d_xy = np.sqrt(4 * m * 500)
+        d_z = np.sqrt(4 * m * 500)
+        M_inv = np.linalg.pinv(np.eye(3) * m)
+        D = np.diag([d_xy, d_xy, d_z])
+        K = np.diag([K_xy, K_xy, K_z])
+        F = 0.01
+        M_joint = pin.crba(self.model, self.data, q)
+        acc = np.matmul(M_inv, (F * force_dir - np.matmul(K, pos) - np.matmul(D, vel)))
+        pin.computeJointJacobiansTimeVariation(self.model, self.data, q, v)
+        J_var_frame = pin.getJointJacobianTimeVariation(self.model, self.data, joint_id, pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3, :]
+        acc = acc - np.matmul(J_var_frame, v)
+        pin.computeJointJacobians(self.model, self.data, q)
+        J = pin.getJointJacobian(self.model, self.data, joint_id, pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3, :]
+        J_inv = np.matmul(np.linalg.pinv(np.matmul(J.T, J)), J.T)
+        return self.inv_trafo_q(np.matmul(M_joint, np.matmul(J_inv, acc)))
+
+    def _stacked_maps(self, q, in_touch, transform=None):
+        q = self.trafo_q(q)
+        pin.computeJointJacobians(self.model, self.data, q)
+        J_trans_inv_mat = np.zeros((3, 3 * 12))
+        for i in range(3):
+            if (in_touch[i] == 1):
+                idx = i * 4 + 4
+                J = pin.getJointJacobian(self.model, self.data, idx, pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3, :]
+                J_trans_inv = np.matmul(np.linalg.pinv(np.matmul(J, J.T)), J)
+                if transform is not None:
+                    J_trans_inv = np.matmul(transform[i], J_trans_inv)
+                J_trans_inv_mat[:, (idx - 4) * 3:idx * 3] = J_trans_inv
+        return J_trans_inv_mat
+
+    def _solve_stacked(self, J_trans_inv_mat, target):
+        res = np.matmul(np.matmul(np.linalg.pinv(np.matmul(J_trans_inv_mat.T, J_trans_inv_mat)), J_trans_inv_mat.T), target)
+        return self.inv_trafo_q(res[:12]) + self.inv_trafo_q(res[12:24]) + self.inv_trafo_q(res[24:36])
+
+    def comp_combined_force(self, q, des_force, des_torque, in_touch):
+        if (np.sum(in_touch) == 0):
+            return np.zeros((9)), np.zeros((9))
+        return self._solve_stacked(self._stacked_maps(q, in_touch), des_force), np.zeros((9))
+
+    def comp_combined_torque(self, q, des_force, des_torque, in_touch, center, p1, p2, p3):
+        if (np.sum(in_touch) != 3):
+            return np.zeros((9)), np.zeros((9))
+        transform = [self.skew(p - center) for p in [p1, p2, p3]]
+        return np.zeros((9)), self._solve_stacked(self._stacked_maps(q, in_touch, transform), des_torque)
+
+    def comp_effective_force(self, q, torque, in_touch):
+        J_trans_inv_mat = self._stacked_maps(q, in_touch)
+        torque = self.trafo_q(torque)
+        return sum(np.matmul(J_trans_inv_mat[:, i * 12:(i + 1) * 12], torque) for i in range(3))
+
+
+def control_step(kinematics, q, v, rng):
+    # computations of one step of e.g. the lift primitive
+    center_arr = [False, False, False]
+    pos = [rng.uniform(-0.01, 0.01, 3) for _ in range(3)]
+    vel = [rng.uniform(-0.01, 0.01, 3) for _ in range(3)]
+    edge_dir = [rng.uniform(-1, 1, 3) for _ in range(3)]
+    tips = kinematics.get_tip_pos_pinnochio(q)
+    torque = kinematics.imp_ctrl_3_fingers([q, q, q], [np.zeros(3)] * 3, [4, 8, 12], vel, pos, [v, v, v],
+                                           [500.0] * 3, [500.0] * 3, center_arr)
+    torque = torque + kinematics.add_additional_force_3_fingers(q, 0.5, edge_dir, center_arr, correct_torque=True)
+    _, add_torque = kinematics.comp_combined_torque(q, np.zeros(3), rng.uniform(-0.1, 0.1, 3), [1, 1, 1],
+                                                    np.mean(tips, axis=0), tips[0], tips[1], tips[2])
+    return torque + add_torque
+
+
+def run(kinematics, states, seed=0):
+    rng = np.random.RandomState(seed)
+    results = []
+    t_start = time.perf_counter()
+    for q, v in states:
+        results.append(control_step(kinematics, q, v, rng))
+    return (time.perf_counter() - t_start) / len(states), np.asarray(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--steps', type=int, default=2000, help='number of control steps')
+    args = parser.parse_args()
+
+    model = pin.buildModelFromUrdf(os.path.join(os.path.dirname(__file__), "trifinger_mod.urdf"))
+    rng = np.random.RandomState(0)
+    states = [(rng.uniform([-0.5, 0.0, -2.0] * 3, [0.5, 1.0, -0.5] * 3), rng.uniform(-0.1, 0.1, 9))
+              for _ in range(args.steps)]
+
+    legacy_time, legacy_result = run(LegacyTriFingerKin(model, model.createData(), None), states)
+    cached_time, cached_result = run(TriFingerKin(model, model.createData(), None), states)
+
+    max_error = np.max(np.abs(legacy_result - cached_result))
+    print("legacy: {:8.1f} us/step".format(legacy_time * 1e6))
+    print("cached: {:8.1f} us/step".format(cached_time * 1e6))
+    print("speedup: {:.2f}x, max. abs. difference: {:.2e}".format(legacy_time / cached_time, max_error))
+    assert np.allclose(legacy_result, cached_result, rtol=1e-6, atol=1e-9)
+
+
+if __name__ == '__main__':
+    main()
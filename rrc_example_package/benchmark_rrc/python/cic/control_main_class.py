@@ -90,20 +90,80 @@ class TriFingerController:
 
 
 
+class KinematicState():
+    '''
+    Kinematic quantities of the robot for one joint configuration q.
+    Forward kinematics and the tip jacobians are computed once when the state is created,
+    everything else is computed on first use. All controller methods of TriFingerKin share
+    the state of the current control tick (see TriFingerKin.state).
+    '''
+    TIP_IDS = [4, 8, 12]
+
+    def __init__(self, kinematics, q):
+        self.model = kinematics.model
+        self.data = kinematics.data
+        self.q = np.array(q, dtype=float)
+        self.q_full = kinematics.trafo_q(self.q)
+
+        # also computes the forward kinematics
+        pin.computeJointJacobians(self.model, self.data, self.q_full)
+        self.tip_positions = [self.data.oMi[idx].translation.copy() for idx in self.TIP_IDS]
+        self._jacobians = {idx: self._get_jacobian(idx) for idx in self.TIP_IDS}
+        self._jacobian_pinvs = {}
+        self._force_maps = {}
+        self._mass_matrix = None
+
+    def _get_jacobian(self, joint_id):
+        return pin.getJointJacobian(self.model, self.data, joint_id, pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3, :].copy()
+
+    def jacobian(self, joint_id):
+        # translational jacobian (3x12) of the joint in the LOCAL_WORLD_ALIGNED frame
+        if joint_id not in self._jacobians:
+            # the data might have been changed by other computations in the meantime
+            pin.computeJointJacobians(self.model, self.data, self.q_full)
+            self._jacobians[joint_id] = self._get_jacobian(joint_id)
+        return self._jacobians[joint_id]
+
+    def jacobian_pinv(self, joint_id):
+        # pseudo inverse (12x3) of the jacobian, only a 3x3 matrix has to be inverted:
+        # pinv(J^T J) J^T = J^T pinv(J J^T)
+        if joint_id not in self._jacobian_pinvs:
+            J = self.jacobian(joint_id)
+            self._jacobian_pinvs[joint_id] = np.matmul(J.T, np.linalg.pinv(np.matmul(J, J.T)))
+        return self._jacobian_pinvs[joint_id]
+
+    def force_map(self, finger):
+        # maps joint torques (12) to the force (3) at the tip of the finger: pinv(J J^T) J
+        if finger not in self._force_maps:
+            J = self.jacobian(self.TIP_IDS[finger])
+            self._force_maps[finger] = np.matmul(np.linalg.pinv(np.matmul(J, J.T)), J)
+        return self._force_maps[finger]
+
+    @property
+    def mass_matrix(self):
+        if self._mass_matrix is None:
+            self._mass_matrix = np.array(pin.crba(self.model, self.data, self.q_full))
+        return self._mass_matrix
+
+
 class TriFingerKin():
     def __init__(self, model, data, env):
         self.model = model
         self.data = data
         self.env = env
+        self._state = None
 
-    def get_tip_pos_pinnochio(self,q):
-        q = self.trafo_q(q)
-        pin.forwardKinematics(self.model, self.data, q)
+    def state(self, q):
+        # kinematic state for q, it is only recomputed if q changed (i.e. once per control tick)
+        if self._state is None or not np.array_equal(self._state.q, q):
+            self._state = KinematicState(self, q)
+        return self._state
 
-        return [self.data.oMi[4].translation,self.data.oMi[8].translation,self.data.oMi[12].translation]
+    def get_tip_pos_pinnochio(self,q):
+        return [pos.copy() for pos in self.state(q).tip_positions]
 
     def compute_gravity_compensation(self,robot_state,torque):
-        pin.forwardKinematics(self.model, self.data, self.trafo_q(robot_state[0]))
+        # rnea does the forward kinematics itself
         b = pin.rnea(self.model, self.data, self.trafo_q(robot_state[0]),
                      self.trafo_q(robot_state[1]), np.zeros(12))
         add = self.inv_trafo_q(b)
@@ -210,7 +270,8 @@ class TriFingerKin():
         K[2, 2] = K_z
 
         F = 0.01#0.05
-        M_joint = pin.crba(self.model, self.data, q)
+        state = self.state(self.inv_trafo_q(q))
+        M_joint = state.mass_matrix
 
         pos_gain = np.matmul(K, pos)
         damp_gain = np.matmul(D, vel)
@@ -219,19 +280,13 @@ class TriFingerKin():
 
         acc = np.matmul(M_inv, (force_gain - pos_gain - damp_gain))
 
-        # TODO: I think it is sufficient if this is calculated only once:
         full_J_var = pin.computeJointJacobiansTimeVariation(self.model,self.data,q,v)
         J_var_frame = pin.getJointJacobianTimeVariation(self.model, self.data, joint_id, pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3,:]
         dyn_comp = np.matmul(J_var_frame,v)
 
         acc = acc - dyn_comp
 
-        # TODO: I think it is sufficient if this is calculated only once:
-        full_JAC = pin.computeJointJacobians(self.model,self.data,q)
-        J_NEW = pin.getJointJacobian(self.model,self.data,joint_id,pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3, :]
-        J = J_NEW
-
-        J_inv = np.matmul(np.linalg.pinv(np.matmul(J.T,J)),J.T)
+        J_inv = state.jacobian_pinv(joint_id)
         # print (J_inv)
         torque = np.matmul(M_joint,np.matmul(J_inv,acc))
 
@@ -244,32 +299,29 @@ class TriFingerKin():
                 ac[i*3:(i+1)*3] = copy.deepcopy(self.imp_ctrl(q[i],force_dir[i],joint_id[i],vel[i],pos[i],v[i],K_xy[i],K_z[i]))[i*3:(i+1)*3]
         return ac
 
+    def _distribute(self, force_maps, target):
+        # Minimum norm joint torques (12) such that sum_i A_i tau = target for the maps A_i (3x12)
+        # of the fingers. This is the same as pinv([A_1 ... A_n]) target but instead of the
+        # pseudo inverse of the (3n x 12) stacked matrix, only a 3x3 matrix has to be inverted:
+        # tau_i = A_i^T pinv(sum_j A_j A_j^T) target
+        S = np.zeros((3, 3))
+        for A in force_maps:
+            S += np.matmul(A, A.T)
+        y = np.matmul(np.linalg.pinv(S), target)
+        torque = np.zeros(12)
+        for A in force_maps:
+            torque += np.matmul(A.T, y)
+        return self.inv_trafo_q(torque)
+
     def comp_combined_force(self, q, des_force, des_torque, in_touch):
 
         if (np.sum(in_touch)==0):
             return np.zeros((9)), np.zeros((9))
 
-        q = self.trafo_q(q)
-
-        # TODO: I think it is sufficient if this is calculated only once:
-        full_JAC = pin.computeJointJacobians(self.model, self.data, q)
-        J_trans_inv_mat = np.zeros((3,3*12))
+        state = self.state(q)
+        force_maps = [state.force_map(i) for i in range(3) if in_touch[i]==1]
 
-        for i in range(3):
-            if (in_touch[i]==1):
-                idx = i * 4 + 4
-                idx_low = idx-4
-                J_NEW = pin.getJointJacobian(self.model, self.data, idx, pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3, :]
-                J_trans = J_NEW.T
-                J_trans_inv = np.matmul(np.linalg.pinv(np.matmul(J_trans.T, J_trans)), J_trans.T)
-                J_trans_inv_mat[:,idx_low*3:idx*3] = J_trans_inv
-
-        add_torque_force = np.matmul(np.matmul(np.linalg.pinv(np.matmul(J_trans_inv_mat.T, J_trans_inv_mat)), J_trans_inv_mat.T),des_force)
-        add_torque_force1 = self.inv_trafo_q(add_torque_force[:12])
-        add_torque_force2 = self.inv_trafo_q(add_torque_force[12:24])
-        add_torque_force3 = self.inv_trafo_q(add_torque_force[24:36])
-
-        return (add_torque_force1+add_torque_force2+add_torque_force3), np.zeros((9))
+        return self._distribute(force_maps, des_force), np.zeros((9))
 
     def comp_combined_torque(self, q, des_force, des_torque, in_touch, center, p1, p2, p3):
 
@@ -279,57 +331,22 @@ class TriFingerKin():
         if (np.sum(in_touch)!=3):
             return np.zeros((9)), np.zeros((9))
 
-        q = self.trafo_q(q)
+        state = self.state(q)
+        torque_maps = [np.matmul(self.skew(P[i]-center), state.force_map(i)) for i in range(3) if in_touch[i]==1]
 
-        # TODO: I think it is sufficient if this is calculated only once:
-        full_JAC = pin.computeJointJacobians(self.model, self.data, q)
-        J_trans_inv_mat = np.zeros((3,3*12))
-
-        for i in range(3):
-            if (in_touch[i]==1):
-                idx = i * 4 + 4
-                idx_low = idx-4
-                J_NEW = pin.getJointJacobian(self.model, self.data, idx, pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3, :]
-                J_trans = J_NEW.T
-                J_trans_inv = np.matmul(np.linalg.pinv(np.matmul(J_trans.T, J_trans)), J_trans.T)
-                # print (np.shape(J_trans_inv))
-                J_trans_inv = np.matmul(self.skew(P[i]-center),J_trans_inv)
-                # print(np.shape(J_trans_inv))
-                # input("STOOP")
-                J_trans_inv_mat[:,idx_low*3:idx*3] = J_trans_inv
-
-
-        add_torque_force = np.matmul(np.matmul(np.linalg.pinv(np.matmul(J_trans_inv_mat.T, J_trans_inv_mat)), J_trans_inv_mat.T),des_torque)
-        add_torque_force1 = self.inv_trafo_q(add_torque_force[:12])
-        add_torque_force2 = self.inv_trafo_q(add_torque_force[12:24])
-        add_torque_force3 = self.inv_trafo_q(add_torque_force[24:36])
-        # print (J_trans_inv_mat)
-        # input ("WAIT....")
-        # net_force = net_force + np.matmul(J_trans_inv, torque)
-
-        # print (net_force)
-        # input ("NET FORCE")
-        return np.zeros((9)), (add_torque_force1+add_torque_force2+add_torque_force3)
+        return np.zeros((9)), self._distribute(torque_maps, des_torque)
 
 
     def comp_effective_force(self, q, torque, in_touch):
 
-        q = self.trafo_q(q)
+        state = self.state(q)
         torque = self.trafo_q(torque)
 
         net_force = np.zeros((3))
-
-        full_JAC = pin.computeJointJacobians(self.model,self.data,q)
         for i in range(3):
             if (in_touch[i]==1):
-                idx = i*4+4
-                J_NEW = pin.getJointJacobian(self.model,self.data,idx,pin.ReferenceFrame.LOCAL_WORLD_ALIGNED)[:3, :]
-                J_trans = J_NEW.T
-                J_trans_inv = np.matmul(np.linalg.pinv(np.matmul(J_trans.T,J_trans)),J_trans.T)
-                net_force = net_force + np.matmul(J_trans_inv,torque)
-
-        # print (net_force)
-        # input ("NET FORCE")
+                net_force = net_force + np.matmul(state.force_map(i),torque)
+
         return net_force
 
     def add_additional_force_3_fingers(self,q,force_factor,edge_dir,center,correct_torque=False):
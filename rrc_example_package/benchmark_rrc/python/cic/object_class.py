@@ -3,46 +3,80 @@ from .math_tools import rpy2Mat
 import pybullet
 
 
+# the face directions of the cube are the columns of a rotation matrix in the order +x, -x, +y, -y, +z, -z
+_FACE_AXES = [0, 0, 1, 1, 2, 2]
+_FACE_SIGNS = np.array([1.0, -1.0, 1.0, -1.0, 1.0, -1.0])
+# faces whose edges are grasped (in this order) for each vertical axis
+_EDGE_FACES = {vertical: [2 * a, 2 * b, 2 * a + 1, 2 * b + 1]
+               for vertical, (a, b) in enumerate([(1, 2), (0, 2), (0, 1)])}
+
+
 class Object:
     def __init__(self):
         self._CUBE_WIDTH_x = None
         self._CUBE_WIDTH_y = None
         self._CUBE_WIDTH_z = None
+        # rotation matrices of the last queried pose, which all primitives query in each control step
+        self._quat_key = None
+        self._rpy_key = None
+
+    def _rotation(self, quat):
+        """rotation matrix of the orientation quaternion (cached for the last quaternion)"""
+        key = np.asarray(quat, dtype=np.float64).tobytes()
+        if key != self._quat_key:
+            rot = np.asarray(pybullet.getMatrixFromQuaternion(quat)).reshape(3, 3)
+            self._quat_rot = rot
+            self._quat_face_dirs = rot[:, _FACE_AXES] * _FACE_SIGNS
+            self._quat_key = key
+        return self._quat_rot
+
+    def _face_dirs(self, quat):
+        """directions of the faces +x, -x, +y, -y, +z, -z in the world frame (3 x 6)"""
+        self._rotation(quat)
+        return self._quat_face_dirs
+
+    def _rpy_rotation(self, rpy):
+        """rotation matrix of the roll, pitch, yaw angles (cached for the last angles)"""
+        key = np.asarray(rpy, dtype=np.float64).tobytes()
+        if key != self._rpy_key:
+            self._rpy_rot = np.asarray(rpy2Mat(rpy[0], rpy[1], rpy[2])).reshape(3, 3)
+            self._rpy_key = key
+        return self._rpy_rot
 
     def faces_xyz(self, cube_state):
         ## Check Axis pointing Up and get the angle ##
-        rot = np.asarray(rpy2Mat(cube_state[2][0], cube_state[2][1], cube_state[2][2])).reshape(3, 3)
+        rot = self._rpy_rotation(cube_state[2])
 
         face = np.eye(3)*np.array([self._CUBE_WIDTH_x, self._CUBE_WIDTH_y, self._CUBE_WIDTH_z])
         faces_in_cube = np.concatenate((face, -face),1)
-        faces_in_world = np.matmul(rot, faces_in_cube) + np.tile(cube_state[0][:,None],[1,6])
+        faces_in_world = np.matmul(rot, faces_in_cube) + cube_state[0][:, None]
 
         return faces_in_world
 
     def offseted_faces_xyz(self, cube_state, offset):
         ## Check Axis pointing Up and get the angle ##
-        rot = np.asarray(rpy2Mat(cube_state[2][0], cube_state[2][1], cube_state[2][2])).reshape(3, 3)
+        rot = self._rpy_rotation(cube_state[2])
 
         face = np.eye(3)*np.array([self._CUBE_WIDTH_x + offset, self._CUBE_WIDTH_y+offset, self._CUBE_WIDTH_z+offset])
         faces_in_cube = np.concatenate((face, -face),1)
-        faces_in_world = np.matmul(faces_in_cube.T, rot).T + np.tile(cube_state[0][:,None],[1,6])
+        faces_in_world = np.matmul(faces_in_cube.T, rot).T + cube_state[0][:, None]
 
         return faces_in_world
 
     def in_cube(self, cube_state, pos_w):
-        rot_c2w = np.asarray(rpy2Mat(cube_state[2][0], cube_state[2][1], cube_state[2][2])).reshape(3, 3)
+        rot_c2w = self._rpy_rotation(cube_state[2])
 
         pos_c = np.matmul(pos_w.T - cube_state[0], rot_c2w.T).T
         return pos_c
 
     def in_world(self, cube_state, pos_c, offset_prop = False ):
-        rot_c2w = np.asarray(rpy2Mat(cube_state[2][0], cube_state[2][1], cube_state[2][2])).reshape(3, 3)
+        rot_c2w = self._rpy_rotation(cube_state[2])
 
         if offset_prop:
             pos_c = pos_c * np.array([[self._CUBE_WIDTH_x , self._CUBE_WIDTH_y, self._CUBE_WIDTH_z]]).T
 
         #print('position C:', pos_c)
-        pos_w = np.matmul(pos_c.T, rot_c2w).T + np.tile(cube_state[0][:,None],[1,pos_c.shape[1]])
+        pos_w = np.matmul(pos_c.T, rot_c2w).T + cube_state[0][:, None]
         return pos_w
 
 
@@ -151,153 +185,61 @@ class Cube(Object):
     def compute_edge_loc_entire_cube(self, cube_state, off_x=0.0, off_y=0.0, off_z=0.0, compute_vertical=False):
 
         # add potential offset to true cube locations:
-        cube_width_x = self._CUBE_WIDTH_x+off_x
-        cube_width_y = self._CUBE_WIDTH_y+off_y
         # TODO: implement this nicer (this is now added cause maybe also the cube is flipped,...) and the z offset is applied globally,...
-        cube_width_z = self._CUBE_WIDTH_z+off_x   # z-offset is added later
-
-
-        #rot_p0 = np.asarray(rpy2Mat(0.0,0.0,cube_state[2][2])).reshape(3,3)
-        #rot_p0 = np.asarray(rpy2Mat(cube_state[2][0],cube_state[2][1],cube_state[2][2])).reshape(3,3)
-        rot_p0 = np.asarray(pybullet.getMatrixFromQuaternion(cube_state[1])).reshape(3, 3)
+        half_widths = np.array([self._CUBE_WIDTH_x + off_x, self._CUBE_WIDTH_y + off_y, self._CUBE_WIDTH_z + off_x]) / 2.0
 
-        side_points = np.zeros((3, 6))
-        side_points[:, 0] = cube_state[0]
-        side_points[:, 1] = cube_state[0]
-        side_points[:, 2] = cube_state[0]
-        side_points[:, 3] = cube_state[0]
-        side_points[:, 4] = cube_state[0]
-        side_points[:, 5] = cube_state[0]
-
-        # manipulation matrix calculates the sides,..
-        manip_mat = np.zeros((3, 6))
-        # careful this here changes up things:
-        # first x direction:
-        manip_mat[0, 0] += cube_width_x / 2.0
-        manip_mat[0, 1] -= cube_width_x / 2.0
-        manip_mat[1, 2] += cube_width_y / 2.0
-        manip_mat[1, 3] -= cube_width_y / 2.0
-        manip_mat[2, 4] += cube_width_z / 2.0
-        manip_mat[2, 5] -= cube_width_z / 2.0
-        manip_mat = np.matmul(rot_p0, manip_mat)
+        # manipulation matrix calculates the sides (centers of the faces +x, -x, +y, -y, +z, -z relative to the cube center)
+        manip_mat = self._face_dirs(cube_state[1]) * half_widths[_FACE_AXES]
 
-        edge_rot = side_points + manip_mat
+        edge_rot = manip_mat + np.asarray(cube_state[0])[:, None]
         edge_rot[2, :] = edge_rot[2, :] + off_z
 
+        # rows: x, y, z axis
+        axes_dir = manip_mat[:, 0::2].T - manip_mat[:, 1::2].T
+
         if (compute_vertical):
-            x_axis = np.abs(manip_mat[2,0]-manip_mat[2,1])
-            y_axis = np.abs(manip_mat[2,2]-manip_mat[2,3])
-            z_axis = np.abs(manip_mat[2,4]-manip_mat[2,5])
-            axes_info = np.asarray([x_axis,y_axis,z_axis])
-            self.vertical_axes_idx = np.argmax(axes_info)
+            self.vertical_axes_idx = np.argmax(np.abs(axes_dir[:, 2]))
         #self.vertical_axes_idx = 2
 
-        x_axis_dir = manip_mat[:,0]-manip_mat[:,1]
-        y_axis_dir = manip_mat[:,2]-manip_mat[:,3]
-        z_axis_dir = manip_mat[:,4]-manip_mat[:,5]
-
-        axes_dir = np.zeros((3, 3))
-        axes_dir[0,:] = x_axis_dir[:]
-        axes_dir[1,:] = y_axis_dir[:]
-        axes_dir[2,:] = z_axis_dir[:]
-
-        count = 0
-        edge_rot2 = np.zeros((3, 4))
-        for i in range(3):
-            if not(i==self.vertical_axes_idx):
-                edge_rot2[:,count] = edge_rot[:,2*i]
-                edge_rot2[:,count+2] = edge_rot[:,2*i+1]
-                count += 1
+        edge_rot2 = edge_rot[:, _EDGE_FACES[self.vertical_axes_idx]]
 
         return edge_rot2, self.vertical_axes_idx, axes_dir
 
     def compute_edge_dir_entire_cube(self, cube_state):
-        # manipulation matrix calculates the sides,..
-        #rot_p0 = np.asarray(rpy2Mat(0.0,0.0,cube_state[2][2]).reshape(3,3))
-        #rot_p0 = np.asarray(rpy2Mat(cube_state[2][0],cube_state[2][1],cube_state[2][2])).reshape(3,3)
-        rot_p0 = np.asarray(pybullet.getMatrixFromQuaternion(cube_state[1])).reshape(3, 3)
-        manip_mat = np.zeros((3, 6))
-        # careful this here changes up things:
-        # first x direction:
-        manip_mat[0, 0] += 1.0
-        manip_mat[0, 1] -= 1.0
-        manip_mat[1, 2] += 1.0
-        manip_mat[1, 3] -= 1.0
-        manip_mat[2, 4] += 1.0
-        manip_mat[2, 5] -= 1.0
-        manip_mat = np.matmul(rot_p0, manip_mat)
-
-        count = 0
-        manip_mat2 = np.zeros((3, 4))
         #self.vertical_axes_idx = 2
-        for i in range(3):
-            if not(i==self.vertical_axes_idx):
-                manip_mat2[:,count] = manip_mat[:,2*i]
-                manip_mat2[:,count+2] = manip_mat[:,2*i+1]
-                count += 1
-
-        return manip_mat2
+        return self._face_dirs(cube_state[1])[:, _EDGE_FACES[self.vertical_axes_idx]]
 
     def set_directions(self, robot_state, cube_state):
-        tip_1 = robot_state[2][0]
-        tip_2 = robot_state[2][1]
-        tip_3 = robot_state[2][2]
-
-        rot_p0 = np.asarray(pybullet.getMatrixFromQuaternion(cube_state[1])).reshape(3, 3)
+        rot_p0 = self._rotation(cube_state[1])
         cube_center = cube_state[0]
 
-        dir_1 = tip_1 - cube_center
-        dir_2 = tip_2 - cube_center
-        dir_3 = tip_3 - cube_center
-
-        self.dir1_unnormalized = np.matmul(rot_p0.T,dir_1)
-        factor = np.max(np.abs(self.dir1_unnormalized))/ (0.065/2.0)
-        self.dir1_unnormalized = self.dir1_unnormalized / factor
-
-        self.dir2_unnormalized = np.matmul(rot_p0.T,dir_2)
-        factor = np.max(np.abs(self.dir2_unnormalized))/ (0.065/2.0)
-        self.dir2_unnormalized = self.dir2_unnormalized / factor
-
-        self.dir3_unnormalized = np.matmul(rot_p0.T,dir_3)
-        factor = np.max(np.abs(self.dir3_unnormalized))/ (0.065/2.0)
-        self.dir3_unnormalized = self.dir3_unnormalized / factor
-
-        import copy
-        self.edge_dir1 = copy.deepcopy(self.dir1_unnormalized)
-        self.edge_dir1 = self.edge_dir1 / np.linalg.norm(self.edge_dir1)
-        self.edge_dir1[np.argmax(np.abs(self.edge_dir1))] = np.sign(self.edge_dir1[np.argmax(np.abs(self.edge_dir1))])
-        self.edge_dir1[np.abs(self.edge_dir1)<0.9] = 0.0
+        # one row per tip
+        dirs = np.asarray(robot_state[2][:3]) - cube_center
 
-        self.edge_dir2 = copy.deepcopy(self.dir2_unnormalized)
-        self.edge_dir2 = self.edge_dir2 / np.linalg.norm(self.edge_dir2)
-        self.edge_dir2[np.argmax(np.abs(self.edge_dir2))] = np.sign(self.edge_dir2[np.argmax(np.abs(self.edge_dir2))])
-        self.edge_dir2[np.abs(self.edge_dir2)<0.9] = 0.0
+        dirs_unnormalized = np.matmul(dirs, rot_p0)
+        factor = np.max(np.abs(dirs_unnormalized), axis=1, keepdims=True) / (0.065/2.0)
+        dirs_unnormalized = dirs_unnormalized / factor
 
-        self.edge_dir3 = copy.deepcopy(self.dir3_unnormalized)
-        self.edge_dir3 = self.edge_dir3 / np.linalg.norm(self.edge_dir3)
-        self.edge_dir3[np.argmax(np.abs(self.edge_dir3))] = np.sign(self.edge_dir3[np.argmax(np.abs(self.edge_dir3))])
-        self.edge_dir3[np.abs(self.edge_dir3)<0.9] = 0.0
+        edge_dirs = dirs_unnormalized / np.linalg.norm(dirs_unnormalized, axis=1, keepdims=True)
+        tips = np.arange(3)
+        max_idx = np.argmax(np.abs(edge_dirs), axis=1)
+        edge_dirs[tips, max_idx] = np.sign(edge_dirs[tips, max_idx])
+        edge_dirs[np.abs(edge_dirs)<0.9] = 0.0
 
-        dir_1 = dir_1 / np.linalg.norm(dir_1)
-        dir_2 = dir_2 / np.linalg.norm(dir_2)
-        dir_3 = dir_3 / np.linalg.norm(dir_3)
+        dirs = dirs / np.linalg.norm(dirs, axis=1, keepdims=True)
+        dirs = np.matmul(dirs, rot_p0)
 
-        self.dir1 = np.matmul(rot_p0.T,dir_1)
-        self.dir2 = np.matmul(rot_p0.T,dir_2)
-        self.dir3 = np.matmul(rot_p0.T,dir_3)
+        self._dirs_unnormalized = dirs_unnormalized
+        self._edge_dirs = edge_dirs
+        self._dirs = dirs
+        self.dir1_unnormalized, self.dir2_unnormalized, self.dir3_unnormalized = dirs_unnormalized
+        self.edge_dir1, self.edge_dir2, self.edge_dir3 = edge_dirs
+        self.dir1, self.dir2, self.dir3 = dirs
 
     def compute_edge_dir_special(self, cube_state):
-        # manipulation matrix calculates the sides,..
-        #rot_p0 = np.asarray(rpy2Mat(0.0,0.0,cube_state[2][2]).reshape(3,3))
-        #rot_p0 = np.asarray(rpy2Mat(cube_state[2][0],cube_state[2][1],cube_state[2][2])).reshape(3,3)
-        rot_p0 = np.asarray(pybullet.getMatrixFromQuaternion(cube_state[1])).reshape(3, 3)
+        rot_p0 = self._rotation(cube_state[1])
 
-        # dir1 = np.matmul(rot_p0, self.dir1)
-        # dir2 = np.matmul(rot_p0, self.dir2)
-        # dir3 = np.matmul(rot_p0, self.dir3)
-        dir1 = np.matmul(rot_p0, self.edge_dir1)
-        dir2 = np.matmul(rot_p0, self.edge_dir2)
-        dir3 = np.matmul(rot_p0, self.edge_dir3)
+        dir1, dir2, dir3 = np.matmul(self._edge_dirs, rot_p0.T)
 
         return dir1, dir2, dir3
 
@@ -306,27 +248,13 @@ class Cube(Object):
 
         # add potential offset to true cube locations:
         cube_offset_x = off_x
-        cube_offset_y = off_y
         # # TODO: implement this nicer (this is now added cause maybe also the cube is flipped,...) and the z offset is applied globally,...
         # cube_width_z = self._CUBE_WIDTH_z+off_x   # z-offset is added later
 
-        pos1 = self.dir1_unnormalized + self.dir1*cube_offset_x
-        pos2 = self.dir2_unnormalized + self.dir2*cube_offset_x
-        pos3 = self.dir3_unnormalized + self.dir3*cube_offset_x
+        pos = self._dirs_unnormalized + self._dirs*cube_offset_x
 
-        rot_p0 = np.asarray(pybullet.getMatrixFromQuaternion(cube_state[1])).reshape(3, 3)
+        rot_p0 = self._rotation(cube_state[1])
 
-        pos1 = np.matmul(rot_p0,pos1) + cube_state[0] + np.asarray([0,0,off_z])
-        pos2 = np.matmul(rot_p0,pos2) + cube_state[0] + np.asarray([0,0,off_z])
-        pos3 = np.matmul(rot_p0,pos3) + cube_state[0] + np.asarray([0,0,off_z])
+        pos1, pos2, pos3 = np.matmul(pos, rot_p0.T) + cube_state[0] + np.asarray([0,0,off_z])
 
         return pos1, pos2, pos3
-
-
-
-
-
-
-
-
-
@@ -1,8 +1,11 @@
+import time
+
 import gin
 from mp import states as mp_states
 
 from cpc import states as cpc_states
 from cpc import parameters as cpc_params
+from env.profiler import get_profiler
 
 
 class StateMachine(object):
@@ -53,15 +56,22 @@ class StateMachine(object):
                 attr.reset()
 
     def __call__(self, obs):
+        start = time.perf_counter()
+        action = self._step(obs)
+        get_profiler().end_tick(start, action['frameskip'])
+        return action
+
+    def _step(self, obs):
         prev_state = self.state
-        action, self.state, self.info = self.state(obs, self.info)
+        with get_profiler().section(prev_state.__class__.__name__, 'state'):
+            action, self.state, self.info = self.state(obs, self.info)
         if prev_state != self.state:
             print("==========================================")
             print(f"Entering State: {self.state.__class__.__name__}")
             print("==========================================")
             prev_state.reset()
         if action['frameskip'] == 0:
-            return self.__call__(obs)
+            return self._step(obs)
         else:
             return action
 
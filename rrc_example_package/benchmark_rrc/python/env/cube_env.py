@@ -1,8 +1,7 @@
 """Gym environment for the Real Robot Challenge Phase 2."""
+import copy
 import os
 import enum
-import shelve
-import pickle as pkl
 
 import gym
 import numpy as np
@@ -18,6 +17,8 @@ import pybullet as p
 from .reward_fns import competition_reward
 from .pinocchio_utils import PinocchioUtils
 from .viz import Viz, CuboidMarker
+from .log_store import LogStore
+from .profiler import get_profiler
 import time
 
 
@@ -96,9 +97,8 @@ class RealRobotCubeEnv(gym.GoalEnv):
         self.simulation = sim
         self.visualization = visualization
         self.episode_length = episode_length
-        self.custom_logs = {}
-        self.reward_list = []
-        self.observation_list = []
+        self._log_store = None  # created on first use
+        self._log_store_created = False
         self.change_goal_last = -1 # needed for evaluation
         self.reach_finish_point = -1 # needed for evaluation
         self.reach_start_point = -1 # needed for evaluation
@@ -232,9 +232,10 @@ class RealRobotCubeEnv(gym.GoalEnv):
             # send action to robot
             robot_action = self._gym_action_to_robot_action(action)
             if self.simulation:
-                t = self.platform.append_desired_action(robot_action)
+                with get_profiler().section('append_desired_action', 'pybullet'):
+                    t = self.platform.append_desired_action(robot_action)
                 observation = self._create_observation(t, action)
-                self.observation_list.append(observation)
+                self._append_log('observations', dict(t=t, **observation))
             else:
                 t = self.real_platform.append_desired_action(robot_action)
                 observation = self._create_observation(t, action)
@@ -278,7 +279,10 @@ class RealRobotCubeEnv(gym.GoalEnv):
             )
             time.sleep(0.01)
 
-        self.reward_list.append(reward)
+        self._append_log('reward', {'step_count': self.step_count,
+                                    'reward': reward})
+        if is_done:
+            self.close_custom_logs()
 
         return observation, reward, is_done, self.info.copy()
 
@@ -404,6 +408,69 @@ class RealRobotCubeEnv(gym.GoalEnv):
             obs['robot']['velocity']
         )
 
+    def get_sim_snapshot(self):
+        """Get a snapshot of the current state of the simulation.
+
+        The snapshot contains the state of robot and cube, the goal and the
+        cached observations, so that the episode can be continued from this
+        point after a reset (see :meth:`restore_sim_snapshot`).
+
+        Returns:
+            dict: The snapshot.
+        """
+        if not self.simulation:
+            raise RuntimeError("Snapshots are only supported in simulation.")
+        simfinger = self.platform.simfinger
+        client_id = simfinger._pybullet_client_id
+        joint_states = p.getJointStates(simfinger.finger_id,
+                                        simfinger.pybullet_joint_indices,
+                                        physicsClientId=client_id)
+        cube_position, cube_orientation = self.platform.cube.get_state()
+        cube_velocity = p.getBaseVelocity(self.platform.cube.block,
+                                          physicsClientId=client_id)
+        t = self.platform.get_current_timeindex()
+        return copy.deepcopy({
+            'robot_position': [s[0] for s in joint_states],
+            'robot_velocity': [s[1] for s in joint_states],
+            'cube_pose': (cube_position, cube_orientation),
+            'cube_velocity': cube_velocity,
+            'goal': self.goal,
+            'prev_observation': self.prev_observation,
+            'camera_observation': self.platform._camera_observation_t,
+            'steps_to_camera_update': self.platform._next_camera_update_step - t,
+        })
+
+    def restore_sim_snapshot(self, snapshot):
+        """Restore a snapshot taken with :meth:`get_sim_snapshot`.
+
+        Has to be called after :meth:`reset`.  The time index of the
+        simulation is not restored, i.e. the episode continues at the time
+        index of the reset.
+
+        Args:
+            snapshot (dict): The snapshot.
+        """
+        if self.platform is None:
+            raise RuntimeError("Call `reset()` before restoring a snapshot.")
+        snapshot = copy.deepcopy(snapshot)
+        client_id = self.platform.simfinger._pybullet_client_id
+        self.platform.simfinger.reset_finger_positions_and_velocities(
+            snapshot['robot_position'],
+            snapshot['robot_velocity']
+        )
+        self.platform.cube.set_state(*snapshot['cube_pose'])
+        p.resetBaseVelocity(self.platform.cube.block,
+                            *snapshot['cube_velocity'],
+                            physicsClientId=client_id)
+        t = self.platform.get_current_timeindex()
+        self.platform._camera_observation_t = snapshot['camera_observation']
+        self.platform._next_camera_update_step = t + snapshot['steps_to_camera_update']
+        self.goal = snapshot['goal']
+        self.prev_observation = snapshot['prev_observation']
+        if self.visualization:
+            self.goal_marker.set_state(self.goal['position'],
+                                       self.goal['orientation'])
+
     def _gym_action_to_robot_action(self, gym_action):
         # construct robot action depending on action type
         if self.action_type == ActionType.TORQUE:
@@ -421,43 +488,53 @@ class RealRobotCubeEnv(gym.GoalEnv):
 
         return robot_action
 
+    def _get_custom_logdir(self):
+        if self.path is not None:
+            return self.path
+        if os.path.isdir(CUSTOM_LOGDIR):
+            return CUSTOM_LOGDIR
+        return None
+
+    def _get_log_store(self):
+        if self._log_store is None:
+            custom_logdir = self._get_custom_logdir()
+            if custom_logdir is None:
+                return None
+            # continue existing tables if the store is reopened after an
+            # episode ended
+            self._log_store = LogStore(
+                os.path.join(custom_logdir, 'custom_data'),
+                append=self._log_store_created)
+            self._log_store_created = True
+        return self._log_store
+
+    def _append_log(self, name, row):
+        log_store = self._get_log_store()
+        if log_store is not None:
+            log_store.append(name, row)
+
     def register_custom_log(self, name, data):
-        if name in self.custom_logs:
-            self.custom_logs[name].append({
+        log_store = self._get_log_store()
+        if log_store is not None:
+            log_store.append_record(name, {
                 'step_count': self.step_count,
                 'data': data
             })
-        else:
-            self.custom_logs[name] = [{
-                'step_count': self.step_count,
-                'data': data
-            }]
 
     def save_custom_logs(self):
+        """Flush the custom logs to disk and store the goal information.
+
+        Observations (in simulation), rewards and custom logs are written
+        continuously to the log store in ``<logdir>/custom_data`` (see
+        :mod:`env.log_store`).  This only flushes pending data.
+        """
         print('saving custom logs...')
-        custom_logdir = None
-        if not(self.path is None):
-            custom_logdir = self.path
-        elif not os.path.isdir(CUSTOM_LOGDIR):
+        custom_logdir = self._get_custom_logdir()
+        if custom_logdir is None:
             print('{} does not exist. skip saving custom logs.'.format(CUSTOM_LOGDIR))
             return
-        else:
-            custom_logdir = CUSTOM_LOGDIR
-        path = os.path.join(custom_logdir, 'custom_data')
-        with shelve.open(path, writeback=True) as f:
-            for key, val in self.custom_logs.items():
-                f[key] = val
-
-        # save the rewards
-        path = os.path.join(custom_logdir, 'reward.pkl')
-        with open(path, 'wb') as handle:
-            pkl.dump(self.reward_list,handle)
-
-        # if ran in simulation save the observation
-        if (self.simulation):
-            path = os.path.join(custom_logdir, 'observations.pkl')
-            with open(path, 'wb') as handle:
-                pkl.dump(self.observation_list,handle)
+        log_store = self._get_log_store()
+        log_store.flush()
 
         # store the goal to a file, i.e. the last goal,...
         import json
@@ -478,6 +555,16 @@ class RealRobotCubeEnv(gym.GoalEnv):
         with open(goal_file, "w") as fh:
             json.dump(goal_info, fh, indent=4)
 
+    def close_custom_logs(self):
+        """Flush and close the log store.  It is reopened on the next log."""
+        if self._log_store is not None:
+            self._log_store.close()
+            self._log_store = None
+
+    def close(self):
+        self.close_custom_logs()
+        super().close()
+
     def set_goal(self, pos=None, orientation=None, log_timestep=True):
         ex_state = move_cube.sample_goal(difficulty=-1) # ensures that on the ground
         if not(pos is None):
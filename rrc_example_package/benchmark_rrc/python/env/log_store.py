@@ -0,0 +1,314 @@
+"""Append-only binary log store for custom logs of the environment.
+
+A log store is a directory with one sub-directory per table.  Each table
+contains a ``schema.json`` and its data files:
+
+- Tables with fixed-schema numeric data (e.g. observations) are stored
+  column-wise.  Each column is a raw binary file ``<column>.bin`` to which
+  rows are appended, so it can be read back with ``np.memmap`` without
+  loading it into memory.
+- Data without fixed schema (e.g. planned paths of varying length) is stored
+  as a stream of pickled records in ``records.pkl``.
+
+Rows are collected in preallocated blocks in the control loop.  Full blocks
+are handed to a background thread which appends them to the files, so memory
+stays flat during long episodes and closing the store only has to write the
+last partial block.
+
+Nested dictionaries are flattened into columns with "/"-separated names,
+e.g. ``{"robot": {"position": ...}}`` results in the column
+``robot/position``.
+"""
+import json
+import os
+import pickle
+import queue
+import threading
+
+import numpy as np
+
+
+SCHEMA_FILE = 'schema.json'
+RECORDS_FILE = 'records.pkl'
+DEFAULT_BLOCK_SIZE = 1000
+
+
+def flatten(data, prefix=''):
+    """Flatten nested dictionaries into a dictionary with "/"-joined keys."""
+    flat = {}
+    for key, value in data.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '/'))
+        else:
+            flat[name] = value
+    return flat
+
+
+def unflatten(flat):
+    """Inverse of :func:`flatten`."""
+    data = {}
+    for name, value in flat.items():
+        keys = name.split('/')
+        node = data
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+    return data
+
+
+def infer_schema(row):
+    """Infer a fixed numeric schema from a row.
+
+    Returns:
+        Dictionary mapping column names to ``(dtype, shape)`` or None if the
+        row contains non-numeric or ragged values.
+    """
+    if not isinstance(row, dict):
+        return None
+    schema = {}
+    for name, value in flatten(row).items():
+        try:
+            arr = np.asarray(value)
+        except ValueError:
+            # ragged sequences
+            return None
+        if arr.dtype.kind not in 'biuf':
+            return None
+        schema[name] = (arr.dtype, arr.shape)
+    return schema
+
+
+def _column_filename(name):
+    return name.replace('/', '.') + '.bin'
+
+
+class _FlushThread(threading.Thread):
+    """Background thread appending data blocks to files."""
+
+    def __init__(self, max_pending_blocks=64):
+        super().__init__(daemon=True)
+        self.jobs = queue.Queue(maxsize=max_pending_blocks)
+        self.error = None
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                fh, data = job
+                fh.write(data)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.jobs.task_done()
+
+    def submit(self, fh, data):
+        if self.error is not None:
+            raise RuntimeError('Writing log data failed: {}'.format(
+                self.error))
+        self.jobs.put((fh, data))
+
+
+class ColumnTableWriter:
+    """Append-only writer for a table with fixed-schema numeric columns."""
+
+    def __init__(self, directory, schema, flush_thread,
+                 block_size=DEFAULT_BLOCK_SIZE, append=False):
+        self.directory = directory
+        self.schema = schema
+        self._flush_thread = flush_thread
+        self._block_size = block_size
+        self._n = 0
+
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, SCHEMA_FILE), 'w') as f:
+            json.dump({
+                'kind': 'columns',
+                'columns': {
+                    name: {'dtype': np.dtype(dtype).str, 'shape': list(shape)}
+                    for name, (dtype, shape) in schema.items()
+                }
+            }, f, indent=4)
+
+        self._buffers = {}
+        self._files = {}
+        for name, (dtype, shape) in schema.items():
+            self._buffers[name] = np.empty((block_size,) + tuple(shape),
+                                           dtype=dtype)
+            self._files[name] = open(
+                os.path.join(directory, _column_filename(name)),
+                'ab' if append else 'wb')
+
+    def append(self, row):
+        i = self._n
+        for name, value in flatten(row).items():
+            self._buffers[name][i] = value
+        self._n += 1
+        if self._n == self._block_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the buffered rows to the flush thread."""
+        if self._n == 0:
+            return
+        for name, buf in self._buffers.items():
+            # tobytes() copies, so the buffer can be reused right away
+            self._flush_thread.submit(self._files[name],
+                                      buf[:self._n].tobytes())
+        self._n = 0
+
+    def close(self):
+        for fh in self._files.values():
+            fh.close()
+
+
+class RecordTableWriter:
+    """Append-only writer for a stream of arbitrary (pickled) records."""
+
+    def __init__(self, directory, flush_thread, append=False):
+        self.directory = directory
+        self._flush_thread = flush_thread
+
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, SCHEMA_FILE), 'w') as f:
+            json.dump({'kind': 'records'}, f, indent=4)
+        self._file = open(os.path.join(directory, RECORDS_FILE),
+                          'ab' if append else 'wb')
+
+    def append(self, row):
+        self._flush_thread.submit(
+            self._file, pickle.dumps(row, pickle.HIGHEST_PROTOCOL))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._file.close()
+
+
+class LogStore:
+    """Collection of append-only tables sharing one background flush thread.
+
+    Tables are created on their first use.  Rows passed to :meth:`append`
+    must all have the schema of the first row and are stored in a column
+    table.  Records passed to :meth:`append_record` can be arbitrary
+    (picklable) objects and are stored in a record table.  Existing tables in
+    the directory are overwritten unless ``append`` is set.
+    """
+
+    def __init__(self, directory, block_size=DEFAULT_BLOCK_SIZE,
+                 append=False):
+        self.directory = directory
+        self.block_size = block_size
+        self.append_to_existing = append
+        self._tables = {}
+        self._flush_thread = _FlushThread()
+        self._flush_thread.start()
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, name, row):
+        """Append a row with fixed numeric schema to the table ``name``."""
+        table = self._tables.get(name)
+        if table is None:
+            schema = infer_schema(row)
+            if schema is None:
+                raise ValueError(
+                    'Row for table {} does not have a fixed numeric schema.'
+                    ' Use append_record instead.'.format(name))
+            table = ColumnTableWriter(
+                os.path.join(self.directory, name), schema,
+                self._flush_thread, self.block_size, self.append_to_existing)
+            self._tables[name] = table
+        table.append(row)
+
+    def append_record(self, name, record):
+        """Append an arbitrary record to the table ``name``."""
+        table = self._tables.get(name)
+        if table is None:
+            table = RecordTableWriter(
+                os.path.join(self.directory, name), self._flush_thread,
+                self.append_to_existing)
+            self._tables[name] = table
+        table.append(record)
+
+    def flush(self):
+        """Write all buffered rows and wait until they are on disk."""
+        for table in self._tables.values():
+            table.flush()
+        self._flush_thread.jobs.join()
+        if self._flush_thread.error is not None:
+            raise RuntimeError('Writing log data failed: {}'.format(
+                self._flush_thread.error))
+
+    def close(self):
+        """Flush remaining rows, stop the flush thread and close all files."""
+        if not self._flush_thread.is_alive():
+            return
+        try:
+            self.flush()
+        finally:
+            self._flush_thread.jobs.put(None)
+            self._flush_thread.join()
+            for table in self._tables.values():
+                table.close()
+
+
+def load_table(directory, name, mmap=True):
+    """Load a table of a log store.
+
+    Args:
+        directory: Directory of the log store.
+        name: Name of the table.
+        mmap: If true, columns are memory-mapped instead of read into memory.
+
+    Returns:
+        For column tables a dictionary mapping (flattened) column names to
+        arrays with one row per entry.  For record tables a list of records.
+    """
+    path = os.path.join(directory, name)
+    with open(os.path.join(path, SCHEMA_FILE), 'r') as f:
+        meta = json.load(f)
+
+    if meta['kind'] == 'records':
+        records = []
+        with open(os.path.join(path, RECORDS_FILE), 'rb') as f:
+            while True:
+                try:
+                    records.append(pickle.load(f))
+                except EOFError:
+                    break
+        return records
+
+    columns = {}
+    for col, info in meta['columns'].items():
+        dtype = np.dtype(info['dtype'])
+        shape = tuple(info['shape'])
+        filename = os.path.join(path, _column_filename(col))
+        if os.path.getsize(filename) == 0:
+            data = np.empty((0,) + shape, dtype=dtype)
+        elif mmap:
+            data = np.memmap(filename, dtype=dtype, mode='r')
+        else:
+            data = np.fromfile(filename, dtype=dtype)
+        columns[col] = data.reshape((-1,) + shape)
+
+    # columns may differ in length if writing was interrupted
+    n_rows = min((len(c) for c in columns.values()), default=0)
+    return {col: data[:n_rows] for col, data in columns.items()}
+
+
+def load_store(directory, mmap=True):
+    """Load all tables of a log store.
+
+    Returns:
+        Dictionary mapping table names to the output of :func:`load_table`.
+    """
+    data = {}
+    if not os.path.isdir(directory):
+        return data
+    for name in sorted(os.listdir(directory)):
+        if os.path.isfile(os.path.join(directory, name, SCHEMA_FILE)):
+            data[name] = load_table(directory, name, mmap)
+    return data
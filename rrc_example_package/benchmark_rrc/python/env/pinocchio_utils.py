@@ -2,6 +2,8 @@ import numpy as np
 
 import pinocchio
 
+from .profiler import profile
+
 
 class PinocchioUtils:
     """
@@ -128,6 +130,7 @@ class PinocchioUtils:
         Jinv = np.linalg.pinv(Ji)
         return Jinv.dot(xdes - xcurrent)
 
+    @profile('ik')
     def inverse_kinematics(self, finger_id, xdes, q0, tol=0.001, max_iter=20):
         """
         Compute the joint positions which approximately result in a given
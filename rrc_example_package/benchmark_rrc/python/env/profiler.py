@@ -0,0 +1,280 @@
+"""Hierarchical profiler for the control loop.
+
+The state machines record the time of every control step (tick), of the
+active state/primitive and -- via :func:`profile` -- of expensive operations
+such as IK, collision checks, planning and pybullet simulation steps.
+Sections are nested, e.g. the time spent in IK while the state
+``MoveLiftCubeOrientPrimitive`` is active is recorded under
+``MoveLiftCubeOrientPrimitive/ik``.
+
+For each section the profiler keeps a latency histogram (logarithmic bins),
+and for the ticks it counts deadline overruns against the control budget of
+``frameskip / CONTROL_FREQUENCY`` seconds.  Optionally the individual
+sections are recorded as trace events which can be exported in the Chrome
+trace event format and viewed offline (e.g. in chrome://tracing or
+https://ui.perfetto.dev).
+
+Profiling is disabled by default and then only costs a function call per
+section.  Enable it with :func:`enable_profiling` or by setting the
+environment variable ``RRC_PROFILE_TRACE`` to the path of the trace file,
+which is then written when the process exits.
+"""
+import atexit
+import functools
+import json
+import math
+import os
+import time
+
+
+CONTROL_FREQUENCY = 1000.0  # Hz
+# histogram bins: 8 per decade from 1 us to 10 s
+HIST_MIN_EXP = -6
+HIST_BINS_PER_DECADE = 8
+HIST_NUM_BINS = 7 * HIST_BINS_PER_DECADE
+DEFAULT_MAX_TRACE_EVENTS = 1000000
+
+
+def _hist_bin(duration):
+    if duration <= 0:
+        return 0
+    b = int((math.log10(duration) - HIST_MIN_EXP) * HIST_BINS_PER_DECADE)
+    return min(max(b, 0), HIST_NUM_BINS - 1)
+
+
+def hist_bin_edges():
+    """Lower edges (in seconds) of the histogram bins."""
+    return [10 ** (HIST_MIN_EXP + i / HIST_BINS_PER_DECADE)
+            for i in range(HIST_NUM_BINS)]
+
+
+class SectionStats(object):
+    """Latency statistics of one section."""
+
+    def __init__(self, category):
+        self.category = category
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * HIST_NUM_BINS
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self.histogram[_hist_bin(duration)] += 1
+
+    def percentile(self, q):
+        """Approximate percentile (upper edge of the histogram bin)."""
+        if self.count == 0:
+            return 0.0
+        threshold = q / 100.0 * self.count
+        n = 0
+        for i, c in enumerate(self.histogram):
+            n += c
+            if n >= threshold:
+                return min(10 ** (HIST_MIN_EXP + (i + 1) / HIST_BINS_PER_DECADE),
+                           self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'category': self.category,
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'histogram': self.histogram,
+        }
+
+
+class _Section(object):
+    __slots__ = ('profiler', 'name', 'category', 'start')
+
+    def __init__(self, profiler, name, category):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.profiler._stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        profiler = self.profiler
+        path = '/'.join(profiler._stack)
+        profiler._stack.pop()
+        profiler._record(path, self.name, self.category, self.start, end)
+        return False
+
+
+class _NullSection(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class Profiler(object):
+    """Collects hierarchical timing information of the control loop.
+
+    Args:
+        enabled: If False, sections are not recorded.
+        record_trace: Keep the individual sections as trace events.
+        max_trace_events: Maximum number of trace events kept in memory.
+            Further events are dropped (the statistics are still updated).
+    """
+
+    def __init__(self, enabled=True, record_trace=True,
+                 max_trace_events=DEFAULT_MAX_TRACE_EVENTS):
+        self.enabled = enabled
+        self.record_trace = record_trace
+        self.max_trace_events = max_trace_events
+        self.reset()
+
+    def reset(self):
+        self.stats = {}
+        self.num_ticks = 0
+        self.num_overruns = 0
+        self.max_overrun = 0.0
+        self.trace_events = []
+        self.num_dropped_events = 0
+        self._stack = []
+        self._t0 = time.perf_counter()
+
+    def section(self, name, category='section'):
+        """Context manager recording the time spent in the block."""
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name, category)
+
+    def end_tick(self, start, frameskip):
+        """Record a control step that started at ``start`` (perf_counter).
+
+        The step overruns its deadline if it took longer than the time
+        until the next action is due, i.e. frameskip control periods.
+        """
+        if not self.enabled:
+            return
+        end = time.perf_counter()
+        duration = end - start
+        self.num_ticks += 1
+        self._record('tick', 'tick', 'tick', start, end)
+        budget = frameskip / CONTROL_FREQUENCY
+        if duration > budget:
+            self.num_overruns += 1
+            self.max_overrun = max(self.max_overrun, duration - budget)
+            self._add_event({'name': 'deadline overrun', 'cat': 'overrun',
+                             'ph': 'i', 's': 'g', 'ts': self._us(end),
+                             'pid': os.getpid(), 'tid': 0,
+                             'args': {'duration': duration,
+                                      'budget': budget,
+                                      'stack': list(self._stack)}})
+
+    def _us(self, t):
+        return (t - self._t0) * 1e6
+
+    def _record(self, path, name, category, start, end):
+        stats = self.stats.get(path)
+        if stats is None:
+            stats = self.stats[path] = SectionStats(category)
+        stats.add(end - start)
+        if self.record_trace:
+            self._add_event({'name': name, 'cat': category, 'ph': 'X',
+                             'ts': self._us(start), 'dur': (end - start) * 1e6,
+                             'pid': os.getpid(), 'tid': 0})
+
+    def _add_event(self, event):
+        if len(self.trace_events) < self.max_trace_events:
+            self.trace_events.append(event)
+        else:
+            self.num_dropped_events += 1
+
+    def summary(self):
+        """Statistics of all sections (times in seconds)."""
+        return {
+            'num_ticks': self.num_ticks,
+            'num_overruns': self.num_overruns,
+            'max_overrun': self.max_overrun,
+            'sections': {path: s.to_dict()
+                         for path, s in sorted(self.stats.items())},
+        }
+
+    def print_summary(self):
+        print("==========================================")
+        print(f"Profile: {self.num_ticks} ticks, {self.num_overruns} deadline "
+              f"overruns (max. {self.max_overrun * 1000:.2f} ms)")
+        print(f"{'section':60s} {'count':>8s} {'mean ms':>9s} {'p99 ms':>9s} "
+              f"{'max ms':>9s}")
+        for path, s in sorted(self.stats.items()):
+            d = s.to_dict()
+            print(f"{path:60s} {d['count']:8d} {d['mean'] * 1000:9.3f} "
+                  f"{d['p99'] * 1000:9.3f} {d['max'] * 1000:9.3f}")
+        print("==========================================")
+
+    def export_trace(self, filename):
+        """Write the trace events and the summary to a JSON file.
+
+        The file uses the Chrome trace event format.
+        """
+        summary = self.summary()
+        summary['histogram_bin_edges'] = hist_bin_edges()
+        summary['num_dropped_events'] = self.num_dropped_events
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.trace_events,
+                       'displayTimeUnit': 'ms',
+                       'otherData': summary}, f)
+
+
+_profiler = Profiler(enabled=False)
+
+
+def get_profiler():
+    """Return the active profiler."""
+    return _profiler
+
+
+def enable_profiling(record_trace=True, max_trace_events=DEFAULT_MAX_TRACE_EVENTS):
+    """Replace the active profiler by a new, enabled one and return it."""
+    global _profiler
+    _profiler = Profiler(True, record_trace, max_trace_events)
+    return _profiler
+
+
+def disable_profiling():
+    global _profiler
+    _profiler = Profiler(enabled=False)
+
+
+def profile(category, name=None):
+    """Decorator recording the calls of a function as profiler section."""
+    def decorator(fn):
+        section_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _profiler.section(section_name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _export_at_exit(filename):
+    _profiler.print_summary()
+    _profiler.export_trace(filename)
+
+
+if os.environ.get('RRC_PROFILE_TRACE'):
+    enable_profiling()
+    atexit.register(_export_at_exit, os.environ['RRC_PROFILE_TRACE'])
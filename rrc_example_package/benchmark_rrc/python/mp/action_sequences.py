@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-from mp.utils import repeat
+from mp.utils import RepeatedSequence
 from mp.align_rotation import get_yaw_diff
 from mp.const import TRANSLU_CYAN, CUBOID_SIZE, INIT_JOINT_CONF
 from scipy.spatial.transform import Rotation as R
@@ -171,8 +171,7 @@ class ScriptedActions(object):
 
     def get_action_sequence(self, frameskip=1, action_repeat=1, action_repeat_end=1):
         action_seq = self._tip_positions_to_actions()
-        action_seq = repeat(action_seq, action_repeat)
-        action_seq += repeat([action_seq[-1]], action_repeat_end)
+        repeats = np.full(len(action_seq), action_repeat)
+        repeats[-1] += action_repeat_end
 
-        action_seq = repeat(action_seq, frameskip)
-        return action_seq
+        return RepeatedSequence(action_seq, repeats * frameskip)
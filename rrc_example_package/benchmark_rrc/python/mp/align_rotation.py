@@ -11,12 +11,30 @@ def get_most_vertical_axis(orientation):
     return sign * axes[ind], sign * axes_in_base_frame[ind]
 
 
+def get_most_vertical_axes(orientations):
+    """Batched version of get_most_vertical_axis for orientations [N, 4]."""
+    # rows of the transposed rotation matrices are the axes in base frame
+    axes_in_base_frame = np.swapaxes(R.from_quat(orientations).as_matrix(), 1, 2)
+    z = axes_in_base_frame[:, :, 2]
+    ind = np.argmax(np.abs(z), axis=1)
+    rows = np.arange(len(ind))
+    sign = np.sign(z[rows, ind])[:, None]
+    return sign * np.eye(3)[ind], sign * axes_in_base_frame[rows, ind]
+
+
 def project_cube_xy_plane(orientation):
     ax_cube_frame, ax_base_frame = get_most_vertical_axis(orientation)
     rot_align = vector_align_rotation(ax_base_frame, np.array([0, 0, 1]))
     return (rot_align * R.from_quat(orientation)).as_quat()
 
 
+def project_cube_xy_planes(orientations):
+    """Batched version of project_cube_xy_plane for orientations [N, 4]."""
+    _, ax_base_frame = get_most_vertical_axes(orientations)
+    rot_align = vector_align_rotations(ax_base_frame, np.array([0, 0, 1]))
+    return (rot_align * R.from_quat(orientations)).as_quat()
+
+
 def vector_align_rotation(a, b):
     """
     return Rotation that transform vector a to vector b
@@ -58,6 +76,45 @@ def vector_align_rotation(a, b):
     return rot
 
 
+def vector_align_rotations(a, b):
+    """
+    Batched version of vector_align_rotation
+
+    input
+    a : np.array(N, 3) or np.array(3)
+    b : np.array(N, 3) or np.array(3)
+
+    return
+    rot : scipy.spatial.transform.Rotation (N rotations)
+    """
+    a, b = np.broadcast_arrays(np.atleast_2d(a), np.atleast_2d(b))
+    norm_a = np.linalg.norm(a, axis=1, keepdims=True)
+    norm_b = np.linalg.norm(b, axis=1, keepdims=True)
+    assert np.all(norm_a != 0) and np.all(norm_b != 0)
+
+    a = a / norm_a
+    b = b / norm_b
+
+    cross = np.cross(a, b)
+    norm_cross = np.linalg.norm(cross, axis=1)
+    dot = np.sum(a * b, axis=1)
+
+    rotvec = np.zeros_like(a)
+    rot = norm_cross >= 1e-8
+    rotvec[rot] = (cross[rot] / norm_cross[rot, None]
+                   * np.arctan2(norm_cross[rot], dot[rot])[:, None])
+
+    # opposite direction a == -b
+    opposite = ~rot & (dot < 0)
+    if np.any(opposite):
+        a_opp = a[opposite]
+        c = np.eye(3)[np.argmax(np.linalg.norm(np.eye(3)[None] - a_opp[:, None], axis=2), axis=1)]
+        axis = np.cross(a_opp, c)
+        rotvec[opposite] = axis / np.linalg.norm(axis, axis=1, keepdims=True) * np.pi
+
+    return R.from_rotvec(rotvec)
+
+
 def roll_and_pitch_aligned(cube_orientation, goal_orientation):
     ax_cube, _ = get_most_vertical_axis(cube_orientation)
     ax_goal, _ = get_most_vertical_axis(goal_orientation)
@@ -72,6 +129,13 @@ def get_yaw_diff(ori, goal_ori):
     return rot.as_rotvec()[2]
 
 
+def get_yaw_diffs(oris, goal_oris):
+    """Batched version of get_yaw_diff for orientations [N, 4]."""
+    proj_goal_oris = project_cube_xy_planes(np.atleast_2d(goal_oris))
+    rot = R.from_quat(proj_goal_oris) * R.from_quat(oris).inv()
+    return rot.as_rotvec()[:, 2]
+
+
 def get_roll_pitch_axis_and_angle(cube_orientation, goal_orientation):
     if roll_and_pitch_aligned(cube_orientation, goal_orientation):
         return None, None
@@ -79,15 +143,14 @@ def get_roll_pitch_axis_and_angle(cube_orientation, goal_orientation):
     rot_goal = R.from_quat(project_cube_xy_plane(goal_orientation))
     ax_up_cube, _ = get_most_vertical_axis(cube_orientation)
 
-    diffs = []
     axis_angles = []
     for i, axis in enumerate(np.eye(3)):
         if ax_up_cube[i] != 0:
             continue
         for angle in [np.pi / 2, -np.pi / 2]:
-            rot_align = R.from_rotvec(axis * angle)
-            rot_diff = (rot_goal * (rot_cube * rot_align).inv()).magnitude()
-            diffs.append(rot_diff)
             axis_angles.append((axis, angle))
 
+    # evaluate all candidates at once
+    rot_align = R.from_rotvec([axis * angle for axis, angle in axis_angles])
+    diffs = (rot_goal * (rot_cube * rot_align).inv()).magnitude()
     return axis_angles[np.argmin(diffs)]
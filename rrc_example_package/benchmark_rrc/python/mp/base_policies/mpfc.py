@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
+import time
 import pybullet as p
 import numpy as np
-from mp.utils import get_rotation_between_vecs, slerp, Transform
+from mp.utils import get_rotation_between_vecs, slerp, Transforms, quat_multiply, quat_to_euler
 from trifinger_simulation import TriFingerPlatform
 from scipy.spatial.transform import Rotation
 
@@ -12,8 +13,10 @@ if DEBUG:
 
 class PlanningAndForceControlPolicy:
     BO_num_tipadjust_steps = 50  # BO
+    # number of tip adjustment waypoints computed per call (each needs three IK solves)
+    tipadjust_steps_per_call = 1
     def __init__(self, env, obs, fc_policy, path, action_repeat=2*2,
-                 adjust_tip=True, adjust_tip_ori=False):
+                 adjust_tip=True, adjust_tip_ori=False, time_budget=None):
         self.env = env
         self.fc_policy = fc_policy
         self.obs = obs
@@ -26,6 +29,14 @@ class PlanningAndForceControlPolicy:
         self._actions_in_progress = False
         self.adjust_tip_ori = adjust_tip_ori
         self.executing_tip_adjust = False
+        self._tip_adjust = None
+
+        # timing of __call__, calls taking longer than time_budget (in seconds) are reported
+        self.time_budget = time_budget
+        self.num_calls = 0
+        self.num_deadline_misses = 0
+        self.total_call_time = 0.0
+        self.max_call_time = 0.0
         if DEBUG:
             self.visual_markers = []
             self.vis_tip_center = None
@@ -33,7 +44,22 @@ class PlanningAndForceControlPolicy:
     def at_end_of_sequence(self, step):
         return step >= len(self.cube_sequence)
 
-    def add_tip_adjustments(self, obs):
+    def add_tip_adjustments(self, obs, max_steps=None):
+        """Append waypoints of the tip adjustment to the path.
+
+        The adjustment is started from obs and consists of BO_num_tipadjust_steps
+        waypoints.  They are computed incrementally: at most max_steps waypoints
+        are appended per call (all if None) and the next call continues the
+        adjustment.  A new adjustment is started once the last one is finished.
+        """
+        if self._tip_adjust is None:
+            self._start_tip_adjustments(obs)
+        num_added = 0
+        while self._tip_adjust is not None and (max_steps is None or num_added < max_steps):
+            self._add_next_tip_adjustment()
+            num_added += 1
+
+    def _start_tip_adjustments(self, obs):
         num_steps = self.BO_num_tipadjust_steps
         print("Appending to path....")
         # tip_pos = self.path.tip_path[-1]
@@ -41,50 +67,76 @@ class PlanningAndForceControlPolicy:
         cube_pos = self.cube_sequence[-1][:3]
         cube_ori = p.getQuaternionFromEuler(self.cube_sequence[-1][3:])
 
-        grasp = self.path.grasp
+        # cube poses and tip positions of all steps are computed at once, only
+        # the IK is solved step by step
+        resolution = np.arange(num_steps) / num_steps
+        translations = cube_pos + resolution[:, None] * dir
         if self.adjust_tip_ori:
             yaxis = np.array([0, 1, 0])
             goal_obj_yaxis = Rotation.from_quat(obs['goal_object_orientation']).apply(yaxis)
             obj_yaxis = Rotation.from_quat(cube_ori).apply(yaxis)
             diff_quat = get_rotation_between_vecs(obj_yaxis, goal_obj_yaxis)
-            resolution = np.arange(0, 1, 1.0 / num_steps)
             interp_quat = slerp(np.array([0, 0, 0, 1]), diff_quat, resolution)
+            rotations = quat_multiply(interp_quat, cube_ori)
+        else:
+            rotations = np.tile(cube_ori, (num_steps, 1))
+
+        self._tip_adjust = {
+            'i': 0,
+            'num_steps': num_steps,
+            'translations': translations,
+            'rotations': rotations,
+            'eulers': quat_to_euler(rotations),
+            'goal_tip_pos': Transforms(translations, rotations)(self.path.grasp.cube_tip_pos[None]),
+            'robot_position': np.array(obs['robot_position']),
+            'warning_counter': 0,
+            'warning_tips': [],
+        }
+
+    def _add_next_tip_adjustment(self):
+        adj = self._tip_adjust
+        i, num_steps = adj['i'], adj['num_steps']
+        goal_tip_pos = adj['goal_tip_pos'][i]
+        q = adj['robot_position']
 
-        warning_counter = 0
-        warning_tips = []
-        for i in range(num_steps):
-            translation = cube_pos + i / num_steps * dir
-            if self.adjust_tip_ori:
-                rotation = (Rotation.from_quat(interp_quat[i]) * Rotation.from_quat(cube_ori)).as_quat()
-            else:
-                rotation = cube_ori
-            goal_tip_pos = Transform(translation, rotation)(grasp.cube_tip_pos)
-            q = obs['robot_position']
-
-            for j, tip in enumerate(goal_tip_pos):
-                q = self.env.pinocchio_utils.inverse_kinematics(j, tip, q)
-                if q is None:
-                    q = self.joint_sequence[-1]
-                    # print(f'[tip adjustments] warning: IK solution is not found for tip {j}. Using the last joint conf')
-                    warning_counter += 1
-                    if j not in warning_tips:
-                        warning_tips.append(j)
-                    break
+        for j, tip in enumerate(goal_tip_pos):
+            q = self.env.pinocchio_utils.inverse_kinematics(j, tip, q)
             if q is None:
-                print('[tip adjustments] warning: IK solution is not found for all tip positions.')
-                print(f'[tip adjustments] aborting tip adjustments (loop {i} / {num_steps})')
+                q = self.joint_sequence[-1]
+                # print(f'[tip adjustments] warning: IK solution is not found for tip {j}. Using the last joint conf')
+                adj['warning_counter'] += 1
+                if j not in adj['warning_tips']:
+                    adj['warning_tips'].append(j)
                 break
-            target_cube_pose = np.concatenate([
-                translation,
-                p.getEulerFromQuaternion(rotation)
-            ])
-            self.cube_sequence.append(target_cube_pose)
-            self.joint_sequence.append(q)
-            self.path.tip_path.append(goal_tip_pos)
-        if warning_counter > 0:
-            print(f'[tip adjustments] warning: IK solution is not found for {warning_counter} / {num_steps} times on tips {warning_tips}.')
+        adj['i'] += 1
+        if q is None:
+            print('[tip adjustments] warning: IK solution is not found for all tip positions.')
+            print(f'[tip adjustments] aborting tip adjustments (loop {i} / {num_steps})')
+            self._finish_tip_adjustments()
+            return
+        target_cube_pose = np.concatenate([
+            adj['translations'][i],
+            adj['eulers'][i]
+        ])
+        self.cube_sequence.append(target_cube_pose)
+        self.joint_sequence.append(q)
+        self.path.tip_path.append(goal_tip_pos)
+        if adj['i'] >= num_steps:
+            self._finish_tip_adjustments()
+
+    def _finish_tip_adjustments(self):
+        adj = self._tip_adjust
+        if adj['warning_counter'] > 0:
+            print(f'[tip adjustments] warning: IK solution is not found for {adj["warning_counter"]} / {adj["num_steps"]} times on tips {adj["warning_tips"]}.')
+        self._tip_adjust = None
 
     def __call__(self, obs):
+        t_start = time.perf_counter()
+        action = self._compute_action(obs)
+        self._record_call_time(time.perf_counter() - t_start)
+        return action
+
+    def _compute_action(self, obs):
         if not self._actions_in_progress:
             if np.linalg.norm(
                 obs['robot_position'] - self.path.joint_conf[0]
@@ -97,8 +149,10 @@ class PlanningAndForceControlPolicy:
         self._actions_in_progress = True
 
         step = self._step
-        if self.adjust_tip and self.at_end_of_sequence(step):
-            self.add_tip_adjustments(obs)
+        if self.adjust_tip and (self.at_end_of_sequence(step) or self._tip_adjust is not None):
+            # continue a started adjustment even if it is not needed yet, so the
+            # waypoints are ready before the path runs out again
+            self.add_tip_adjustments(obs, self.tipadjust_steps_per_call)
         step = min(step, len(self.cube_sequence) - 1)
         target_cube_pose = self.cube_sequence[step]
         target_joint_conf = self.joint_sequence[step]
@@ -112,6 +166,24 @@ class PlanningAndForceControlPolicy:
         self._step += 1
         return self._clip_action(action)
 
+    def _record_call_time(self, duration):
+        self.num_calls += 1
+        self.total_call_time += duration
+        self.max_call_time = max(self.max_call_time, duration)
+        if self.time_budget is not None and duration > self.time_budget:
+            self.num_deadline_misses += 1
+            print(f'[mpfc] warning: step {self._step - 1} took {duration * 1000:.1f} ms '
+                  f'(budget: {self.time_budget * 1000:.1f} ms)')
+
+    def timing_summary(self):
+        """Statistics of the computation time of __call__ (in seconds)."""
+        return {
+            'num_calls': self.num_calls,
+            'mean': self.total_call_time / max(self.num_calls, 1),
+            'max': self.max_call_time,
+            'num_deadline_misses': self.num_deadline_misses,
+        }
+
     def _clip_action(self, action):
         tas = TriFingerPlatform.spaces.robot_torque.gym
         pas = TriFingerPlatform.spaces.robot_position.gym
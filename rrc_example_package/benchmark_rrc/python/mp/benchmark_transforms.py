@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+'''
+Benchmark of the batched pose helpers in mp.utils and mp.align_rotation.
+
+Each case is computed for N random poses, once with the per-pose version in a loop (as in grasp
+sampling, path generation and tip adjustment) and once with the batched version in one call.
+Both results are checked to be equal.
+
+Usage: python3 -m mp.benchmark_transforms [--n N]
+'''
+import argparse
+import time
+
+import numpy as np
+import pybullet as p
+from scipy.spatial.transform import Rotation
+
+from mp import align_rotation
+from mp.utils import (Transform, Transforms, slerp, batch_slerp, get_rotation_between_vecs,
+                      get_rotations_between_vecs, euler_to_quat)
+
+
+def tip_path_loop(cube_path, cube_tip_pos):
+    return np.asarray([Transform(pose[:3], p.getQuaternionFromEuler(pose[3:]))(cube_tip_pos)
+                       for pose in cube_path])
+
+
+def tip_path_batch(cube_path, cube_tip_pos):
+    return Transforms(cube_path[:, :3], euler_to_quat(cube_path[:, 3:]))(cube_tip_pos[None])
+
+
+def compose_loop(pos, quat, pos2, quat2):
+    return np.asarray([Transform(pos[i], quat[i])(Transform(pos2[i], quat2[i]).inverse()).T
+                       for i in range(len(pos))])
+
+
+def compose_batch(pos, quat, pos2, quat2):
+    return Transforms(pos, quat)(Transforms(pos2, quat2).inverse()).T
+
+
+def slerp_loop(quat, quat2, t):
+    return np.asarray([slerp(quat[i], quat2[i], t) for i in range(len(quat))])
+
+
+def slerp_batch(quat, quat2, t):
+    return batch_slerp(quat[:, None], quat2[:, None], t[None])
+
+
+def rotation_between_vecs_loop(v1, v2):
+    return np.asarray([get_rotation_between_vecs(v1[i], v2[i]) for i in range(len(v1))])
+
+
+def rotation_between_vecs_batch(v1, v2):
+    return get_rotations_between_vecs(v1, v2)
+
+
+def yaw_diff_loop(quat, quat2):
+    return np.asarray([align_rotation.get_yaw_diff(quat[i], quat2[i]) for i in range(len(quat))])
+
+
+def yaw_diff_batch(quat, quat2):
+    return align_rotation.get_yaw_diffs(quat, quat2)
+
+
+def timed(fn, *args):
+    t_start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t_start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n', type=int, default=1000, help='number of poses')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    pos = rng.uniform(-0.1, 0.1, (args.n, 3))
+    pos2 = rng.uniform(-0.1, 0.1, (args.n, 3))
+    quat = Rotation.random(args.n, random_state=rng).as_quat()
+    quat2 = Rotation.random(args.n, random_state=rng).as_quat()
+    cube_path = np.concatenate([pos, rng.uniform(-np.pi, np.pi, (args.n, 3))], axis=1)
+    cube_tip_pos = rng.uniform(-0.0325, 0.0325, (3, 3))
+    t = np.arange(0, 1, 0.02)
+
+    cases = [
+        ('tip path', tip_path_loop, tip_path_batch, (cube_path, cube_tip_pos)),
+        ('compose + inverse', compose_loop, compose_batch, (pos, quat, pos2, quat2)),
+        ('slerp', slerp_loop, slerp_batch, (quat, quat2, t)),
+        ('rotation between vecs', rotation_between_vecs_loop, rotation_between_vecs_batch, (pos, pos2)),
+        ('yaw diff', yaw_diff_loop, yaw_diff_batch, (quat, quat2)),
+    ]
+    print("{:<24}{:>14}{:>14}{:>10}".format('case', 'loop [ms]', 'batch [ms]', 'speedup'))
+    for name, loop_fn, batch_fn, fn_args in cases:
+        loop_time, loop_result = timed(loop_fn, *fn_args)
+        batch_time, batch_result = timed(batch_fn, *fn_args)
+        assert np.allclose(loop_result, batch_result, atol=1e-9), name
+        print("{:<24}{:>14.2f}{:>14.2f}{:>9.1f}x".format(name, loop_time * 1e3, batch_time * 1e3,
+                                                      loop_time / batch_time))
+
+
+if __name__ == '__main__':
+    main()
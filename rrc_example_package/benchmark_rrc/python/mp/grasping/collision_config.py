@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 from mp.const import COLLISION_TOLERANCE
+from env.profiler import profile
 workspace_id = 0
 
 class CollisionConfig:
@@ -53,4 +54,5 @@ class CollisionConfig:
         from pybullet_planning.interfaces.robots.collision import get_collision_fn
         import functools
         config = self.get_collision_conf(config_type)
-        return functools.partial(get_collision_fn(**config), diagnosis=diagnosis)
+        collision_fn = functools.partial(get_collision_fn(**config), diagnosis=diagnosis)
+        return profile('collision', 'collision_fn')(collision_fn)
@@ -2,6 +2,7 @@
 from mp.utils import Transform, keep_state
 from mp.const import MU, VIRTUAL_CUBOID_HALF_SIZE, INIT_JOINT_CONF
 from .ik import IKUtils
+from env.profiler import profile
 from .force_closure import CuboidForceClosureTest, CoulombFriction
 import itertools
 import numpy as np
@@ -182,6 +183,7 @@ class GraspSampler(object):
                             self.object_ori, self.T_cube_to_base,
                             self.T_base_to_cube, valid_tips)
 
+    @profile('planning')
     def __call__(self, shrink_region=[0.0, 0.6, 0.0], max_retries=40):
         retry = 0
         print("sampling a random grasp...")
@@ -2,11 +2,12 @@
 import pybullet as p
 import numpy as np
 import time
-from mp.utils import Transform, filter_none_elements, repeat
-from pybullet_planning import plan_wholebody_motion
+from mp.utils import Transforms, euler_to_quat, filter_none_elements, RepeatedSequence
+from pybullet_planning import plan_wholebody_motion, PlanningDeadline
 from collections import namedtuple
 from trifinger_simulation.tasks.move_cube import _ARENA_RADIUS, _min_height, _max_height
 from mp.const import COLLISION_TOLERANCE
+from env.profiler import profile
 
 from .ik import IKUtils
 from .grasp_sampling import GraspSampler
@@ -30,10 +31,11 @@ class Path(object):
         self.grasp = grasp
 
     def repeat(self, n):
+        # the repeated waypoints are not materialized, elements can still be appended
         return Path(
-            repeat(self.cube, n),
-            repeat(self.joint_conf, n),
-            repeat(self.tip_path, n),
+            RepeatedSequence(self.cube, n),
+            RepeatedSequence(self.joint_conf, n),
+            RepeatedSequence(self.tip_path, n),
             self.grasp
         )
 
@@ -88,12 +90,10 @@ def disable_tip_collisions(env):
 
 
 def _get_tip_path(cube_tip_positions, cube_path):
-    def get_quat(euler):
-        return p.getQuaternionFromEuler(euler)
-    return [
-        Transform(cube_pose[:3], get_quat(cube_pose[3:]))(cube_tip_positions)
-        for cube_pose in cube_path
-    ]
+    # transform the tip positions with all cube poses at once
+    cube_path = np.asarray(cube_path)
+    T_cube_to_base = Transforms(cube_path[:, :3], euler_to_quat(cube_path[:, 3:]))
+    return list(T_cube_to_base(np.asarray(cube_tip_positions)[None]))
 
 
 class WholeBodyPlanner:
@@ -113,10 +113,15 @@ class WholeBodyPlanner:
         c. if collision path is found, exit the loop
     3. Once a valid grasp and path is found, it returns `Path` object that contains
        both of grasp and path information
+
+    With `max_time`, all planning calls share one deadline: once it passes, the best path found so far is returned
+    (with `allow_partial`, this can be a path that ends at the closest pose to the goal the RRT reached).
+    The statistics of the last `plan` call are stored in `planning_stats`.
     """
 
     def __init__(self, env):
         self.env = env
+        self.planning_stats = None
 
         # disable collision check for tip
         self._disabled_collisions = disable_tip_collisions(self.env)
@@ -141,11 +146,13 @@ class WholeBodyPlanner:
             return False
         return _fingers_collision_fn
 
+    @profile('planning')
     def plan(self, pos, quat, goal_pos, goal_quat, heuristic_grasps=None, retry_grasp=10,
              use_rrt=False, use_incremental_rrt=False, min_goal_threshold=0.01,
              max_goal_threshold=0.8, use_ori=False, avoid_edge_faces=True,
              yawing_grasp=False, collision_tolerance=-COLLISION_TOLERANCE * 10,
-             path_min_height=0.01, direct_path=False):
+             path_min_height=0.01, direct_path=False, max_time=None, allow_partial=False):
+        deadline = PlanningDeadline(np.inf if max_time is None else max_time, allow_partial=allow_partial)
         resolutions = 0.03 * np.array([0.3, 0.3, 0.3, 1, 1, 1])  # roughly equiv to the lengths of one step.
 
         goal_ori = p.getEulerFromQuaternion(goal_quat)
@@ -171,7 +178,7 @@ class WholeBodyPlanner:
             goal_ori = p.getEulerFromQuaternion(quat)
             target_pose = np.concatenate([goal_pos, goal_ori])
         from mp.utils import keep_state
-        while cube_path is None and counter < retry_grasp + 1:
+        while cube_path is None and counter < retry_grasp + 1 and not deadline.expired():
             retry_count = max(0, counter)
             goal_threshold = ((retry_count / (retry_grasp + 1))
                               * (max_goal_threshold - min_goal_threshold)
@@ -207,12 +214,14 @@ class WholeBodyPlanner:
                         # if restarts == -1 --> only checks direct path
                         # otherwise, it tries direct path once and then try find a random path restarts + 1 times
                         restarts=-1 if counter == 0 or direct_path else 1,  # only check for direct path the first time
-                        additional_collision_fn=self.get_fingers_collision_fn() if yawing_grasp else None
+                        additional_collision_fn=self.get_fingers_collision_fn() if yawing_grasp else None,
+                        deadline=deadline
                     )
-                if cube_path is not None:
+                if cube_path is not None or deadline.expired():
                     break
             counter += 1
 
+        self.planning_stats = deadline.stats()
         if cube_path is None:
             raise RuntimeError('wholebody planning failed')
 
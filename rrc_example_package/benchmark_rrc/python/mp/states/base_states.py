@@ -23,6 +23,9 @@ class FailureState(State):
 
 class OpenLoopState(State):
     """Base class for open-loop control states."""
+    # the generator of the actions cannot be copied
+    snapshot_supported = False
+
     def __init__(self, env):
         self.env = env
         self.next_state = None
@@ -1,4 +1,14 @@
+import time
+import types
+from copy import deepcopy
+
+from env.profiler import get_profiler
+
+
 class State(object):
+    #: whether the state can be copied with get_state while it is active
+    snapshot_supported = True
+
     def __init__(self, env):
         self.env = env
 
@@ -12,6 +22,19 @@ class State(object):
         """clear any internal variables this state may keep"""
         raise NotImplementedError
 
+    def get_state(self, memo):
+        """copy the internal variables of this state (see StateMachine.get_state)"""
+        for name, value in vars(self).items():
+            if isinstance(value, types.GeneratorType):
+                raise TypeError(
+                    f"{type(self).__name__}.{name} is a generator and cannot"
+                    " be copied into a snapshot.")
+        return deepcopy(vars(self), memo)
+
+    def set_state(self, state, memo):
+        """restore internal variables returned by get_state"""
+        vars(self).update(deepcopy(state, memo))
+
     def get_action(self, position=None, torque=None, frameskip=1):
         return {'position': position, 'torque': torque, 'frameskip': frameskip}
 
@@ -53,14 +76,68 @@ class StateMachine(object):
             if isinstance(attr, State):
                 attr.reset()
 
+    def get_states(self):
+        """All states of the state machine, including nested sub-states."""
+        states = {}
+        stack = list(vars(self).values())
+        while stack:
+            attr = stack.pop()
+            if isinstance(attr, State) and id(attr) not in states:
+                states[id(attr)] = attr
+                stack.extend(vars(attr).values())
+        return list(states.values())
+
+    def _shared_memo(self, states):
+        # the env and the states themselves are shared, only their internal
+        # variables (e.g. planned paths and policies) are copied
+        memo = {id(state): state for state in states}
+        env = self.env
+        while env is not None and id(env) not in memo:
+            memo[id(env)] = env
+            env = getattr(env, 'env', None)
+        return memo
+
+    def get_state(self):
+        """Get a copy of the current state of the state machine.
+
+        Together with a snapshot of the simulation, this allows to continue an
+        episode from this point after a reset (see :meth:`set_state`).
+        """
+        states = self.get_states()
+        memo = self._shared_memo(states)
+        return {
+            'state': self.state,
+            'info': deepcopy(self.info, memo),
+            'states': [(state, state.get_state(memo)) for state in states],
+        }
+
+    def set_state(self, snapshot):
+        """Restore a copy returned by :meth:`get_state`.
+
+        Has to be called after :meth:`reset`, which clears the states.
+        """
+        states = [state for state, _ in snapshot['states']]
+        memo = self._shared_memo(states)
+        self.state = snapshot['state']
+        self.info = deepcopy(snapshot['info'], memo)
+        for state, state_vars in snapshot['states']:
+            state.set_state(state_vars, memo)
+
     def __call__(self, obs):
+        start = time.perf_counter()
+        action = self._step(obs)
+        get_profiler().end_tick(start, action['frameskip'])
+        return action
+
+    def _step(self, obs):
         prev_state = self.state
-        action, self.state, self.info = self.state(obs, self.info)
+        with get_profiler().section(prev_state.__class__.__name__, 'state'):
+            action, self.state, self.info = self.state(obs, self.info)
         if prev_state != self.state:
             print("==========================================")
             print(f"Entering State: {self.state.__class__.__name__}")
             print("==========================================")
         if action['frameskip'] == 0:
-            return self.__call__(obs)
+            return self._step(obs)
         else:
             return action
@@ -42,6 +42,77 @@ def get_rotation_between_vecs(v1, v2):
     return quat
 
 
+def get_rotations_between_vecs(v1, v2):
+    """Rotations from v1 to v2 for arrays of vectors.
+
+    Batched version of get_rotation_between_vecs.  v1 and v2 are arrays of
+    shape [N, 3] (or [3], broadcast to the other one).  Returns quaternions
+    of shape [N, 4].
+    """
+    v1, v2 = np.broadcast_arrays(np.atleast_2d(v1), np.atleast_2d(v2))
+    v1 = v1 / np.linalg.norm(v1, axis=1, keepdims=True)
+    v2 = v2 / np.linalg.norm(v2, axis=1, keepdims=True)
+    axis = np.cross(v1, v2)
+    axis_norm = np.linalg.norm(axis, axis=1)
+    dot = np.sum(v1 * v2, axis=1)
+    parallel = np.isclose(axis_norm, 0)
+
+    quat = np.zeros((len(v1), 4))
+    rot = ~parallel
+    angle = np.arccos(np.clip(dot[rot], -1.0, 1.0))
+    quat[rot, :3] = axis[rot] / axis_norm[rot, None] * np.sin(angle / 2)[:, None]
+    quat[rot, 3] = np.cos(angle / 2)
+    # zero rotation
+    quat[parallel & (dot > 0), 3] = 1.0
+    # 180 degree rotation around a random perpendicular axis
+    opposite = parallel & (dot <= 0)
+    if np.any(opposite):
+        perp = np.random.rand(np.sum(opposite), 3)
+        perp /= np.linalg.norm(perp, axis=1, keepdims=True)
+        perp -= np.sum(perp * v1[opposite], axis=1, keepdims=True) * v1[opposite]
+        quat[opposite, :3] = perp / np.linalg.norm(perp, axis=1, keepdims=True)
+    return quat
+
+
+def quat_multiply(q1, q2):
+    """Product q1 * q2 of quaternions (x, y, z, w) of shape [..., 4].
+
+    Same rotation as ``Rotation.from_quat(q1) * Rotation.from_quat(q2)``.
+    """
+    q1 = np.asarray(q1)
+    q2 = np.asarray(q2)
+    x1, y1, z1, w1 = np.moveaxis(q1, -1, 0)
+    x2, y2, z2, w2 = np.moveaxis(q2, -1, 0)
+    return np.stack([
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+    ], axis=-1)
+
+
+def quat_to_matrix(quat):
+    """Rotation matrices of shape [..., 3, 3] from quaternions (x, y, z, w)."""
+    quat = np.asarray(quat, dtype=float)
+    quat = quat / np.linalg.norm(quat, axis=-1, keepdims=True)
+    x, y, z, w = np.moveaxis(quat, -1, 0)
+    return np.stack([
+        1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w),
+        2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w),
+        2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y),
+    ], axis=-1).reshape(quat.shape[:-1] + (3, 3))
+
+
+def euler_to_quat(euler):
+    """Batched version of p.getQuaternionFromEuler for arrays of shape [N, 3]."""
+    return Rotation.from_euler('xyz', euler).as_quat()
+
+
+def quat_to_euler(quat):
+    """Batched version of p.getEulerFromQuaternion for arrays of shape [N, 4]."""
+    return Rotation.from_quat(quat).as_euler('xyz')
+
+
 # ref: https://en.wikipedia.org/wiki/Slerp
 def slerp(v0, v1, t_array):
     '''This performs Spherical linear interpolation.
@@ -49,28 +120,41 @@ def slerp(v0, v1, t_array):
     ex: slerp([1,0,0,0], [0,0,0,1], np.arange(0, 1, 0.001))
     '''
     t_array = np.array(t_array)
-    v0 = np.array(v0)
-    v1 = np.array(v1)
-    dot = np.sum(v0 * v1)
+    return batch_slerp(np.array(v0)[np.newaxis], np.array(v1)[np.newaxis],
+                       t_array)
 
-    if dot < 0.0:
-        v1 = -v1
-        dot = -dot
 
-    DOT_THRESHOLD = 0.9995
-    if dot > DOT_THRESHOLD:
-        result = v0[np.newaxis,:] + t_array[:,np.newaxis] * (v1 - v0)[np.newaxis,:]
-        return (result.T / np.linalg.norm(result, axis=1)).T
+def batch_slerp(v0, v1, t):
+    '''Spherical linear interpolation of arrays of quaternions.
 
-    theta_0 = np.arccos(dot)
-    sin_theta_0 = np.sin(theta_0)
+    v0 and v1 are quaternions of shape [..., 4] and t the interpolation
+    parameters of shape [...].  All shapes are broadcast against each other,
+    e.g. slerp of N pairs over the same M steps:
+    batch_slerp(v0[:, None], v1[:, None], t[None]) -> [N, M, 4]
+    '''
+    v0 = np.asarray(v0, dtype=float)
+    v1 = np.asarray(v1, dtype=float)
+    t = np.asarray(t, dtype=float)[..., np.newaxis]
+    dot = np.sum(v0 * v1, axis=-1, keepdims=True)
 
-    theta = theta_0 * t_array
-    sin_theta = np.sin(theta)
+    v1 = np.where(dot < 0.0, -v1, v1)
+    dot = np.abs(dot)
 
+    DOT_THRESHOLD = 0.9995
+    linear = dot > DOT_THRESHOLD
+    theta_0 = np.arccos(np.minimum(dot, 1.0))
+    sin_theta_0 = np.where(linear, 1.0, np.sin(theta_0))
+
+    theta = theta_0 * t
+    sin_theta = np.sin(theta)
     s0 = np.cos(theta) - dot * sin_theta / sin_theta_0
     s1 = sin_theta / sin_theta_0
-    return (s0[:,np.newaxis] * v0[np.newaxis,:]) + (s1[:,np.newaxis] * v1[np.newaxis,:])
+    result = s0 * v0 + s1 * v1
+    if np.any(linear):
+        lerp = v0 + t * (v1 - v0)
+        lerp /= np.linalg.norm(lerp, axis=-1, keepdims=True)
+        result = np.where(linear, lerp, result)
+    return result
 
 
 class Transform(object):
@@ -133,6 +217,87 @@ class Transform(object):
             return x
 
 
+class Transforms(object):
+    '''
+    N rigid transforms, the batched version of Transform.
+
+    Either pos [N, 3] and ori [N, 4] (quaternions) or T [N, 4, 4] have to be
+    given.  A single pos or ori is broadcast to the other one.
+    '''
+    def __init__(self, pos=None, ori=None, T=None):
+        if pos is not None and ori is not None:
+            R = quat_to_matrix(np.atleast_2d(ori))
+            pos = np.atleast_2d(np.asarray(pos, dtype=float))
+            n = max(len(R), len(pos))
+            self.R = np.broadcast_to(R, (n, 3, 3))
+            self.pos = np.broadcast_to(pos, (n, 3))
+        elif T is not None:
+            self.R = T[:, :3, :3]
+            self.pos = T[:, :3, -1]
+        else:
+            raise ValueError("You must specify T or both pos and ori.")
+
+    @classmethod
+    def from_rotation_matrix(cls, R, pos):
+        transforms = cls.__new__(cls)
+        transforms.R = R
+        transforms.pos = pos
+        return transforms
+
+    @property
+    def T(self):
+        T = np.zeros((len(self), 4, 4))
+        T[:, :3, :3] = self.R
+        T[:, :3, -1] = self.pos
+        T[:, 3, 3] = 1.0
+        return T
+
+    def __len__(self):
+        return len(self.R)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Transform(T=self.T[index])
+        return Transforms.from_rotation_matrix(self.R[index], self.pos[index])
+
+    def adjoint(self):
+        skew = np.zeros((len(self), 3, 3))
+        skew[:, 0, 1] = -self.pos[:, 2]
+        skew[:, 0, 2] = self.pos[:, 1]
+        skew[:, 1, 0] = self.pos[:, 2]
+        skew[:, 1, 2] = -self.pos[:, 0]
+        skew[:, 2, 0] = -self.pos[:, 1]
+        skew[:, 2, 1] = self.pos[:, 0]
+
+        adj = np.zeros((len(self), 6, 6))
+        adj[:, :3, :3] = self.R
+        adj[:, 3:, 3:] = self.R
+        adj[:, 3:, :3] = np.matmul(skew, self.R)
+        return adj
+
+    def inverse(self):
+        R_inv = np.swapaxes(self.R, 1, 2)
+        pos = -np.matmul(R_inv, self.pos[..., None])[..., 0]
+        return Transforms.from_rotation_matrix(R_inv, pos)
+
+    def __call__(self, x):
+        '''
+        Compose with other Transforms (elementwise, a single one is broadcast)
+        or transform points: x of shape [N, 3] transforms one point per
+        transform, x of shape [N, K, 3] (or [1, K, 3]) K points per transform.
+        '''
+        if isinstance(x, Transform):
+            x = Transforms(T=x.T[None])
+        if isinstance(x, Transforms):
+            R = np.matmul(self.R, x.R)
+            pos = np.matmul(self.R, x.pos[..., None])[..., 0] + self.pos
+            return Transforms.from_rotation_matrix(R, pos)
+        x = np.asarray(x)
+        if x.ndim == 2:
+            return np.matmul(self.R, x[..., None])[..., 0] + self.pos
+        return np.matmul(x, np.swapaxes(self.R, 1, 2)) + self.pos[:, None]
+
+
 def is_valid_action(action, action_type='position'):
     from trifinger_simulation.trifinger_platform import TriFingerPlatform
     spaces = TriFingerPlatform.spaces
@@ -152,26 +317,101 @@ def repeat(sequence, num_repeat=3):
     return list(e for e in sequence for _ in range(num_repeat))
 
 
-def ease_out(sequence, in_rep=1, out_rep=5):
+def ease_out_repeats(length, in_rep=1, out_rep=5):
     '''
-    create "ease out" motion where an action is repeated for *out_rep* times at the end.
+    number of repetitions of each element for an "ease out" motion (see ease_out).
     '''
-    in_seq_length = len(sequence[:-len(sequence) // 3])
-    out_seq_length = len(sequence[-len(sequence) // 3:])
+    out_seq_length = -(-length // 3)  # the last third (rounded up)
+    in_seq_length = length - out_seq_length
     x = [0, out_seq_length - 1]
     rep = [in_rep, out_rep]
-    out_repeats = np.interp(list(range(out_seq_length)), x, rep).astype(int).tolist()
+    out_repeats = np.interp(np.arange(out_seq_length), x, rep).astype(int)
+    in_repeats = (np.ones(in_seq_length) * in_rep).astype(int)
+    return np.concatenate([in_repeats, out_repeats])
+
 
-    #in_repeats = np.ones(in_seq_length).astype(int).tolist()
-    in_repeats = np.ones(in_seq_length) * in_rep
-    in_repeats = in_repeats.astype(int).tolist()
-    repeats = in_repeats + out_repeats
+def ease_out(sequence, in_rep=1, out_rep=5):
+    '''
+    create "ease out" motion where an action is repeated for *out_rep* times at the end.
+    '''
+    repeats = ease_out_repeats(len(sequence), in_rep, out_rep)
     assert len(repeats) == len(sequence)
+    return RepeatedSequence(sequence, repeats)
+
+
+class RepeatedSequence(object):
+    '''
+    A sequence in which every element is repeated a number of times (like the result of repeat
+    or ease_out) without materializing the repetitions.
+
+    The distinct elements are stored once in a numpy array and an index (i.e. a control step) is
+    mapped to its element with the cumulative repeat counts. Elements can be appended in
+    amortized O(1).
 
-    seq = [repeat([e], n_rep) for e, n_rep in zip(sequence, repeats)]
-    seq = [y for x in seq for y in x]  # flatten it
+    [a, b] with repeats [2, 3] --> [a, a, b, b, b]
 
-    return seq
+    If sequence is a RepeatedSequence itself, its repetitions are multiplied by repeats.
+    '''
+    def __init__(self, sequence=(), repeats=1):
+        if isinstance(sequence, RepeatedSequence):
+            repeats = sequence.repeats * repeats
+            sequence = sequence.elements
+        elements = np.asarray(sequence, dtype=float)
+        n = len(elements)
+        self._elements = elements.copy()
+        self._ends = np.cumsum(np.broadcast_to(np.asarray(repeats, dtype=np.int64), (n,)))
+        self._n = n
+
+    def __len__(self):
+        return int(self._ends[self._n - 1]) if self._n > 0 else 0
+
+    @property
+    def elements(self):
+        '''the distinct elements (without repetitions)'''
+        return self._elements[:self._n]
+
+    @property
+    def repeats(self):
+        '''number of repetitions of each element'''
+        return np.diff(self._ends[:self._n], prepend=0)
+
+    def element_index(self, index):
+        '''index of the element at the given position(s) of the sequence'''
+        index = np.asarray(index, dtype=np.int64)
+        length = len(self)
+        index = np.where(index < 0, index + length, index)
+        if np.any((index < 0) | (index >= length)):
+            raise IndexError('RepeatedSequence index out of range')
+        return np.searchsorted(self._ends[:self._n], index, side='right')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.elements[self.element_index(np.arange(*index.indices(len(self))))]
+        return self._elements[self.element_index(index)]
+
+    def __iter__(self):
+        for element, num_repeat in zip(self.elements, self.repeats):
+            for _ in range(num_repeat):
+                yield element
+
+    def append(self, element, num_repeat=1):
+        element = np.asarray(element, dtype=float)
+        if self._n == 0 and self._elements.shape[1:] != element.shape:
+            self._elements = np.empty((0,) + element.shape)
+        if self._n == len(self._elements):
+            capacity = max(2 * self._n, 16)
+            elements = np.empty((capacity,) + self._elements.shape[1:])
+            elements[:self._n] = self.elements
+            ends = np.empty(capacity, dtype=np.int64)
+            ends[:self._n] = self._ends[:self._n]
+            self._elements, self._ends = elements, ends
+        self._ends[self._n] = len(self) + num_repeat
+        self._elements[self._n] = element
+        self._n += 1
+
+    def repeat(self, num_repeat):
+        '''repeat every element num_repeat times (see repeat)'''
+        return RepeatedSequence(self, num_repeat)
 
 
 class keep_state:
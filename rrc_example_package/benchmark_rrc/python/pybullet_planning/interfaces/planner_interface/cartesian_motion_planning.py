@@ -190,8 +190,6 @@ def plan_cartesian_motion_lg(robot, joints, waypoint_poses, sample_ik_fn=None, c
     for i in range(graph.get_rungs_size()-1):
         st_rung_id = i
         end_rung_id = i + 1
-        jt1_list = graph.get_data(st_rung_id)
-        jt2_list = graph.get_data(end_rung_id)
         st_size = graph.get_rung_vert_size(st_rung_id)
         end_size = graph.get_rung_vert_size(end_rung_id)
         # if st_size == 0 or end_size == 0:
@@ -204,13 +202,7 @@ def plan_cartesian_motion_lg(robot, joints, waypoint_poses, sample_ik_fn=None, c
         # fully-connected ladder graph
         edge_builder = EdgeBuilder(st_size, end_size, dof, upper_tm=upper_times[i], \
             joint_vel_limits=joint_vel_limits, preference_cost=1.0)
-        for k in range(st_size):
-            st_jt_id = k * dof
-            for j in range(end_size):
-                end_jt_id = j * dof
-                edge_builder.consider(jt1_list[st_jt_id : st_jt_id+dof], jt2_list[end_jt_id : end_jt_id+dof], j)
-            edge_builder.next(k)
-        edges = edge_builder.result
+        costs = edge_builder.build(graph.get_rung_confs(st_rung_id), graph.get_rung_confs(end_rung_id))
 
         # TODO: more report information here
         assert edge_builder.has_edges, 'no edge built between {}-{}'.format(st_rung_id, end_rung_id)
@@ -218,7 +210,7 @@ def plan_cartesian_motion_lg(robot, joints, waypoint_poses, sample_ik_fn=None, c
         #     print('no edge built between {}-{}'.format(st_id, end_id))
         #     return None
 
-        graph.assign_edges(i, edges)
+        graph.assign_costs(i, costs)
 
     # * use current conf in the env as start_conf
     start_conf = get_joint_positions(robot, joints)
@@ -60,22 +60,13 @@ class DAGSearch(object):
             self.solution[j].distance = np.inf*np.ones(len(self.solution[j]))
 
         for r_id in range(0, len(self.solution)-1):
-            n_verts = self.graph.get_rung_vert_size(r_id)
             next_r_id = r_id + 1
-            # for each vert in the out edge list
-            max_rung_cost = np.inf
-            for v_id in range(n_verts):
-                u_cost = self.distance(r_id, v_id)
-                edges = self.graph.get_edges(r_id)[v_id]
-                dv = np.inf
-                for edge in edges:
-                    dv = u_cost + edge.cost
-                    if dv < self.distance(next_r_id, edge.idx):
-                        self.solution[next_r_id].distance[edge.idx] = dv
-                        self.solution[next_r_id].predecessor[edge.idx] = v_id
-                if dv < max_rung_cost:
-                    max_rung_cost = dv
-            # print('Rung #{}: {}'.format(r_id, max_rung_cost))
+            # min-plus product of the distances with the edge cost matrix
+            # (the first vert with minimal cost is the predecessor, unreachable verts keep predecessor 0 and np.inf)
+            dv = self.solution[r_id].distance[:, None] + self.graph.get_cost_matrix(r_id)
+            predecessor = np.argmin(dv, axis=0)
+            self.solution[next_r_id].predecessor = predecessor
+            self.solution[next_r_id].distance = dv[predecessor, np.arange(dv.shape[1])]
 
         return min(self.solution[-1].distance)
 
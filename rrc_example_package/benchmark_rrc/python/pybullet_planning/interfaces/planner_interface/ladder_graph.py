@@ -12,11 +12,14 @@ class LadderGraphEdge(object):
 
 
 class LadderGraphRung(object):
-    def __init__(self, id=None, data=[], edges=[]):
+    def __init__(self, id=None, data=[], edges=[], costs=None):
         self.id = id
         # joint_data: joint values are stored in one contiguous list
         self.data = data
         self.edges = edges
+        # dense edge costs to the next rung, shape (n_verts, n_next_verts), np.inf where there is no edge.
+        # If given, it replaces the edge lists.
+        self.costs = costs
 
     def __repr__(self):
         return 'id {0}, data {1}, edge num {2}'.format(self.id, len(self.data), len(self.edges))
@@ -37,14 +40,33 @@ class LadderGraph(object):
         return self.rungs[rung_id]
 
     def get_edges(self, rung_id):
-        return self.get_rung(rung_id).edges
+        rung = self.get_rung(rung_id)
+        if rung.costs is not None:
+            return [[LadderGraphEdge(idx=int(j), cost=row[j]) for j in np.flatnonzero(np.isfinite(row))]
+                    for row in rung.costs]
+        return rung.edges
 
     def get_edge_sizes(self):
-        return [len(r.edges) for r in self.rungs]
+        return [len(r.edges) if r.costs is None else len(r.costs) for r in self.rungs]
+
+    def get_cost_matrix(self, rung_id):
+        """edge costs from rung_id to the next rung, shape (n_verts, n_next_verts), np.inf where there is no edge"""
+        rung = self.get_rung(rung_id)
+        if rung.costs is not None:
+            return rung.costs
+        costs = np.full((self.get_rung_vert_size(rung_id), self.get_rung_vert_size(rung_id + 1)), np.inf)
+        for v_id, v_out_edges in enumerate(rung.edges):
+            for edge in v_out_edges:
+                costs[v_id, edge.idx] = min(costs[v_id, edge.idx], edge.cost)
+        return costs
 
     def get_data(self, rung_id):
         return self.get_rung(rung_id).data
 
+    def get_rung_confs(self, rung_id):
+        """joint values of the verts of a rung as array of shape (n_verts, dof)"""
+        return np.asarray(self.get_rung(rung_id).data, dtype=float).reshape(-1, self.dof)
+
     def get_rungs_size(self):
         return len(self.rungs)
 
@@ -90,7 +112,15 @@ class LadderGraph(object):
 
     def assign_edges(self, r_id, edges):
         # edges_ref = self.get_edges(r_id)
-        self.get_rung(r_id).edges = edges
+        rung = self.get_rung(r_id)
+        rung.edges = edges
+        rung.costs = None
+
+    def assign_costs(self, r_id, costs):
+        """assign the edges to the next rung as cost matrix (see EdgeBuilder.build)"""
+        rung = self.get_rung(r_id)
+        rung.costs = np.asarray(costs, dtype=float)
+        rung.edges = []
 
     # TODO: from_data / to_data
     # ! but we might need to think about the data format, the data can be large...
@@ -117,6 +147,35 @@ class EdgeBuilder(object):
             for i in range(self.dof_):
                 self.max_dtheta_[i] = joint_vel_limits[i]*upper_tm
 
+    def build(self, st_jts, end_jts):
+        """build the edges between all start and end verts at once
+
+        Parameters
+        ----------
+        st_jts : array-like of shape (n_start, dof)
+            joint values of the start verts
+        end_jts : array-like of shape (n_end, dof)
+            joint values of the end verts
+
+        Returns
+        -------
+        np.ndarray of shape (n_start, n_end)
+            edge costs (same as the ones of consider), np.inf if the joint deltas exceed the velocity limits
+        """
+        st_jts = np.asarray(st_jts, dtype=float).reshape(-1, self.dof_)
+        end_jts = np.asarray(end_jts, dtype=float).reshape(-1, self.dof_)
+        costs = np.zeros((len(st_jts), len(end_jts)))
+        valid = np.ones(costs.shape, dtype=bool)
+        # accumulate per dof to only keep (n_start, n_end) arrays in memory
+        for i in range(self.dof_):
+            delta_jt = np.abs(st_jts[:, i, None] - end_jts[None, :, i])
+            valid &= delta_jt <= self.max_dtheta_[i]
+            costs += delta_jt
+        costs *= self.preference_cost
+        costs[~valid] = np.inf
+        self.has_edges_ = self.has_edges_ or bool(valid.any())
+        return costs
+
     def consider(self, st_jt, end_jt, index):
         """index: to_id"""
         # TODO check delta joint val exceeds the joint_vel_limits
@@ -134,8 +193,8 @@ class EdgeBuilder(object):
         # self.count_ += 1
 
     def next(self, i):
-        #TODO: want to do std::move here to transfer memory...
-        self.result_edges_[i] = deepcopy(self.edge_scratch_)
+        # the scratch list is replaced below, so it can be handed over without copying
+        self.result_edges_[i] = self.edge_scratch_
         self.has_edges_ = self.has_edges_ or len(self.edge_scratch_) > 0
         self.edge_scratch_ = []
         # self.count_ = 0
@@ -182,26 +241,18 @@ def append_ladder_graph(current_graph, next_graph, upper_tm=None, joint_vel_limi
         current_graph.rungs[cur_size + i] = next_graph.rungs[i]
 
     # connect graphs at the boundary
-    a_rung = current_graph.get_rung(cur_size - 1)
-    b_rung = current_graph.get_rung(cur_size)
-    n_st_vert = int(len(a_rung.data) / dof)
-    n_end_vert = int(len(b_rung.data) / dof)
-
-    edge_builder = EdgeBuilder(n_st_vert, n_end_vert, dof, upper_tm=upper_tm, joint_vel_limits=joint_vel_limits)
-    for k in range(n_st_vert):
-        st_jt_id = k * dof
-        for j in range(n_end_vert):
-            end_jt_id = j * dof
-            edge_builder.consider(a_rung.data[st_jt_id : st_jt_id+dof], b_rung.data[end_jt_id : end_jt_id+dof], j)
-        edge_builder.next(k)
+    a_jts = current_graph.get_rung_confs(cur_size - 1)
+    b_jts = current_graph.get_rung_confs(cur_size)
+
+    edge_builder = EdgeBuilder(len(a_jts), len(b_jts), dof, upper_tm=upper_tm, joint_vel_limits=joint_vel_limits)
+    costs = edge_builder.build(a_jts, b_jts)
 
     # TODO: more report information here
     assert edge_builder.has_edges, 'no edge built between {}-{}'.format(cur_size-1, cur_size)
     # if edge_builder.has_edges:
     #    print('no edge built between {}-{}'.format(cur_size-1, cur_size))
 
-    edges_list = edge_builder.result
-    current_graph.assign_edges(cur_size - 1, edges_list)
+    current_graph.assign_costs(cur_size - 1, costs)
     return current_graph
 
 
@@ -232,6 +283,17 @@ def concatenate_graph_vertically(graph_above, graph_below):
     num_rungs = graph_above.size
     for i in range(num_rungs):
         rung_above = graph_above.get_rung(i)
+        if i != num_rungs - 1 and (rung_above.costs is not None or graph_below.get_rung(i).costs is not None):
+            # block diagonal cost matrix, no edges between the verts of the two graphs
+            # (computed before the rung data is extended)
+            above_costs = graph_above.get_cost_matrix(i)
+            below_costs = graph_below.get_cost_matrix(i)
+            costs = np.full(np.add(above_costs.shape, below_costs.shape), np.inf)
+            costs[:above_costs.shape[0], :above_costs.shape[1]] = above_costs
+            costs[above_costs.shape[0]:, above_costs.shape[1]:] = below_costs
+            rung_above.data.extend(graph_below.get_rung(i).data)
+            graph_above.assign_costs(i, costs)
+            continue
         above_jts = graph_above.get_rung(i).data
         below_jts = graph_below.get_rung(i).data
         above_jts.extend(below_jts)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import itertools
+import unittest
+
+import numpy as np
+
+from pybullet_planning.interfaces.planner_interface.ladder_graph import \
+    LadderGraph, EdgeBuilder
+from pybullet_planning.interfaces.planner_interface.dag_search import DAGSearch
+
+DOF = 9
+UPPER_TM = 1.0
+JOINT_VEL_LIMITS = [1.2] * DOF
+
+
+def random_rungs(rng, n_rungs=4, max_verts=4):
+    return [rng.uniform(-1, 1, size=(rng.randint(1, max_verts + 1), DOF))
+            for _ in range(n_rungs)]
+
+
+def make_graph(rungs, use_cost_matrix=True):
+    graph = LadderGraph(DOF)
+    graph.resize(len(rungs))
+    for r_id, confs in enumerate(rungs):
+        graph.assign_rung(r_id, confs.tolist())
+    for r_id in range(len(rungs) - 1):
+        st_jts, end_jts = rungs[r_id], rungs[r_id + 1]
+        edge_builder = EdgeBuilder(len(st_jts), len(end_jts), DOF,
+                                   upper_tm=UPPER_TM,
+                                   joint_vel_limits=JOINT_VEL_LIMITS)
+        if use_cost_matrix:
+            graph.assign_costs(r_id, edge_builder.build(st_jts, end_jts))
+        else:
+            for i, st_jt in enumerate(st_jts):
+                for j, end_jt in enumerate(end_jts):
+                    edge_builder.consider(st_jt, end_jt, j)
+                edge_builder.next(i)
+            graph.assign_edges(r_id, edge_builder.result)
+    return graph
+
+
+def brute_force_distances(graph):
+    """minimal cost to reach each vert of the last rung by enumerating all paths"""
+    n_rungs = graph.get_rungs_size()
+    costs = [graph.get_cost_matrix(r_id) for r_id in range(n_rungs - 1)]
+    distances = np.full(graph.get_rung_vert_size(n_rungs - 1), np.inf)
+    for path in itertools.product(*[range(n) for n in graph.get_vert_sizes()]):
+        cost = sum(costs[r_id][path[r_id], path[r_id + 1]]
+                   for r_id in range(n_rungs - 1))
+        distances[path[-1]] = min(distances[path[-1]], cost)
+    return distances
+
+
+def path_cost(graph, path):
+    confs = np.array(path)
+    return np.abs(np.diff(confs, axis=0)).sum()
+
+
+class TestLadderGraph(unittest.TestCase):
+    """Compare the cost-matrix DAG search with the edge lists and a brute-force search.
+
+    Costs are only compared up to floating-point rounding, as the order in
+    which the joint deltas are summed up differs.
+    """
+
+    def test_cost_matrix_matches_edge_lists(self):
+        rng = np.random.RandomState(0)
+        for _ in range(20):
+            rungs = random_rungs(rng)
+            matrix_graph = make_graph(rungs, use_cost_matrix=True)
+            edge_graph = make_graph(rungs, use_cost_matrix=False)
+            for r_id in range(len(rungs) - 1):
+                expected = edge_graph.get_cost_matrix(r_id)
+                actual = matrix_graph.get_cost_matrix(r_id)
+                np.testing.assert_array_equal(np.isinf(actual),
+                                              np.isinf(expected))
+                np.testing.assert_allclose(actual, expected)
+
+    def test_dag_search_matches_brute_force(self):
+        rng = np.random.RandomState(1)
+        n_reachable = 0
+        for _ in range(50):
+            rungs = random_rungs(rng)
+            for use_cost_matrix in (True, False):
+                graph = make_graph(rungs, use_cost_matrix)
+                dag_search = DAGSearch(graph)
+                min_cost = dag_search.run()
+
+                expected = brute_force_distances(graph)
+                np.testing.assert_allclose(dag_search.solution[-1].distance,
+                                           expected)
+                self.assertAlmostEqual(min_cost, expected.min())
+
+            if np.isfinite(min_cost):
+                n_reachable += 1
+                path = dag_search.shortest_path()
+                self.assertEqual(len(path), len(rungs))
+                self.assertAlmostEqual(path_cost(graph, path), min_cost)
+        # make sure that the velocity limits do not cut all paths
+        self.assertGreater(n_reachable, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
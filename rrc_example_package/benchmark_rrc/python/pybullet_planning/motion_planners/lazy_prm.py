@@ -5,11 +5,14 @@ from .utils import INF, elapsed_time
 from .rrt_connect import direct_path
 from .smoothing import smooth_path
 
+import os
+import pickle
 import random
 import time
 import numpy as np
 
 __all__ = [
+    'Roadmap',
     'lazy_prm'
     ]
 
@@ -64,13 +67,14 @@ def wastar_search(start_v, end_v, neighbors_fn, cost_fn=unit_cost_fn,
                     heappush(queue, (priority_fn(next_g, next_h), next_g, next_v))
     return None
 
-def check_path(path, colliding_vertices, colliding_edges, samples, extend_fn, collision_fn):
+def check_path(path, colliding_vertices, colliding_edges, samples, extend_fn, collision_fn, roadmap=None):
     # TODO: bisect order
     vertices = list(path)
     random.shuffle(vertices)
     for v in vertices:
         if v not in colliding_vertices:
-            colliding_vertices[v] = collision_fn(samples[v])
+            colliding_vertices[v] = ((roadmap is not None and roadmap.check_vertex(v, samples[v]))
+                                     or collision_fn(samples[v]))
         if colliding_vertices[v]:
             return False
 
@@ -78,57 +82,244 @@ def check_path(path, colliding_vertices, colliding_edges, samples, extend_fn, co
     random.shuffle(edges)
     for v1, v2 in edges:
         if (v1, v2) not in colliding_edges:
-            segment = list(extend_fn(samples[v1], samples[v2]))
-            random.shuffle(segment)
-            colliding_edges[v1, v2] = any(map(collision_fn, segment))
+            if roadmap is not None and roadmap.check_edge(v1, v2, samples[v1], samples[v2], extend_fn):
+                colliding_edges[v1, v2] = True
+            else:
+                segment = list(extend_fn(samples[v1], samples[v2]))
+                random.shuffle(segment)
+                colliding_edges[v1, v2] = any(map(collision_fn, segment))
             colliding_edges[v2, v1] = colliding_edges[v1, v2]
         if colliding_edges[v1, v2]:
             return False
     return True
 
+
+class Roadmap(object):
+    """roadmap of lazy_prm which is kept across queries (and can be stored on disk)
+
+    It keeps the sampled vertices, their neighbors and the results of static_collision_fn for
+    vertices and edges, which are validated lazily (only when they are part of a candidate path).
+    A query only adds its start and end conf as temporary vertices and checks the vertices and
+    edges of the candidate paths with its own collision_fn, which then only has to cover what changes
+    between queries (e.g. the moving object).
+
+    The roadmap is only valid as long as the static obstacles, the joint limits (sample_fn) and the
+    resolution of extend_fn stay the same.
+
+    Parameters
+    ----------
+    weights : array-like, optional
+        weights of the joints for the distance between confs, by default all ones
+    p_norm : int, optional
+        norm of the distance, by default 2
+    max_degree : int, optional
+        number of nearest neighbors of each vertex, by default 10
+    max_distance : float, optional
+        maximum distance of neighbors, by default INF
+    approximate_eps : float, optional
+        eps of the nearest neighbor query, by default 0.0
+    static_collision_fn : function, optional
+        collision check against the static obstacles, by default None (no static checks)
+    """
+
+    def __init__(self, weights=None, p_norm=2, max_degree=10, max_distance=INF, approximate_eps=0.0,
+                 static_collision_fn=None):
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.p_norm = p_norm
+        self.max_degree = max_degree
+        self.max_distance = max_distance
+        self.approximate_eps = approximate_eps
+        self.static_collision_fn = static_collision_fn
+        self.samples = []
+        self.neighbors = {}
+        # results of static_collision_fn by vertex and by edge (v1, v2)
+        self.colliding_vertices = {}
+        self.colliding_edges = {}
+        self._embedded = None
+        self._kd_tree = None
+
+    def __len__(self):
+        return len(self.samples)
+
+    def embed(self, conf):
+        conf = np.asarray(conf, dtype=float)
+        return conf if self.weights is None else self.weights * conf
+
+    def distance(self, q1, q2):
+        return np.linalg.norm(self.embed(q2) - self.embed(q1), ord=self.p_norm)
+
+    def grow(self, sample_fn, num_samples):
+        """add num_samples vertices and connect all vertices to their nearest neighbors"""
+        self.samples.extend(np.asarray(sample_fn(), dtype=float) for _ in range(num_samples))
+        self._embedded = np.array([self.embed(q) for q in self.samples])
+        self._kd_tree = KDTree(self._embedded)
+        # edges of previous neighbors are kept, so that their collision results stay useful
+        for v1 in range(len(self.samples)):
+            self.neighbors.setdefault(v1, set())
+            for v2 in self.nearest(self._embedded[v1], embedded=True):
+                if v1 != v2:
+                    self.neighbors[v1].add(v2)
+                    self.neighbors.setdefault(v2, set()).add(v1)
+
+    def nearest(self, conf, embedded=False):
+        """indices of the nearest vertices of conf (at most max_degree + 1)"""
+        if self._kd_tree is None:
+            return []
+        distances, neighbors = self._kd_tree.query(conf if embedded else self.embed(conf),
+                                                   k=min(self.max_degree+1, len(self.samples)),
+                                                   eps=self.approximate_eps, p=self.p_norm,
+                                                   distance_upper_bound=self.max_distance)
+        return [int(v) for d, v in zip(np.atleast_1d(distances), np.atleast_1d(neighbors))
+                if d < self.max_distance]
+
+    def check_vertex(self, v, conf):
+        """static collision of vertex v (cached for the vertices of the roadmap)"""
+        if self.static_collision_fn is None:
+            return False
+        if v >= len(self.samples):
+            return self.static_collision_fn(conf)
+        if v not in self.colliding_vertices:
+            self.colliding_vertices[v] = self.static_collision_fn(conf)
+        return self.colliding_vertices[v]
+
+    def check_edge(self, v1, v2, q1, q2, extend_fn):
+        """static collision of edge (v1, v2) (cached for the edges of the roadmap)"""
+        if self.static_collision_fn is None:
+            return False
+        if (v1, v2) in self.colliding_edges:
+            return self.colliding_edges[v1, v2]
+        colliding = any(map(self.static_collision_fn, extend_fn(q1, q2)))
+        if max(v1, v2) < len(self.samples):
+            self.colliding_edges[v1, v2] = self.colliding_edges[v2, v1] = colliding
+        return colliding
+
+    def save(self, path):
+        data = {
+            'weights': self.weights,
+            'p_norm': self.p_norm,
+            'max_degree': self.max_degree,
+            'max_distance': self.max_distance,
+            'approximate_eps': self.approximate_eps,
+            'samples': np.array(self.samples),
+            'edges': [(v1, v2) for v1, v2s in self.neighbors.items() for v2 in v2s if v1 < v2],
+            'colliding_vertices': self.colliding_vertices,
+            'colliding_edges': self.colliding_edges,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, static_collision_fn=None):
+        """load a roadmap stored with save (static_collision_fn is not stored and has to be given again)"""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        roadmap = cls(data['weights'], data['p_norm'], data['max_degree'], data['max_distance'],
+                      data['approximate_eps'], static_collision_fn=static_collision_fn)
+        roadmap.samples = list(data['samples'])
+        roadmap.neighbors = {v: set() for v in range(len(roadmap.samples))}
+        for v1, v2 in data['edges']:
+            roadmap.neighbors[v1].add(v2)
+            roadmap.neighbors[v2].add(v1)
+        roadmap.colliding_vertices = data['colliding_vertices']
+        roadmap.colliding_edges = data['colliding_edges']
+        if roadmap.samples:
+            roadmap._embedded = np.array([roadmap.embed(q) for q in roadmap.samples])
+            roadmap._kd_tree = KDTree(roadmap._embedded)
+        return roadmap
+
+def _roadmap_query_graph(roadmap, start_conf, end_conf, sample_fn, num_samples):
+    """vertices and neighbors of a query on the roadmap, start and end are appended as temporary vertices"""
+    if len(roadmap) < num_samples:
+        roadmap.grow(sample_fn, num_samples - len(roadmap))
+    start_index, end_index = len(roadmap), len(roadmap) + 1
+    samples = roadmap.samples + [start_conf, end_conf]
+    query_neighbors = {start_index: set(), end_index: set()}
+    for v1, conf in [(start_index, start_conf), (end_index, end_conf)]:
+        for v2 in roadmap.nearest(conf):
+            query_neighbors[v1].add(v2)
+            query_neighbors.setdefault(v2, set()).add(v1)
+    if roadmap.distance(start_conf, end_conf) < roadmap.max_distance:
+        query_neighbors[start_index].add(end_index)
+        query_neighbors[end_index].add(start_index)
+    neighbors_from_index = _ChainedNeighbors(roadmap.neighbors, query_neighbors)
+    edges = {(v1, v2) for v1 in query_neighbors for v2 in query_neighbors[v1]}
+    return samples, start_index, end_index, neighbors_from_index, edges
+
+
+class _ChainedNeighbors(object):
+    """neighbors of the roadmap combined with the ones of the query vertices (without copying the roadmap)"""
+
+    def __init__(self, roadmap_neighbors, query_neighbors):
+        self.roadmap_neighbors = roadmap_neighbors
+        self.query_neighbors = query_neighbors
+
+    def __getitem__(self, v):
+        neighbors = self.roadmap_neighbors.get(v, set())
+        if v in self.query_neighbors:
+            return neighbors | self.query_neighbors[v]
+        return neighbors
+
+
 def lazy_prm(start_conf, end_conf, sample_fn, extend_fn, collision_fn, num_samples=100, max_degree=10,
              weights=None, p_norm=2, max_distance=INF, approximate_eps=0.0,
-             max_cost=INF, max_time=INF, max_paths=INF):
+             max_cost=INF, max_time=INF, max_paths=INF, roadmap=None):
+    """lazy PRM
+
+    If a Roadmap is given, its vertices (grown to num_samples if needed) and cached static collision
+    results are reused and max_degree, weights, p_norm, max_distance and approximate_eps of the roadmap
+    are used instead of the arguments. Only the start and end conf are added for this query.
+    """
     # TODO: multi-query motion planning
     start_time = time.time()
-    # TODO: can embed pose and/or points on the robot for other distances
-    if weights is None:
-        weights = np.ones(len(start_conf))
-    embed_fn = lambda q: weights * q
-    distance_fn = lambda q1, q2: np.linalg.norm(embed_fn(q2) - embed_fn(q1), ord=p_norm)
-    cost_fn = lambda v1, v2: distance_fn(samples[v1], samples[v2])
-    # TODO: can compute cost between waypoints from extend_fn
-
-    samples = []
-    while len(samples) < num_samples:
-        conf = sample_fn()
-        if (distance_fn(start_conf, conf) + distance_fn(conf, end_conf)) < max_cost:
-            samples.append(conf)
-    start_index, end_index = 0, 1
-    samples[start_index] = start_conf
-    samples[end_index] = end_conf
-
-    embedded = list(map(embed_fn, samples))
-    kd_tree = KDTree(embedded)
-    vertices = list(range(len(samples)))
-    edges = set()
-    for v1 in vertices:
-        # TODO: could dynamically compute distances
-        distances, neighbors = kd_tree.query(embedded[v1], k=max_degree+1, eps=approximate_eps,
-                                             p=p_norm, distance_upper_bound=max_distance)
-        for d, v2 in zip(distances, neighbors):
-            if (d < max_distance) and (v1 != v2):
-                edges.update([(v1, v2), (v2, v1)])
-    neighbors_from_index = {v: set() for v in vertices}
-    for v1, v2 in edges:
-        neighbors_from_index[v1].add(v2)
-    #print(time.time() - start_time, len(edges), float(len(edges))/len(samples))
+    if roadmap is not None:
+        samples, start_index, end_index, neighbors_from_index, edges = _roadmap_query_graph(
+            roadmap, start_conf, end_conf, sample_fn, num_samples)
+        distance_fn = roadmap.distance
+        cost_fn = lambda v1, v2: distance_fn(samples[v1], samples[v2])
+    else:
+        # TODO: can embed pose and/or points on the robot for other distances
+        if weights is None:
+            weights = np.ones(len(start_conf))
+        embed_fn = lambda q: weights * q
+        distance_fn = lambda q1, q2: np.linalg.norm(embed_fn(q2) - embed_fn(q1), ord=p_norm)
+        cost_fn = lambda v1, v2: distance_fn(samples[v1], samples[v2])
+        # TODO: can compute cost between waypoints from extend_fn
+
+        samples = []
+        while len(samples) < num_samples:
+            conf = sample_fn()
+            if (distance_fn(start_conf, conf) + distance_fn(conf, end_conf)) < max_cost:
+                samples.append(conf)
+        start_index, end_index = 0, 1
+        samples[start_index] = start_conf
+        samples[end_index] = end_conf
+
+        embedded = list(map(embed_fn, samples))
+        kd_tree = KDTree(embedded)
+        vertices = list(range(len(samples)))
+        edges = set()
+        for v1 in vertices:
+            # TODO: could dynamically compute distances
+            distances, neighbors = kd_tree.query(embedded[v1], k=max_degree+1, eps=approximate_eps,
+                                                 p=p_norm, distance_upper_bound=max_distance)
+            for d, v2 in zip(distances, neighbors):
+                if (d < max_distance) and (v1 != v2):
+                    edges.update([(v1, v2), (v2, v1)])
+        neighbors_from_index = {v: set() for v in vertices}
+        for v1, v2 in edges:
+            neighbors_from_index[v1].add(v2)
+        #print(time.time() - start_time, len(edges), float(len(edges))/len(samples))
 
     colliding_vertices, colliding_edges = {}, {}
     def neighbors_fn(v1):
         for v2 in neighbors_from_index[v1]:
             if not (colliding_vertices.get(v2, False) or
                         colliding_edges.get((v1, v2), False)):
+                if roadmap is not None and (roadmap.colliding_vertices.get(v2, False) or
+                                            roadmap.colliding_edges.get((v1, v2), False)):
+                    continue
                 yield v2
 
     visited = dijkstra(end_index, neighbors_fn, cost_fn)
@@ -139,12 +330,14 @@ def lazy_prm(start_conf, end_conf, sample_fn, extend_fn, collision_fn, num_sampl
                              cost_fn=cost_fn, heuristic_fn=heuristic_fn,
                              max_cost=max_cost, max_time=max_time-elapsed_time(start_time))
         if path is None:
-            return None, edges, colliding_vertices, colliding_edges
+            return None, samples, edges, colliding_vertices, colliding_edges
         cost = sum(cost_fn(v1, v2) for v1, v2 in zip(path, path[1:]))
         print('Length: {} | Cost: {:.3f} | Vertices: {} | Edges: {} | Time: {:.3f}'.format(
             len(path), cost, len(colliding_vertices), len(colliding_edges), elapsed_time(start_time)))
-        if check_path(path, colliding_vertices, colliding_edges, samples, extend_fn, collision_fn):
+        if check_path(path, colliding_vertices, colliding_edges, samples, extend_fn, collision_fn, roadmap):
             break
+    else:
+        return None, samples, edges, colliding_vertices, colliding_edges
 
     solution = [start_conf]
     for q1, q2 in zip(path, path[1:]):
@@ -159,7 +352,7 @@ def replan_loop(start_conf, end_conf, sample_fn, extend_fn, collision_fn, params
         return path
     for num_samples in params_list:
         path = lazy_prm(start_conf, end_conf, sample_fn, extend_fn, collision_fn,
-                        num_samples=num_samples, **kwargs)
+                        num_samples=num_samples, **kwargs)[0]
         if path is not None:
             return smooth_path(path, extend_fn, collision_fn, iterations=smooth)
     return None
@@ -1,9 +1,72 @@
+import functools
 from random import randint
 
+import numpy as np
 
-def smooth_path(path, extend, collision, iterations=200):
+
+@functools.lru_cache(maxsize=None)
+def _bisect_order(n):
+    """indices of a shortcut with n configurations, coarse to fine (the middle one first)
+
+    Collisions usually happen away from the (collision-free) ends of a shortcut, so checking in this order
+    rejects invalid shortcuts after a few checks.
+    """
+    order = []
+    intervals = [(0, n - 1)]
+    while intervals:
+        next_intervals = []
+        for lo, hi in intervals:
+            if lo > hi:
+                continue
+            mid = (lo + hi) // 2
+            order.append(mid)
+            next_intervals += [(lo, mid - 1), (mid + 1, hi)]
+        intervals = next_intervals
+    return tuple(order)
+
+
+def _propose_shortcuts(path, extend, num_samples):
+    """sample num_samples random shortcuts of path and return those that remove waypoints
+
+    Returns a list of (i, j, shortcut) (shortcut replaces path[i + 1:j + 1]), the shortcuts that remove
+    most waypoints first.
+    """
+    candidates = {}
+    for _ in range(num_samples):
+        i = randint(0, len(path) - 1)
+        j = randint(0, len(path) - 1)
+        if j < i:
+            i, j = j, i
+        if j - i <= 1 or (i, j) in candidates:
+            continue
+        shortcut = list(extend(path[i], path[j]))
+        candidates[i, j] = shortcut if len(shortcut) < (j - i) else None
+    shortcuts = [(i, j, shortcut) for (i, j), shortcut in candidates.items() if shortcut is not None]
+    return sorted(shortcuts, key=lambda c: len(c[2]) - (c[1] - c[0]))
+
+
+def _overlaps(i, j, shortcuts):
+    # shortcuts may share their end points
+    return any(i < j2 and i2 < j for i2, j2, _ in shortcuts)
+
+
+def _apply_shortcuts(path, shortcuts):
+    """replace path[i + 1:j + 1] by shortcut for all non-overlapping (i, j, shortcut)"""
+    for i, j, shortcut in sorted(shortcuts, key=lambda c: c[0], reverse=True):
+        path = path[:i + 1] + shortcut + path[j + 1:]
+    return path
+
+
+def smooth_path(path, extend, collision, iterations=200, batch_size=1):
     """smooth a trajectory path, randomly replace jigged subpath with shortcuts
 
+    The configurations of a shortcut are checked coarse to fine, so that most colliding shortcuts are
+    rejected after a few collision checks. With batch_size > 1, the random shortcuts are proposed in
+    rounds of batch_size: they are checked in the order of the number of waypoints they remove, and
+    all collision-free ones that do not overlap with a better one are applied at once. This needs
+    fewer rounds, but as the shortcuts of a round are sampled on the same path, the smoothed path is
+    usually a bit longer than with batch_size=1.
+
     Parameters
     ----------
     path : list
@@ -13,7 +76,9 @@ def smooth_path(path, extend, collision, iterations=200):
     collision : function
         [description]
     iterations : int, optional
-        number of iterations for the random smoothing procedure, by default 50
+        number of random shortcuts to try, by default 200
+    batch_size : int, optional
+        number of shortcuts proposed per round, by default 1
 
     Returns
     -------
@@ -21,58 +86,73 @@ def smooth_path(path, extend, collision, iterations=200):
         [description]
     """
     smoothed_path = path
-    for _ in range(iterations):
+    for start in range(0, iterations, batch_size):
         if len(smoothed_path) <= 2:
             return smoothed_path
-        i = randint(0, len(smoothed_path) - 1)
-        j = randint(0, len(smoothed_path) - 1)
-        if abs(i - j) <= 1:
-            continue
-        if j < i:
-            i, j = j, i
-        shortcut = list(extend(smoothed_path[i], smoothed_path[j]))
-        if (len(shortcut) < (j - i)) and all(not collision(q) for q in shortcut):
-            smoothed_path = smoothed_path[:i + 1] + shortcut + smoothed_path[j + 1:]
+        accepted = []
+        for i, j, shortcut in _propose_shortcuts(smoothed_path, extend, min(batch_size, iterations - start)):
+            if _overlaps(i, j, accepted):
+                continue
+            if not any(collision(shortcut[k]) for k in _bisect_order(len(shortcut))):
+                accepted.append((i, j, shortcut))
+        smoothed_path = _apply_shortcuts(smoothed_path, accepted)
     return smoothed_path
 
 # TODO: sparsify path to just waypoints
 
 
-def wholebody_smooth_path(path, joint_conf_path, extend, collision, ik, calc_tippos_fn, sample_joint_conf_fn, iterations=50):
-    import functools
+def wholebody_smooth_path(path, joint_conf_path, extend, collision, ik, calc_tippos_fn, sample_joint_conf_fn, iterations=50,
+                          deadline=None, batch_size=1):
+    """like smooth_path, but with an IK solution for every pose of the path
+
+    The IK solutions of a shortcut are sampled in the same coarse to fine order as the collision
+    checks of smooth_path, so that infeasible shortcuts are rejected early, and batch_size is the
+    same as for smooth_path. If a deadline (see
+    PlanningDeadline in wholebody_rrt_connect) is given, smoothing stops once it passes and the path
+    smoothed so far is returned.
+    """
     from pybullet_planning.interfaces.kinematics.ik_utils import sample_multiple_ik_with_collision
+
+    def expired():
+        return deadline is not None and deadline.expired()
+
+    def sample_jconfs(shortcut, end_pose, end_jconf):
+        jconfs = [None] * len(shortcut)
+        for k in _bisect_order(len(shortcut)):
+            if expired():
+                return None
+            cube_pose = shortcut[k]
+            if k == len(shortcut) - 1 and np.array_equal(cube_pose, end_pose):
+                # the shortcut ends in a pose of the path, which has an IK solution already
+                jconfs[k] = end_jconf
+                continue
+            tip_positions = calc_tippos_fn(cube_pose)
+            # Keep num_samples=1!!!!! This reallly slows down at larger values (and we only use the first one anyway)
+            ik_sols = sample_multiple_ik_with_collision(ik, functools.partial(collision, cube_pose),
+                                                        sample_joint_conf_fn, tip_positions, num_samples=1)
+            if len(ik_sols) == 0:
+                return None
+            jconfs[k] = ik_sols[0]
+        return jconfs
+
     smoothed_path = path
     smoothed_jconf_path = joint_conf_path
-    for _ in range(iterations):
+    for start in range(0, iterations, batch_size):
+        if expired():
+            break
         if len(smoothed_path) <= 2:
-            return smoothed_path
-
-        i = randint(0, len(smoothed_path) - 1)
-        j = randint(0, len(smoothed_path) - 1)
-        if abs(i - j) <= 1:
-            continue
+            return smoothed_path, smoothed_jconf_path
 
-        if j < i:
-            i, j = j, i
-        shortcut = list(extend(smoothed_path[i], smoothed_path[j]))
-
-        failed = False
-        shortcut_jconfs = []
-        if len(shortcut) < (j - i):
-            for cube_pose in shortcut:
-                tip_positions = calc_tippos_fn(cube_pose)
-                # Keep num_samples=1!!!!! This reallly slows down at larger values (and we only use the first one anyway)
-                ik_sols = sample_multiple_ik_with_collision(ik, functools.partial(collision, cube_pose),
-                                                            sample_joint_conf_fn, tip_positions, num_samples=1)
-                if len(ik_sols) == 0:
-                    failed = True
-                    break
-                shortcut_jconfs.append(ik_sols[0])
-
-            if failed:
+        accepted, accepted_jconfs = [], []
+        for i, j, shortcut in _propose_shortcuts(smoothed_path, extend, min(batch_size, iterations - start)):
+            if _overlaps(i, j, accepted):
+                continue
+            shortcut_jconfs = sample_jconfs(shortcut, smoothed_path[j], smoothed_jconf_path[j])
+            if shortcut_jconfs is None:
                 continue
-
             print(f'shortcut is found!!: {i}:{j} {len(shortcut)}')
-            smoothed_path = smoothed_path[:i + 1] + shortcut + smoothed_path[j + 1:]
-            smoothed_jconf_path = smoothed_jconf_path[:i + 1] + shortcut_jconfs + smoothed_jconf_path[j + 1:]
+            accepted.append((i, j, shortcut))
+            accepted_jconfs.append((i, j, shortcut_jconfs))
+        smoothed_path = _apply_shortcuts(smoothed_path, accepted)
+        smoothed_jconf_path = _apply_shortcuts(smoothed_jconf_path, accepted_jconfs)
     return smoothed_path, smoothed_jconf_path
@@ -1,4 +1,5 @@
 import time
+from contextlib import contextmanager
 from random import random
 
 from itertools import takewhile
@@ -7,6 +8,7 @@ from .rrt import TreeNode, configs, extract_ik_solutions
 from .utils import irange, argmin, INCR_RRT_ITERATIONS, RRT_ITERATIONS, RRT_RESTARTS, RRT_SMOOTHING, INF, elapsed_time, negate
 
 __all__ = [
+    'PlanningDeadline',
     'wholebody_rrt_connect',
     'wholebody_birrt',
     'wholebody_direct_path',
@@ -17,6 +19,99 @@ __all__ = [
     ]
 
 
+class PlanningDeadline(object):
+    """cooperative deadline and statistics of an anytime wholebody planning call
+
+    The planners check the deadline inside their direct path, extension and smoothing loops and
+    return the best path found so far once it has passed: the direct path, the RRT path (or, if
+    allow_partial is set, the path to the tree node closest to the goal) and the partially smoothed
+    path. One deadline can be shared by several planning calls (e.g. one per grasp).
+
+    Parameters
+    ----------
+    max_time : float, optional
+        time budget in seconds, by default INF
+    allow_partial : bool, optional
+        if the deadline passes before the RRT found a path, return the path to the node closest to the goal,
+        by default False
+    """
+
+    def __init__(self, max_time=INF, allow_partial=False):
+        self.max_time = max_time
+        self.allow_partial = allow_partial
+        self.start_time = time.time()
+        self.end_time = self.start_time + max_time
+        self.nodes_expanded = 0
+        self.collision_calls = 0
+        self.phase_times = {}
+        # how the returned path was found: 'direct', 'rrt', 'smoothed' or 'partial'
+        self.result = None
+
+    def remaining(self):
+        return self.end_time - time.time()
+
+    def expired(self):
+        return time.time() >= self.end_time
+
+    @contextmanager
+    def phase(self, name):
+        """accumulate the time spent in the block under name (phases must not be nested)"""
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = self.phase_times.get(name, 0.0) + elapsed_time(start_time)
+
+    def count_collisions(self, collision_fn):
+        """wrap collision_fn to count its calls (functions wrapped already are returned as they are)"""
+        if getattr(collision_fn, 'deadline', None) is self:
+            return collision_fn
+
+        def counted_collision_fn(*args, **kwargs):
+            self.collision_calls += 1
+            return collision_fn(*args, **kwargs)
+        counted_collision_fn.deadline = self
+        return counted_collision_fn
+
+    def stats(self):
+        return {
+            'result': self.result,
+            'max_time': self.max_time,
+            'elapsed_time': elapsed_time(self.start_time),
+            'nodes_expanded': self.nodes_expanded,
+            'collision_calls': self.collision_calls,
+            'phase_times': dict(self.phase_times),
+        }
+
+
+def _expired(deadline):
+    return deadline is not None and deadline.expired()
+
+
+@contextmanager
+def _phase(deadline, name):
+    if deadline is None:
+        yield
+    else:
+        with deadline.phase(name):
+            yield
+
+
+def _set_result(deadline, result):
+    if deadline is not None:
+        deadline.result = result
+
+
+def _partial_path(nodes, target, distance_fn, deadline):
+    """path to the node closest to target if the deadline passed and partial paths are allowed"""
+    if not (_expired(deadline) and deadline.allow_partial):
+        return None, None
+    last = argmin(lambda n: distance_fn(n.config, target), nodes)
+    _set_result(deadline, 'partial')
+    path, joint_conf_path = last.retrace_all()
+    return configs(path), joint_conf_path
+
+
 def asymmetric_extend(q1, q2, extend_fn, backward=False):
     """directional extend_fn
     """
@@ -27,7 +122,7 @@ def asymmetric_extend(q1, q2, extend_fn, backward=False):
 
 def wholebody_extend_towards(tree, target, distance_fn, extend_fn, collision_fn,
                              calc_tippos_fn, sample_joint_conf_fn, ik, swap,
-                             tree_frequency, goal_test_fn=None):
+                             tree_frequency, goal_test_fn=None, deadline=None):
     import functools
     import numpy as np
     from pybullet_planning.interfaces.kinematics.ik_utils import sample_multiple_ik_with_collision, sample_no_collision_ik
@@ -43,6 +138,8 @@ def wholebody_extend_towards(tree, target, distance_fn, extend_fn, collision_fn,
     ik_solutions = []
     at_goal = False
     for i, cube_pose in enumerate(extend):
+        if _expired(deadline):
+            break
         tip_positions = calc_tippos_fn(cube_pose)
         ik_sols = sample_multiple_ik_with_collision(ik, functools.partial(collision_fn, cube_pose),
                                                     sample_joint_conf_fn, tip_positions, num_samples=1)
@@ -83,6 +180,8 @@ def wholebody_extend_towards(tree, target, distance_fn, extend_fn, collision_fn,
             ik_sol = ik_solutions[i][0]
             last = TreeNode(q, parent=last, ik_solution=ik_sol)
             tree.append(last)
+            if deadline is not None:
+                deadline.nodes_expanded += 1
     if goal_test_fn:
         return last, at_goal
     else:
@@ -126,29 +225,31 @@ def wholebody_rrt(q1, q2, goal_sample_fn, goal_test, distance_fn, sample_fn,
                   extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn,
                   ik, goal_probability=0.66, iterations=RRT_ITERATIONS,
                   tree_frequency=1, max_time=INF, restarts=RRT_RESTARTS,
-                  smoothing=RRT_SMOOTHING):
+                  smoothing=RRT_SMOOTHING, deadline=None):
 
     start_time = time.time()
-    path, joint_path = __wholebody_direct_path(q1, q2, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik)
+    if deadline is not None:
+        collision_fn = deadline.count_collisions(collision_fn)
+    with _phase(deadline, 'direct_path'):
+        path, joint_path = __wholebody_direct_path(q1, q2, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
+                                                   deadline=deadline)
     if path is not None:
+        _set_result(deadline, 'direct')
         return path, joint_path
 
     for _ in range(restarts):
         elapsed_time = time.time() - start_time
-        if elapsed_time >= max_time:
+        if elapsed_time >= max_time or _expired(deadline):
             return None, None
-        path, joint_path, _ = _rrt(q1, goal_sample_fn, goal_test, distance_fn,
-                                sample_fn, extend_fn, collision_fn,
-                                calc_tippos_fn, sample_joint_conf_fn, ik,
-                                goal_probability, iterations, tree_frequency,
-                                max_time=max_time - elapsed_time)
+        with _phase(deadline, 'rrt'):
+            path, joint_path, _ = _rrt(q1, goal_sample_fn, goal_test, distance_fn,
+                                    sample_fn, extend_fn, collision_fn,
+                                    calc_tippos_fn, sample_joint_conf_fn, ik,
+                                    goal_probability, iterations, tree_frequency,
+                                    max_time=max_time - elapsed_time, deadline=deadline)
         if path is not None:
-            if smoothing is None:
-                return path, joint_path
-            return wholebody_smooth_path(path, joint_path, extend_fn,
-                                         collision_fn, ik, calc_tippos_fn,
-                                         sample_joint_conf_fn,
-                                         iterations=smoothing)
+            return _smooth_anytime(path, joint_path, extend_fn, collision_fn, ik, calc_tippos_fn,
+                                   sample_joint_conf_fn, smoothing, deadline)
     return None, None
 
 
@@ -157,7 +258,7 @@ def wholebody_incremental_rrt(q1, q2, use_ori, distance_fn, sample_fn,
                               ik, goal_probability=0.66, min_goal_threshold=0.0, max_goal_threshold=0.6,
                               iterations=INCR_RRT_ITERATIONS, tree_frequency=1, max_time=INF, restarts=RRT_RESTARTS,
                               n_goal_sets=20,
-                              smoothing=RRT_SMOOTHING, **kwargs):
+                              smoothing=RRT_SMOOTHING, deadline=None, **kwargs):
     # additional params:
     end_conf = q2
     # print('-------------------------------')
@@ -181,17 +282,26 @@ def wholebody_incremental_rrt(q1, q2, use_ori, distance_fn, sample_fn,
         return goal_sample_fn
 
     start_time = time.time()
+    if deadline is not None:
+        collision_fn = deadline.count_collisions(collision_fn)
 
     # check if there's a direct path
-    path, joint_path = __wholebody_direct_path(q1, q2, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik)
+    with _phase(deadline, 'direct_path'):
+        path, joint_path = __wholebody_direct_path(q1, q2, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
+                                                   deadline=deadline)
     if path is not None:
+        _set_result(deadline, 'direct')
         return path, joint_path
 
     preserved_tree = []
     prev_goal_threshold = max_goal_threshold
     for i in range(n_goal_sets):
         elapsed_time = time.time() - start_time
-        if elapsed_time >= max_time:
+        if elapsed_time >= max_time or _expired(deadline):
+            if i > 0:
+                # best path found so far (with the previous goal threshold)
+                print('** [timeout] path is found with goal_threshold:', prev_goal_threshold)
+                return prev_path, prev_joint_path
             return None, None
         goal_threshold = ((1 - i / n_goal_sets)
                           * (max_goal_threshold - min_goal_threshold)
@@ -200,22 +310,22 @@ def wholebody_incremental_rrt(q1, q2, use_ori, distance_fn, sample_fn,
         goal_test = get_goal_test_fn(end_conf, goal_threshold)
         goal_sample_fn = get_goal_sample_fn(goal_test, end_conf, use_ori, goal_threshold)
 
-        path, joint_path, preserved_tree = _rrt(q1, goal_sample_fn,
-                                                goal_test,
-                                                distance_fn,
-                                                sample_fn, extend_fn, collision_fn,
-                                                calc_tippos_fn, sample_joint_conf_fn, ik,
-                                                goal_probability, iterations, tree_frequency,
-                                                max_time=max_time - elapsed_time, preserved_tree=preserved_tree, **kwargs)
+        with _phase(deadline, 'rrt'):
+            path, joint_path, preserved_tree = _rrt(q1, goal_sample_fn,
+                                                    goal_test,
+                                                    distance_fn,
+                                                    sample_fn, extend_fn, collision_fn,
+                                                    calc_tippos_fn, sample_joint_conf_fn, ik,
+                                                    goal_probability, iterations, tree_frequency,
+                                                    max_time=max_time - elapsed_time, preserved_tree=preserved_tree,
+                                                    deadline=deadline, **kwargs)
         if path is None:
             if i == 0:
                 break
             else:
                 print('** [done] path is found with goal_threshold:', prev_goal_threshold)
-                return wholebody_smooth_path(prev_path, prev_joint_path, extend_fn,
-                                            collision_fn, ik, calc_tippos_fn,
-                                            sample_joint_conf_fn,
-                                             iterations=smoothing)
+                return _smooth_anytime(prev_path, prev_joint_path, extend_fn, collision_fn, ik, calc_tippos_fn,
+                                       sample_joint_conf_fn, smoothing, deadline)
 
         print('path is found with goal_threshold:', goal_threshold)
         prev_goal_threshold = goal_threshold
@@ -224,19 +334,30 @@ def wholebody_incremental_rrt(q1, q2, use_ori, distance_fn, sample_fn,
     # NOTE: Very rare, but there's a case that does not have a direct path but can achieve zero error!
     if path is not None:
         print('** [done] path is found with goal_threshold:', prev_goal_threshold)
-        return wholebody_smooth_path(prev_path, prev_joint_path, extend_fn,
-                                    collision_fn, ik, calc_tippos_fn,
-                                    sample_joint_conf_fn,
-                                        iterations=smoothing)
+        return _smooth_anytime(prev_path, prev_joint_path, extend_fn, collision_fn, ik, calc_tippos_fn,
+                               sample_joint_conf_fn, smoothing, deadline)
 
     return None, None
 
 
+def _smooth_anytime(path, joint_conf_path, extend_fn, collision_fn, ik, calc_tippos_fn, sample_joint_conf_fn,
+                    iterations, deadline):
+    """smooth the path unless the deadline passed already (partial paths are never smoothed)"""
+    if iterations is None or _expired(deadline) or (deadline is not None and deadline.result == 'partial'):
+        return path, joint_conf_path
+    with _phase(deadline, 'smoothing'):
+        path, joint_conf_path = wholebody_smooth_path(path, joint_conf_path, extend_fn, collision_fn, ik,
+                                                      calc_tippos_fn, sample_joint_conf_fn,
+                                                      iterations=iterations, deadline=deadline)
+    _set_result(deadline, 'smoothed')
+    return path, joint_conf_path
+
+
 def _rrt(q1, goal_sample_fn, goal_test, distance_fn, sample_fn,
          extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn,
          ik, goal_probability=0.2,
          iterations=RRT_ITERATIONS, tree_frequency=1, max_time=INF,
-         preserved_tree=[]):
+         preserved_tree=[], deadline=None):
     """[summary]
 
     Parameters
@@ -306,7 +427,7 @@ def _rrt(q1, goal_sample_fn, goal_test, distance_fn, sample_fn,
         nodes = [TreeNode(q1, ik_solution=ik_sol1)]
     # print('iterations', iterations)
     for iteration in irange(iterations):
-        if max_time <= elapsed_time(start_time):
+        if max_time <= elapsed_time(start_time) or _expired(deadline):
             break
 
         goal = random() < goal_probability or iteration == 0
@@ -315,17 +436,21 @@ def _rrt(q1, goal_sample_fn, goal_test, distance_fn, sample_fn,
                                                  collision_fn, calc_tippos_fn,
                                                  sample_joint_conf_fn, ik,
                                                  False, tree_frequency,
-                                                 goal_test)
+                                                 goal_test, deadline=deadline)
 
         # print('sequence length:', len(last.retrace()))
         if success:
+            _set_result(deadline, 'rrt')
             path, joint_conf_path = last.retrace_all()
             return configs(path), joint_conf_path, nodes
+    path, joint_conf_path = _partial_path(nodes, q2, distance_fn, deadline)
+    if path is not None:
+        return path, joint_conf_path, nodes
     return None, None, None
 
 
 def wholebody_rrt_connect(q1, q2, init_joint_conf, end_joint_conf, distance_fn, sample_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
-                          iterations=RRT_ITERATIONS, tree_frequency=1, max_time=INF):
+                          iterations=RRT_ITERATIONS, tree_frequency=1, max_time=INF, deadline=None):
     """[summary]
 
     Parameters
@@ -349,6 +474,8 @@ def wholebody_rrt_connect(q1, q2, init_joint_conf, end_joint_conf, distance_fn,
         by default 1
     max_time : [type], optional
         [description], by default INF
+    deadline : PlanningDeadline, optional
+        checked inside the extension loops, by default None
 
     Returns
     -------
@@ -360,6 +487,8 @@ def wholebody_rrt_connect(q1, q2, init_joint_conf, end_joint_conf, distance_fn,
 
     start_time = time.time()
     assert tree_frequency >= 1
+    if deadline is not None:
+        collision_fn = deadline.count_collisions(collision_fn)
 
     # create a node for each configuration
     tip_positions1 = calc_tippos_fn(q1)
@@ -372,7 +501,7 @@ def wholebody_rrt_connect(q1, q2, init_joint_conf, end_joint_conf, distance_fn,
 
     nodes1, nodes2 = [TreeNode(q1, ik_solution=init_joint_conf)], [TreeNode(q2, ik_solution=end_joint_conf)]
     for iteration in irange(iterations):
-        if max_time <= elapsed_time(start_time):
+        if max_time <= elapsed_time(start_time) or _expired(deadline):
             break
         swap = len(nodes1) > len(nodes2)
         tree1, tree2 = nodes1, nodes2
@@ -380,9 +509,9 @@ def wholebody_rrt_connect(q1, q2, init_joint_conf, end_joint_conf, distance_fn,
             tree1, tree2 = nodes2, nodes1
         sample = sample_fn()
         last1, _ = wholebody_extend_towards(tree1, sample_fn(), distance_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
-                                  swap, tree_frequency)
+                                  swap, tree_frequency, deadline=deadline)
         last2, success = wholebody_extend_towards(tree2, last1.config, distance_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
-                                        not swap, tree_frequency)
+                                        not swap, tree_frequency, deadline=deadline)
 
         if success:
              path1, joint_conf_path1 = last1.retrace_all()
@@ -391,10 +520,12 @@ def wholebody_rrt_connect(q1, q2, init_joint_conf, end_joint_conf, distance_fn,
                  path1, path2 = path2, path1
                  joint_conf_path1, joint_conf_path2 = joint_conf_path2, joint_conf_path1
              entire_path = path1[:-1] + path2[::-1]
+             _set_result(deadline, 'rrt')
              return configs(entire_path), extract_ik_solutions(entire_path)
-    return None, None
+    # the path has to start in the tree of q1
+    return _partial_path(nodes1, q2, distance_fn, deadline)
 
-def __wholebody_direct_path(q1, q2, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik):
+def __wholebody_direct_path(q1, q2, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik, deadline=None):
     """
     I know it's confusing to have 2 functions both named wholebody_direct_path...
     The difference is very tiny:
@@ -424,6 +555,8 @@ def __wholebody_direct_path(q1, q2, extend_fn, collision_fn, calc_tippos_fn, sam
 
     path, joint_conf_path = [], []
     for q in extend_fn(q1, q2):
+        if _expired(deadline):
+            return None, None
         tip_positions = calc_tippos_fn(q)
         ik_solutions = sample_multiple_ik_with_collision(ik, functools.partial(collision_fn, q, diagnosis=False),
                                                          sample_joint_conf_fn, tip_positions, num_samples=1)
@@ -436,7 +569,8 @@ def __wholebody_direct_path(q1, q2, extend_fn, collision_fn, calc_tippos_fn, sam
     return path, joint_conf_path
 
 
-def wholebody_direct_path(q1, q2, init_joint_conf, end_joint_conf, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik, **kwargs):
+def wholebody_direct_path(q1, q2, init_joint_conf, end_joint_conf, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
+                          deadline=None, **kwargs):
     import functools
     from pybullet_planning.interfaces.kinematics.ik_utils import sample_multiple_ik_with_collision
     # TEMP
@@ -446,6 +580,8 @@ def wholebody_direct_path(q1, q2, init_joint_conf, end_joint_conf, extend_fn, co
     joint_conf_path = [init_joint_conf]
 
     for q in extend_fn(q1, q2):
+        if _expired(deadline):
+            return None, None
         tip_positions = calc_tippos_fn(q)
         if (q == q2).all():
             ik_solutions = [end_joint_conf]
@@ -466,52 +602,65 @@ def wholebody_direct_path(q1, q2, init_joint_conf, end_joint_conf, extend_fn, co
 
 
 def wholebody_birrt(q1, q2, distance_fn, sample_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
-                    init_joint_conf=None, restarts=RRT_RESTARTS, smooth=RRT_SMOOTHING, max_time=INF, **kwargs):
+                    init_joint_conf=None, restarts=RRT_RESTARTS, smooth=RRT_SMOOTHING, max_time=INF, deadline=None, **kwargs):
+    """direct path, then restarts + 1 runs of wholebody_rrt_connect and smoothing of the path
+
+    If a PlanningDeadline is given, it is checked within all of these and the best path found until
+    it passes is returned (see PlanningDeadline).
+    """
     import functools
     from pybullet_planning.interfaces.kinematics.ik_utils import sample_multiple_ik_with_collision
 
+    if deadline is not None:
+        collision_fn = deadline.count_collisions(collision_fn)
+
     # collision and IK check on initial and end configuration
-    tip_positions1 = calc_tippos_fn(q1)
-    if init_joint_conf is None:
-        ik_solutions1 = sample_multiple_ik_with_collision(ik, functools.partial(collision_fn, q1),
-                                                        sample_joint_conf_fn, tip_positions1, num_samples=1)
-    else:
-        ik_solutions1 = [] if collision_fn(q1, init_joint_conf) else [init_joint_conf]
+    with _phase(deadline, 'ik_check'):
+        tip_positions1 = calc_tippos_fn(q1)
+        if init_joint_conf is None:
+            ik_solutions1 = sample_multiple_ik_with_collision(ik, functools.partial(collision_fn, q1),
+                                                            sample_joint_conf_fn, tip_positions1, num_samples=1)
+        else:
+            ik_solutions1 = [] if collision_fn(q1, init_joint_conf) else [init_joint_conf]
 
-    if len(ik_solutions1) == 0:
-        print('Initial Configuration in collision')
-        return None, None
+        if len(ik_solutions1) == 0:
+            print('Initial Configuration in collision')
+            return None, None
 
-    tip_positions2 = calc_tippos_fn(q2)
-    ik_solutions2 = sample_multiple_ik_with_collision(ik, functools.partial(collision_fn, q2),
-                                                      sample_joint_conf_fn, tip_positions2, num_samples=1)
-    if len(ik_solutions2) == 0:
-        print('End Configuration in collision')
-        return None, None
+        tip_positions2 = calc_tippos_fn(q2)
+        ik_solutions2 = sample_multiple_ik_with_collision(ik, functools.partial(collision_fn, q2),
+                                                          sample_joint_conf_fn, tip_positions2, num_samples=1)
+        if len(ik_solutions2) == 0:
+            print('End Configuration in collision')
+            return None, None
 
     ik_sol1 = ik_solutions1[0]
     ik_sol2 = ik_solutions2[0]
 
     start_time = time.time()
-    path, joint_conf_path = wholebody_direct_path(q1, q2, ik_sol1, ik_sol2, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik, **kwargs)
+    with _phase(deadline, 'direct_path'):
+        path, joint_conf_path = wholebody_direct_path(q1, q2, ik_sol1, ik_sol2, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
+                                                      deadline=deadline, **kwargs)
     if path is not None:
+        _set_result(deadline, 'direct')
         return path, joint_conf_path
 
     for _ in irange(restarts + 1):
-        if max_time <= elapsed_time(start_time):
+        if max_time <= elapsed_time(start_time) or _expired(deadline):
             break
-        path, joint_conf_path = wholebody_rrt_connect(q1, q2, ik_sol1, ik_sol2, distance_fn, sample_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
-                                                      max_time=max_time - elapsed_time(start_time), **kwargs)
+        with _phase(deadline, 'rrt'):
+            path, joint_conf_path = wholebody_rrt_connect(q1, q2, ik_sol1, ik_sol2, distance_fn, sample_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
+                                                          max_time=max_time - elapsed_time(start_time), deadline=deadline, **kwargs)
         if path is not None:
-            if smooth is None:
-                return path, joint_conf_path
-            return wholebody_smooth_path(path, joint_conf_path, extend_fn, collision_fn, ik, calc_tippos_fn, sample_joint_conf_fn, iterations=smooth)
+            return _smooth_anytime(path, joint_conf_path, extend_fn, collision_fn, ik, calc_tippos_fn, sample_joint_conf_fn,
+                                   smooth, deadline)
     return None, None
 
 
 def wholebody_best_effort_rrt(q1, q2, distance_fn, sample_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
                   goal_sample_fn=None, reward_dist_fn=None, n_goal_samples=100,
-                  init_joint_conf=None, restarts=RRT_RESTARTS, smooth=RRT_SMOOTHING, iterations=RRT_ITERATIONS, max_time=INF, **kwargs):
+                  init_joint_conf=None, restarts=RRT_RESTARTS, smooth=RRT_SMOOTHING, iterations=RRT_ITERATIONS, max_time=INF,
+                  deadline=None, **kwargs):
     import functools
     import numpy as np
     from random import random
@@ -519,6 +668,8 @@ def wholebody_best_effort_rrt(q1, q2, distance_fn, sample_fn, extend_fn, collisi
 
     if goal_sample_fn is None:
         goal_sample_fn = sample_fn
+    if deadline is not None:
+        collision_fn = deadline.count_collisions(collision_fn)
 
     # collision and IK check on initial and end configuration
     tip_positions1 = calc_tippos_fn(q1)
@@ -541,17 +692,23 @@ def wholebody_best_effort_rrt(q1, q2, distance_fn, sample_fn, extend_fn, collisi
     # q2 is feasible! we just run wholebody_birrt.
     if len(ik_solutions2) > 0:
         return wholebody_birrt(q1, q2, distance_fn, sample_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
-                               init_joint_conf=init_joint_conf, restarts=restarts, smooth=smooth, max_time=max_time, **kwargs)
+                               init_joint_conf=init_joint_conf, restarts=restarts, smooth=smooth, max_time=max_time,
+                               deadline=deadline, **kwargs)
 
+    if _expired(deadline):
+        return None, None
     # sample from goal_sample_fn() and check if the pose is feasible
-    candidates = sample_feasible_goals(goal_sample_fn, ik, collision_fn, sample_joint_conf_fn, calc_tippos_fn, n_goal_samples=100)
+    with _phase(deadline, 'goal_sampling'):
+        candidates = sample_feasible_goals(goal_sample_fn, ik, collision_fn, sample_joint_conf_fn, calc_tippos_fn, n_goal_samples=100,
+                                           deadline=deadline)
 
     # search for the end pose that will have the highest reward
     new_goal, goal_joint_conf = argmin(lambda cand: reward_dist_fn(cand[0], q2), candidates)
     new_goal = np.asarray(new_goal)
 
     return wholebody_birrt(q1, new_goal, distance_fn, sample_fn, extend_fn, collision_fn, calc_tippos_fn, sample_joint_conf_fn, ik,
-                           init_joint_conf=init_joint_conf, restarts=restarts, smooth=smooth, max_time=max_time, **kwargs)
+                           init_joint_conf=init_joint_conf, restarts=restarts, smooth=smooth, max_time=max_time,
+                           deadline=deadline, **kwargs)
 
 
 
@@ -611,11 +768,15 @@ def wholebody_best_effort_direct_path(q1, q2, distance_fn, sample_fn, extend_fn,
         return path, joint_conf_path
 
 
-def sample_feasible_goals(goal_sample_fn, ik, collision_fn, sample_joint_conf_fn, calc_tippos_fn, n_goal_samples=100):
+def sample_feasible_goals(goal_sample_fn, ik, collision_fn, sample_joint_conf_fn, calc_tippos_fn, n_goal_samples=100,
+                          deadline=None):
     import functools
     from pybullet_planning.interfaces.kinematics.ik_utils import sample_multiple_ik_with_collision
     candidates = []
     for i in range(n_goal_samples):
+        # keep the goals sampled so far once the deadline passed
+        if candidates and _expired(deadline):
+            break
         sampled_goal = goal_sample_fn()
         tip_positions = calc_tippos_fn(sampled_goal)
         ik_solutions = sample_multiple_ik_with_collision(ik, functools.partial(collision_fn, sampled_goal, diagnosis=False),
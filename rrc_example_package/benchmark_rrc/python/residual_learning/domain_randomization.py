@@ -24,17 +24,30 @@ class Parameter(object):
         self.high = np.array(high)
         self.shape = self.low.shape
 
-    def sample(self):
-        return np.random.rand(*self.shape) * (self.high - self.low) + self.low
+    def sample(self, n=None):
+        # if n is given, n samples are drawn at once (stacked along the first axis)
+        shape = self.shape if n is None else (n,) + self.shape
+        return np.random.rand(*shape) * (self.high - self.low) + self.low
 
 
 class ParameterDict(object):
     def __init__(self, *params):
         self.names = [p.name for p in params]
         self.params = params
-
-    def sample(self):
-        return {p.name: p.sample() for p in self.params}
+        # flat bounds of all parameters, so that all of them are sampled in one draw
+        self.low = np.concatenate([p.low.ravel() for p in params])
+        self.high = np.concatenate([p.high.ravel() for p in params])
+        self._splits = np.cumsum([p.low.size for p in params])[:-1]
+
+    def sample(self, n=None):
+        # if n is given, n samples of each parameter are drawn at once (stacked along the first axis)
+        size = 1 if n is None else n
+        flat = np.random.rand(size, len(self.low)) * (self.high - self.low) + self.low
+        samples = {}
+        for p, values in zip(self.params, np.split(flat, self._splits, axis=1)):
+            values = values.reshape((size,) + p.shape)
+            samples[p.name] = values if n is not None else values[0]
+        return samples
 
     def test(self, name, low=False, high=False):
         params = self.sample()
@@ -51,6 +64,33 @@ class ParameterDict(object):
         return params
 
 
+class NoiseBuffer(object):
+    '''
+    Noise of a ParameterDict pre-sampled for a number of steps (e.g. one episode).
+
+    All samples are drawn in one vectorized call and handed out row by row.
+    The rows are not shared between steps, so they can be used as output
+    arrays for the noisy values.  When all rows are used, a new buffer is
+    sampled (rows which were handed out before stay valid).
+    '''
+
+    def __init__(self, params, size):
+        self.params = params
+        self.size = max(int(size), 1)
+        self.refill()
+
+    def refill(self):
+        self.samples = self.params.sample(self.size)
+        self._index = 0
+
+    def next(self):
+        if self._index >= self.size:
+            self.refill()
+        i = self._index
+        self._index += 1
+        return {name: values[i] for name, values in self.samples.items()}
+
+
 # @gin.configurable
 class TriFingerRandomizer(object):
     def __init__(self,
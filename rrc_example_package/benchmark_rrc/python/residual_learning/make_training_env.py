@@ -14,7 +14,8 @@ def make_training_env(nenv, state_machine, goal_difficulty, action_space,
                       reward_fn=None, termination_fn=None, initializer=None,
                       episode_length=100000, monitor=False, seed=0,
                       domain_randomization=False, norm_observations=False,
-                      max_torque=0.1):
+                      max_torque=0.1, snapshot_pool_size=0,
+                      snapshot_refresh_prob=0.0):
 
     # dummy goal dict
     goal = move_cube.sample_goal(goal_difficulty)
@@ -44,7 +45,9 @@ def make_training_env(nenv, state_machine, goal_difficulty, action_space,
                 env = RandomizedEnvWrapper(env)
             env = ResidualWrapper(env, state_machine, frameskip,
                                   max_torque, residual_state,
-                                  max_length=episode_length)
+                                  max_length=episode_length,
+                                  snapshot_pool_size=snapshot_pool_size,
+                                  snapshot_refresh_prob=snapshot_refresh_prob)
             env = EpisodeInfo(env)
             env.seed(seed + rank)
             return env
@@ -7,6 +7,7 @@ from dl import nest
 import torch
 import numpy as np
 import os
+from copy import deepcopy
 
 
 def load_policy(logdir):
@@ -101,6 +102,11 @@ class ResidualState(State):
         self.residual_action = {'torque': None, 'position': None, 'frameskip': 0}
         self.base_action = {'torque': None, 'position': None, 'frameskip': 0}
 
+    def get_state(self, memo):
+        # the policy is not copied, the base state is copied by the state machine
+        return deepcopy({'residual_action': self.residual_action,
+                         'base_action': self.base_action}, memo)
+
     def connect(self, *args, **kwargs):
         self.base_state.connect(*args, **kwargs)
 
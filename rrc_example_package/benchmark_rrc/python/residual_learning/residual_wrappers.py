@@ -4,7 +4,7 @@ from copy import deepcopy
 from scipy.spatial.transform import Rotation as R
 import gym
 from rrc_example_package.benchmark_rrc.python.env.viz import CuboidMarker
-from .domain_randomization import TriFingerRandomizer, Parameter
+from .domain_randomization import TriFingerRandomizer, Parameter, ParameterDict, NoiseBuffer
 import rrc_example_package.benchmark_rrc.python.mp.const as const
 
 from rrc_example_package.cube_trajectory_env import ActionType
@@ -31,16 +31,28 @@ class ResidualWrapper(gym.Wrapper):
             learning.
         max_length: The max number of steps in the residual state before
             terminating the episode.
+        snapshot_pool_size: If > 0, the simulation is saved when entering the
+            residual state.  Once snapshots of that many episodes are
+            collected, reset restores a random snapshot instead of running
+            the state machine up to the residual state.  Not supported for
+            open-loop residual states.
+        snapshot_refresh_prob: Probability with which a reset runs the state
+            machine anyway and replaces a random snapshot of the full pool.
     '''
 
     def __init__(self, env, state_machine, frameskip, max_torque, residual_state,
-                 max_length=None):
+                 max_length=None, snapshot_pool_size=0, snapshot_refresh_prob=0.0):
         super().__init__(env)
         self.state_machine = state_machine(env)
         self.frameskip = frameskip
         self.max_torque = max_torque
         self.max_length = max_length
         self.residual_state = residual_state
+        self.snapshot_pool_size = snapshot_pool_size
+        self.snapshot_refresh_prob = snapshot_refresh_prob
+        self.snapshots = []
+        if snapshot_pool_size > 0:
+            self._check_snapshot_support()
         # The residual controller will use a fixed frameskip, so remove it
         # from the action_space
         self.action_space = gym.spaces.Box(
@@ -63,6 +75,10 @@ class ResidualWrapper(gym.Wrapper):
         self.state_machine.reset()
         self._t = 0
         self._active = False
+        if self._use_snapshot():
+            obs = self._restore_snapshot(
+                self.snapshots[np.random.randint(len(self.snapshots))])
+            return self._add_action_to_obs(obs, self.base_action)
         try:
             obs, done = self._step_state_machine(obs, False)
         except Exception as e:
@@ -70,8 +86,45 @@ class ResidualWrapper(gym.Wrapper):
             return self.reset()
         if done:
             return self.reset()
+        if self.snapshot_pool_size > 0:
+            self._save_snapshot(obs)
         return self._add_action_to_obs(obs, self.base_action)
 
+    def _use_snapshot(self):
+        if self.snapshot_pool_size <= 0:
+            return False
+        if len(self.snapshots) < self.snapshot_pool_size:
+            return False
+        return np.random.rand() >= self.snapshot_refresh_prob
+
+    def _check_snapshot_support(self):
+        for state in self.state_machine.get_states():
+            if (state.__class__.__name__ == self.residual_state
+                    and not state.snapshot_supported):
+                raise ValueError(
+                    f"Snapshots are not supported for residual state "
+                    f"{self.residual_state}, set snapshot_pool_size=0.")
+
+    def _save_snapshot(self, obs):
+        # state at the entry to the residual state
+        snapshot = {
+            'sim': self.env.unwrapped.get_sim_snapshot(),
+            'obs': deepcopy(obs),
+            'state_machine': self.state_machine.get_state(),
+            'base_action': deepcopy(self.base_action),
+        }
+        if len(self.snapshots) < self.snapshot_pool_size:
+            self.snapshots.append(snapshot)
+        else:
+            self.snapshots[np.random.randint(len(self.snapshots))] = snapshot
+
+    def _restore_snapshot(self, snapshot):
+        self.env.unwrapped.restore_sim_snapshot(snapshot['sim'])
+        self.state_machine.set_state(snapshot['state_machine'])
+        self.base_action = deepcopy(snapshot['base_action'])
+        self._active = True
+        return deepcopy(snapshot['obs'])
+
     def step(self, action):
         self.residual_action = {
             'torque': action, 'frameskip': self.frameskip
@@ -142,6 +195,15 @@ class ResidualWrapper(gym.Wrapper):
         return action
 
 
+# fields of the robot observation and the name of their noise parameter
+ROBOT_NOISE_FIELDS = {
+    'position': 'robot_position',
+    'velocity': 'robot_velocity',
+    'torque': 'robot_torque',
+    'tip_force': 'tip_force',
+}
+
+
 class RandomizedEnvWrapper(gym.Wrapper):
     def __init__(self, env, camera_fps=10.0, visualize=False, flatten_obs=False, time_step_s=0.001):
         super().__init__(env)
@@ -162,6 +224,29 @@ class RandomizedEnvWrapper(gym.Wrapper):
         
         self.cube_width_sampler = Parameter('cube_width_scale', 0.8, 1.1)
 
+        # bounds used for clipping the noisy values
+        robot_space = env.observation_space['robot_observation']
+        self._obs_bounds = {
+            field: (robot_space[field].low, robot_space[field].high)
+            for field in ROBOT_NOISE_FIELDS
+        }
+        if self.env.action_type == ActionType.TORQUE:
+            self._action_noise_name = 'action_torque'
+        elif self.env.action_type == ActionType.POSITION:
+            self._action_noise_name = 'action_position'
+        else:
+            self._action_noise_name = None
+        if self._action_noise_name is not None:
+            self._action_bounds = (self.action_space.low, self.action_space.high)
+
+        # noise of a whole episode is sampled at once in reset()
+        episode_steps = self._max_episode_steps + 1
+        episode_frames = episode_steps * env.unwrapped.step_size // self.steps_per_camera_frame + 1
+        self._robot_noise = NoiseBuffer(self.randomizer.robot_params, episode_steps)
+        self._action_noise = NoiseBuffer(self.randomizer.action_params, episode_steps)
+        self._timestep_noise = NoiseBuffer(ParameterDict(self.randomizer.timestep), episode_steps)
+        self._cube_noise = NoiseBuffer(self.randomizer.cube_params, episode_frames)
+
     def reset(self, difficulty=None, init_state='normal', noisy=False, noise_level=1):
         if self.marker:
             del self.marker
@@ -171,6 +256,8 @@ class RandomizedEnvWrapper(gym.Wrapper):
         self.env.cube_scale = cube_width_scale
         
         obs = self.env.reset(difficulty=difficulty, init_state=init_state, noisy=noisy, noise_level=noise_level)
+        for noise in [self._robot_noise, self._action_noise, self._timestep_noise, self._cube_noise]:
+            noise.refill()
 
         if self.first_run:
             self.finger_id = self.env.platform.simfinger.finger_id
@@ -199,9 +286,9 @@ class RandomizedEnvWrapper(gym.Wrapper):
         return obs
 
     def step(self, action):
-        action_noisy = self.randomize_action(action.copy())
+        action_noisy = self.randomize_action(action)
         # TODO: only change at start of episode?
-        p.setTimeStep(self.randomizer.sample_timestep(),
+        p.setTimeStep(float(self._timestep_noise.next()['timestep']),
                       physicsClientId=self.client_id)
         obs, reward, is_done, info = self.env.step(action_noisy)
         # Ensure do not reveal noisy action to agent
@@ -222,59 +309,42 @@ class RandomizedEnvWrapper(gym.Wrapper):
         return obs, reward, is_done, info
 
     def randomize_action(self, action):
-        noise = self.randomizer.sample_action_noise()
-        if self.env.action_type == ActionType.TORQUE:
-            action = np.clip(
-                action + noise['action_torque'],
-                self.action_space.low,
-                self.action_space.high
-            )
-        elif self.env.action_type == ActionType.POSITION:
-            action = np.clip(
-                action + noise['action_position'],
-                self.action_space.low,
-                self.action_space.high
-            )
-        else:
+        if self._action_noise_name is None:
             raise NotImplementedError()
-        return action
+        # the pre-sampled noise row is used as output array
+        noisy = self._action_noise.next()[self._action_noise_name]
+        np.add(noisy, action, out=noisy)
+        return np.clip(noisy, *self._action_bounds, out=noisy)
 
     def randomize_obs(self, obs):
-        clean_obs = deepcopy(obs)
-
-        noise = self.randomizer.sample_robot_noise()
-
-        # add noise to robot_position
-        ob_space = self.env.observation_space['robot_observation']['position']
-        obs['robot_observation']['position'] = np.clip(obs['robot_observation']['position'] + noise['robot_position'],
-                                        ob_space.low, ob_space.high)
-        obs['robot_observation']['tip_position'] = np.array(self.unwrapped.platform.forward_kinematics(obs['robot_observation']['position']))
-        # add noise to robot_velocity
-        ob_space = self.env.observation_space['robot_observation']['velocity']
-        obs['robot_observation']['velocity'] = np.clip(obs['robot_observation']['velocity'] + noise['robot_velocity'],
-                                        ob_space.low, ob_space.high)
-        
-        # add noise to robot_torque
-        ob_space = self.env.observation_space['robot_observation']['torque']
-        obs['robot_observation']['torque'] = np.clip(obs['robot_observation']['torque'] + noise['robot_torque'],
-                                      ob_space.low, ob_space.high)
-        # add noise to tip_force
-        ob_space = self.env.observation_space['robot_observation']['tip_force']
-        obs['robot_observation']['tip_force'] = np.clip(obs['robot_observation']['tip_force'] + noise['tip_force'],
-                                   ob_space.low, ob_space.high)
+        # The clean observation keeps the original arrays, the noisy values
+        # are written to the (pre-sampled) noise arrays, so only the dicts
+        # have to be copied.
+        clean_obs = obs
+        obs = dict(obs)
+        obs['robot_observation'] = dict(obs['robot_observation'])
+        obs['object_observation'] = dict(obs['object_observation'])
+
+        noise = self._robot_noise.next()
+        robot_obs = obs['robot_observation']
+        for field, name in ROBOT_NOISE_FIELDS.items():
+            noisy = noise[name]
+            np.add(noisy, robot_obs[field], out=noisy)
+            robot_obs[field] = np.clip(noisy, *self._obs_bounds[field], out=noisy)
+        # tip positions are only updated if the env provides them
+        if 'tip_position' in robot_obs:
+            robot_obs['tip_position'] = np.array(self.unwrapped.platform.forward_kinematics(robot_obs['position']))
 
         # use saved noisy object observation
         obs['object_observation']['position'] = self.noisy_cube_pose['position']
         obs['object_observation']['orientation'] = self.noisy_cube_pose['orientation']
 
         obs['clean'] = clean_obs
-        obs['params'] = np.concatenate(
-            [v.flatten() for v in self.params.values()]
-        )
+        obs['params'] = self._flat_params
         return obs
 
     def sample_noisy_cube(self, obs):
-        noise = self.randomizer.sample_cube_noise()
+        noise = self._cube_noise.next()
         q_obj = R.from_quat(obs['object_observation']['orientation'])
         q_noise = R.from_euler('ZYX', noise['cube_ori'], degrees=False)
         return {
@@ -284,6 +354,11 @@ class RandomizedEnvWrapper(gym.Wrapper):
 
     def randomize_param(self):
         self.params = self.randomizer.sample_dynamics()
+        self._flat_params = np.concatenate(
+            [v.flatten() for v in self.params.values()]
+        )
+        # the same array is part of every observation of the episode
+        self._flat_params.flags.writeable = False
         p.changeDynamics(bodyUniqueId=self.cube_id, linkIndex=-1,
                          physicsClientId=self.client_id,
                          mass=self.params['cube_mass'])
@@ -294,26 +369,16 @@ class RandomizedEnvWrapper(gym.Wrapper):
         # set params by passing kw dictionary
         # all values of dict should be list which length is 3 or 9 for different params or float/int for the same param
         self.check_robot_param_dict(kwargs)
+        # expand all params to one value per link at once, pybullet has no
+        # batched changeDynamics, so all params of a link are set in one call
+        n_links = len(self.link_indices)
+        per_link = {k: np.resize(v, n_links).tolist() for k, v in kwargs.items()}
         for i, link_id in enumerate(self.link_indices):
-            joint_kwargs = self.get_robot_param_dict(kwargs, i)
             p.changeDynamics(bodyUniqueId=self.finger_id, linkIndex=link_id,
-                             physicsClientId=self.client_id, **joint_kwargs)
+                             physicsClientId=self.client_id,
+                             **{k: v[i] for k, v in per_link.items()})
 
     def check_robot_param_dict(self, dic):
         for v in dic.values():
-            if len(v.shape) > 0:
-                assert len(v) in [3, 9]
-
-    def get_robot_param_dict(self, dic, i):
-        ret_dic = {}
-        for k in dic.keys():
-            if len(dic[k].shape) == 0:
-                ret_dic[k] = dic[k]
-            elif len(dic[k]) == 3:
-                ret_dic[k] = dic[k][i % 3]
-            elif len(dic[k]) == 9:
-                ret_dic[k] = dic[k][i]
-            else:
+            if len(np.shape(v)) > 0 and len(v) not in [3, 9]:
                 raise ValueError("Weird param shape.")
-
-        return ret_dic
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import unittest
+import numpy as np
+
+from env.make_env import make_env
+from mp.state_machines import MPStateMachine
+from trifinger_simulation.tasks import move_cube
+from residual_learning.residual_wrappers import ResidualWrapper
+
+
+class TestResidualWrapperSnapshots(unittest.TestCase):
+    """Test that a restored snapshot continues the saved episode."""
+
+    def setUp(self):
+        goal = move_cube.sample_goal(3)
+        env = make_env(
+            cube_goal_pose={
+                'position': goal.position,
+                'orientation': goal.orientation
+            },
+            goal_difficulty=3,
+            action_space='torque_and_position',
+            frameskip=3,
+            sim=True,
+            initializer='training_init',
+            termination_fn='no_termination',
+            episode_length=100000,
+        )
+        self.env = ResidualWrapper(env, MPStateMachine, frameskip=3,
+                                   max_torque=0.1,
+                                   residual_state='MoveToGoalState',
+                                   snapshot_pool_size=1)
+
+    def test_open_loop_residual_state_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ResidualWrapper(self.env.env, MPStateMachine, frameskip=3,
+                            max_torque=0.1,
+                            residual_state='PlannedGraspState',
+                            snapshot_pool_size=1)
+
+    def tearDown(self):
+        self.env.close()
+
+    def _rollout(self, obs, num_steps=30):
+        # base actions of the state machine with a zero residual action
+        actions = [obs['action']]
+        for _ in range(num_steps):
+            obs, _, done, _ = self.env.step(
+                np.zeros_like(self.env.action_space.low))
+            actions.append(obs['action'])
+            if done:
+                break
+        return actions
+
+    def test_restored_snapshot_continues_episode(self):
+        obs = self.env.reset()
+        self.assertEqual(len(self.env.snapshots), 1)
+        expected = self._rollout(obs)
+
+        # the pool is full, so reset restores the snapshot
+        obs = self.env.reset()
+        self.assertTrue(self.env.state_machine.move_to_goal.pi is not None)
+        actual = self._rollout(obs)
+
+        self.assertEqual(len(actual), len(expected))
+        for a, b in zip(actual, expected):
+            self.assertEqual(a['torque_enabled'], b['torque_enabled'])
+            self.assertEqual(a['position_enabled'], b['position_enabled'])
+            np.testing.assert_allclose(a['position'], b['position'],
+                                       atol=1e-3)
+            np.testing.assert_allclose(a['torque'], b['torque'], atol=1e-3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,4 @@
+"""Performance benchmarks of the simulation and training stack.
+
+Run ``python -m rrc_example_package.benchmarks --help`` for usage.
+"""
@@ -0,0 +1,87 @@
+"""Run the performance benchmarks and compare them against a baseline.
+
+Examples::
+
+    # list the available cases
+    python -m rrc_example_package.benchmarks --list
+
+    # run all cases, store the results and compare against the baseline
+    python -m rrc_example_package.benchmarks --output results.json
+
+    # run some cases and store the results as new baseline
+    python -m rrc_example_package.benchmarks env_step her_sample_transitions \\
+        --save-baseline
+
+The exit code is 1 if at least one case is slower than the baseline by more
+than the tolerance.
+"""
+import argparse
+import os
+import sys
+
+from . import cases  # noqa: F401 (registers the cases)
+from .runner import (CASES, DEFAULT_BASELINE, DEFAULT_TOLERANCE, compare,
+                     format_comparison, load_results, run_suite, save_results)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cases', nargs='*', metavar='CASE',
+                        help='cases to run (default: all)')
+    parser.add_argument('--list', action='store_true',
+                        help='list the available cases and exit')
+    parser.add_argument('--number', type=int,
+                        help='operations per round (default: per case)')
+    parser.add_argument('--repeats', type=int,
+                        help='number of rounds (default: per case)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the random inputs of the cases')
+    parser.add_argument('--output', type=str,
+                        help='write the results as JSON to this file')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE,
+                        help='baseline to compare against '
+                             '(default: %(default)s, if it exists)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='accepted relative slowdown against the baseline')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as baseline instead of '
+                             'comparing against it')
+    args = parser.parse_args()
+
+    if args.list:
+        for case in CASES.values():
+            print('{:<28}{}'.format(case.name, case.description))
+        return 0
+
+    try:
+        results = run_suite(args.cases, args.number, args.repeats, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.output:
+        save_results(results, args.output)
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print('saved baseline to {}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        if args.baseline != DEFAULT_BASELINE:
+            parser.error('baseline {} does not exist'.format(args.baseline))
+        print('no baseline found, run with --save-baseline to create one')
+        return 0
+
+    comparison = compare(results, load_results(args.baseline), args.tolerance)
+    print(format_comparison(comparison))
+    regressions = [c['name'] for c in comparison if c['regression']]
+    if regressions:
+        print('regressions (> {:.0%} slower): {}'.format(
+            args.tolerance, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""Benchmark cases of the hot paths of simulation, planning and training.
+
+Every case only imports what it needs, so cases whose dependencies are not
+available are skipped instead of failing the whole suite.
+"""
+import argparse
+import functools
+import importlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from .runner import benchmark, SkipBenchmark
+
+
+BENCHMARK_RRC_PYTHON = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', 'benchmark_rrc', 'python'))
+
+# dimensions of the training data with the default arguments of train.py
+# (obs_type 'default', torque actions, ep_len 90, steps_per_goal 30)
+OBS_DIM = 40
+GOAL_DIM = 7
+ACTION_DIM = 9
+EPISODE_LENGTH = 90
+STEPS_PER_GOAL = 30
+NUM_EPISODES = 1000
+BATCH_SIZE = 256
+N_BATCHES = 40
+
+
+def _import(name, path=None):
+    """Import a module or raise SkipBenchmark if it is not available."""
+    if path is not None and path not in sys.path:
+        sys.path.append(path)
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        raise SkipBenchmark('cannot import {}: {}'.format(name, e))
+
+
+def _random_joint_positions(n):
+    limits = _import('trifinger_simulation.trifingerpro_limits')
+    low = limits.robot_position.low
+    high = limits.robot_position.high
+    return np.random.uniform(low, high, size=(n, len(low)))
+
+
+def _cycle(items):
+    """Callable returning the items one after the other (endlessly)."""
+    state = {'i': 0}
+
+    def next_item():
+        item = items[state['i'] % len(items)]
+        state['i'] += 1
+        return item
+    return next_item
+
+
+@functools.lru_cache(maxsize=None)
+def _sim_to_real_env():
+    cube_trajectory_env = _import('rrc_example_package.cube_trajectory_env')
+    return cube_trajectory_env.SimtoRealEnv(
+        action_type=cube_trajectory_env.ActionType.TORQUE,
+        max_steps=EPISODE_LENGTH,
+        steps_per_goal=STEPS_PER_GOAL,
+        step_size=50,
+        env_type='sim',
+        obs_type='default',
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _benchmark_rrc_env():
+    make_env = _import('env.make_env', BENCHMARK_RRC_PYTHON)
+    move_cube = _import('trifinger_simulation.tasks.move_cube')
+    env = make_env.make_env(move_cube.sample_goal(-1).to_dict(), 3,
+                            reward_fn='competition_reward',
+                            termination_fn='position_close_to_goal',
+                            initializer='training_init',
+                            action_space='torque_and_position',
+                            sim=True)
+    obs = env.reset()
+    return env, obs
+
+
+def _her_args(**overrides):
+    """Default training arguments of the HER agent."""
+    arguments = _import('rrc_example_package.her.arguments')
+    # get_args parses sys.argv
+    argv = sys.argv
+    sys.argv = argv[:1]
+    try:
+        args = arguments.get_args()
+    finally:
+        sys.argv = argv
+    vars(args).update(overrides)
+    return args
+
+
+def _episodes(num_episodes=NUM_EPISODES):
+    """Random episodes in the storage format of the replay buffer."""
+    T = EPISODE_LENGTH
+    return {
+        'obs': np.random.randn(num_episodes, T + 1, OBS_DIM),
+        'ag': np.random.uniform(-0.1, 0.1, (num_episodes, T + 1, GOAL_DIM)),
+        'g': np.random.uniform(-0.1, 0.1, (num_episodes, T + 1, GOAL_DIM)),
+        'actions': np.random.uniform(-0.397, 0.397,
+                                     (num_episodes, T, ACTION_DIM)),
+    }
+
+
+@benchmark('simfinger_step', unit='1 kHz step', number=1000)
+def simfinger_step():
+    """SimFinger.append_desired_action + get_observation (one 1 ms step)."""
+    trifinger_simulation = _import('trifinger_simulation')
+    limits = _import('trifinger_simulation.trifingerpro_limits')
+    finger = trifinger_simulation.SimFinger(finger_type='trifingerpro')
+    action = finger.Action(position=limits.robot_position.default)
+
+    def op():
+        t = finger.append_desired_action(action)
+        finger.get_observation(t)
+    return op
+
+
+@benchmark('env_step', unit='env step (50 sim steps)', number=20)
+def env_step():
+    """SimtoRealEnv.step with zero torques (step_size 50)."""
+    env = _sim_to_real_env()
+    env.reset()
+    action = np.zeros(env.action_space.shape, dtype=env.action_space.dtype)
+
+    def op():
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    return op
+
+
+@benchmark('env_reset', unit='reset', number=5)
+def env_reset():
+    """SimtoRealEnv.reset."""
+    env = _sim_to_real_env()
+    return env.reset
+
+
+@benchmark('kinematics_fk', unit='FK of 3 fingers', number=1000)
+def kinematics_fk():
+    """Kinematics.forward_kinematics for random joint positions."""
+    utils = _import('rrc_example_package.utils')
+    kinematics = utils.init_kinematics()
+    next_q = _cycle(_random_joint_positions(100))
+    return lambda: kinematics.forward_kinematics(next_q())
+
+
+@benchmark('kinematics_ik', unit='IK of 3 fingers', number=50)
+def kinematics_ik():
+    """Kinematics.inverse_kinematics for reachable random tip positions."""
+    utils = _import('rrc_example_package.utils')
+    limits = _import('trifinger_simulation.trifingerpro_limits')
+    kinematics = utils.init_kinematics()
+    targets = [kinematics.forward_kinematics(q)
+               for q in _random_joint_positions(100)]
+    next_target = _cycle(targets)
+    guess = limits.robot_position.default
+    return lambda: kinematics.inverse_kinematics(next_target(), guess)
+
+
+@benchmark('collision_fn', unit='collision check', number=200)
+def collision_fn():
+    """Collision check of CollisionConfig.get_collision_fn('mpfc')."""
+    collision_config = _import('mp.grasping.collision_config',
+                               BENCHMARK_RRC_PYTHON)
+    env, _ = _benchmark_rrc_env()
+    check = collision_config.CollisionConfig(env).get_collision_fn('mpfc')
+    next_q = _cycle(_random_joint_positions(100))
+    return lambda: check(next_q())
+
+
+@benchmark('grasp_sampler', unit='sampled grasp', number=3, repeats=3)
+def grasp_sampler():
+    """GraspSampler.__call__ for the cube pose after reset."""
+    grasp_sampling = _import('mp.grasping.grasp_sampling',
+                             BENCHMARK_RRC_PYTHON)
+    env, obs = _benchmark_rrc_env()
+    sampler = grasp_sampling.GraspSampler(env, obs['object_position'],
+                                          obs['object_orientation'])
+    return sampler
+
+
+@benchmark('her_sample_transitions', unit='batch of {}'.format(BATCH_SIZE))
+def her_sample_transitions():
+    """her_sampler.sample_her_transitions from a buffer of random episodes."""
+    her = _import('rrc_example_package.her.her_modules.her')
+    env = _sim_to_real_env()
+    sampler = her.her_sampler('future', 4, env.compute_reward,
+                              STEPS_PER_GOAL,
+                              args=argparse.Namespace(reward_type='p_o'))
+    episodes = _episodes()
+    return lambda: sampler.sample_her_transitions(episodes, BATCH_SIZE, 0)
+
+
+def _ddpg_agent():
+    """ddpg_agent_rrc with a filled replay buffer."""
+    ddpg_agent_rrc = _import('rrc_example_package.her.rl_modules.ddpg_agent_rrc')
+    env = _sim_to_real_env()
+    args = _her_args(teach_mode='none', save_dir=tempfile.mkdtemp(),
+                     buffer_size=NUM_EPISODES * EPISODE_LENGTH,
+                     batch_size=BATCH_SIZE)
+    env_params = {'obs': OBS_DIM, 'goal': GOAL_DIM, 'action': ACTION_DIM,
+                  'action_max': 0.397, 'max_timesteps': EPISODE_LENGTH}
+    agent = ddpg_agent_rrc.ddpg_agent_rrc(args, env, env_params)
+    agent.epoch = 0
+    episodes = _episodes()
+    agent.buffer.store_episode([episodes['obs'], episodes['ag'], episodes['g'],
+                                episodes['actions']])
+    return agent
+
+
+@benchmark('ddpg_update_network', unit='update (batch of {})'.format(
+    BATCH_SIZE), number=20)
+def ddpg_update_network():
+    """ddpg_agent_rrc._update_network with a filled replay buffer."""
+    return _ddpg_agent()._update_network
+
+
+@benchmark('ddpg_update_network_fused', unit='{} updates (batch of {})'.format(
+    N_BATCHES, BATCH_SIZE), number=1)
+def ddpg_update_network_fused():
+    """ddpg_agent_rrc._update_network_fused for the updates of one cycle."""
+    agent = _ddpg_agent()
+    return lambda: agent._update_network_fused(N_BATCHES)
+
+
+@benchmark('mpi_sync_grads', unit='sync of actor + critic grads', number=200)
+def mpi_sync_grads():
+    """mpi_utils.sync_grads of the actor and critic networks."""
+    torch = _import('torch')
+    mpi_utils = _import('rrc_example_package.her.mpi_utils.mpi_utils')
+    models = _import('rrc_example_package.her.rl_modules.models')
+    env_params = {'obs': OBS_DIM, 'goal': GOAL_DIM, 'action': ACTION_DIM,
+                  'action_max': 0.397}
+    actor = models.actor(env_params)
+    critic = models.critic(env_params)
+    inputs = torch.randn(BATCH_SIZE, OBS_DIM + GOAL_DIM)
+    critic(inputs, actor(inputs)).mean().backward()
+
+    def op():
+        mpi_utils.sync_grads(actor)
+        mpi_utils.sync_grads(critic)
+    return op
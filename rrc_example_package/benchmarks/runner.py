@@ -0,0 +1,212 @@
+"""Timing of benchmark cases and comparison against a stored baseline.
+
+A benchmark case is a function registered with :func:`benchmark`.  It does
+its (untimed) setup and returns a callable which executes the measured
+operation once.  The runner calls it ``number`` times per round for
+``repeats`` rounds and reports the time per operation of the median round
+(and of the fastest round).
+
+Results are written as JSON::
+
+    {
+        "meta": {...},  # versions, host, git commit, settings
+        "results": {
+            "<case>": {"unit": ..., "median_s": ..., "min_s": ..., ...},
+            ...
+        },
+        "skipped": {"<case>": "<reason>", ...}
+    }
+
+A baseline is a results file of an earlier run.  A case counts as a
+regression if its median time is more than ``tolerance`` (relative) above
+the median time of the baseline.
+"""
+import collections
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_TOLERANCE = 0.1
+
+Case = collections.namedtuple('Case', ['name', 'setup', 'unit', 'number',
+                                       'repeats', 'description'])
+
+#: Registered benchmark cases by name (in order of registration).
+CASES = collections.OrderedDict()
+
+
+class SkipBenchmark(Exception):
+    """Raised by the setup of a case which cannot run in this environment."""
+
+
+def benchmark(name, unit, number=100, repeats=5):
+    """Register the decorated setup function as benchmark case.
+
+    Args:
+        name: Name of the case (key in the results).
+        unit: Description of one measured operation (e.g. "step").
+        number: Default number of operations per timed round.
+        repeats: Default number of timed rounds.
+    """
+    def decorator(setup):
+        CASES[name] = Case(name, setup, unit, number, repeats,
+                           (setup.__doc__ or '').strip().split('\n')[0])
+        return setup
+    return decorator
+
+
+def run_case(case, number=None, repeats=None, warmup=1, seed=0):
+    """Run one benchmark case.
+
+    Args:
+        case: The :class:`Case`.
+        number: Operations per round (default of the case if None).
+        repeats: Number of rounds (default of the case if None).
+        warmup: Number of untimed operations before the first round.
+        seed: Seed of the numpy random generator used for the setup.
+
+    Returns:
+        dict: Timing results of the case.
+    """
+    number = number or case.number
+    repeats = repeats or case.repeats
+    np.random.seed(seed)
+    op = case.setup()
+    for _ in range(warmup):
+        op()
+
+    round_times = []
+    for _ in range(repeats):
+        t_start = time.perf_counter()
+        for _ in range(number):
+            op()
+        round_times.append((time.perf_counter() - t_start) / number)
+
+    median = statistics.median(round_times)
+    return {
+        'unit': case.unit,
+        'number': number,
+        'repeats': repeats,
+        'median_s': median,
+        'min_s': min(round_times),
+        'max_s': max(round_times),
+        'ops_per_s': 1.0 / median if median > 0 else float('inf'),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versions():
+    versions = {'python': platform.python_version(), 'numpy': np.__version__}
+    for module in ['torch', 'scipy', 'pybullet', 'pinocchio']:
+        try:
+            versions[module] = getattr(__import__(module), '__version__',
+                                       'unknown')
+        except ImportError:
+            pass
+    return versions
+
+
+def run_suite(names=None, number=None, repeats=None, seed=0, log=print):
+    """Run the given (or all) cases.
+
+    Cases whose setup raises :class:`SkipBenchmark` are reported as skipped.
+
+    Returns:
+        dict: The results in the JSON format described in the module doc.
+    """
+    names = list(CASES) if not names else names
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        raise ValueError('Unknown benchmark(s): {}'.format(', '.join(unknown)))
+
+    results = collections.OrderedDict()
+    skipped = collections.OrderedDict()
+    for name in names:
+        log('running {} ...'.format(name))
+        try:
+            results[name] = run_case(CASES[name], number, repeats, seed=seed)
+        except SkipBenchmark as e:
+            skipped[name] = str(e)
+            log('  skipped: {}'.format(e))
+            continue
+        log('  {:.3f} ms / {}'.format(results[name]['median_s'] * 1e3,
+                                      results[name]['unit']))
+
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'host': platform.node(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'git_commit': _git_commit(),
+            'versions': _versions(),
+            'seed': seed,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare results against a baseline.
+
+    Args:
+        results: Output of :func:`run_suite`.
+        baseline: Output of an earlier :func:`run_suite`.
+        tolerance: Relative slowdown of the median time which is still
+            accepted.
+
+    Returns:
+        list: One dict per case contained in both with the keys "name",
+        "baseline_s", "current_s", "ratio" and "regression".
+    """
+    comparison = []
+    for name, current in results['results'].items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            continue
+        ratio = current['median_s'] / reference['median_s']
+        comparison.append({
+            'name': name,
+            'baseline_s': reference['median_s'],
+            'current_s': current['median_s'],
+            'ratio': ratio,
+            'regression': ratio > 1.0 + tolerance,
+        })
+    return comparison
+
+
+def format_comparison(comparison):
+    lines = ['{:<28}{:>14}{:>14}{:>10}'.format(
+        'case', 'baseline [ms]', 'current [ms]', 'ratio')]
+    for c in comparison:
+        lines.append('{:<28}{:>14.3f}{:>14.3f}{:>10.2f}{}'.format(
+            c['name'], c['baseline_s'] * 1e3, c['current_s'] * 1e3,
+            c['ratio'], '  REGRESSION' if c['regression'] else ''))
+    return '\n'.join(lines)
+
+
+def load_results(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
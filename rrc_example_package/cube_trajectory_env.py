@@ -339,13 +339,18 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
         action_type: ActionType = ActionType.TORQUE,
         difficulty=4, sparse_rewards=True, step_size=101, distance_threshold=0.02,orientation_threshold=22,distance_threshold_z=0.012,
         max_steps=50, visualization=False, goal_trajectory=None, steps_per_goal=50, xy_only=False,
-        env_type='sim', obs_type='default', env_wrapped=False, increase_fps=False, disable_arm3=False,reward_type ='1'
+        env_type='sim', obs_type='default', env_wrapped=False, increase_fps=False, disable_arm3=False,reward_type ='1',
+        goal_banks=None
     ):
         """Initialize.
 
         Args:
             goal_trajectory: Goal trajectory for the cube.  If ``None`` a new
                 random trajectory is sampled upon reset.
+            goal_banks (dict): Pre-sampled goal trajectories
+                (:class:`task.GoalTrajectoryBank`) by difficulty.  If there is
+                a bank for the goal difficulty, the trajectories are drawn from
+                it upon reset instead of being sampled.
             action_type (ActionType): Specify which type of actions to use.
                 See :class:`ActionType` for details.
             step_size (int):  Number of actual control steps to be performed in
@@ -378,8 +383,11 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
         self.distance_threshold_z = distance_threshold_z
         self.reward_type = reward_type
         self.difficulty = difficulty
+        # rewards of the last object pose and goal (see _substep_rrc_rewards)
+        self._substep_reward_cache = None
         
         self.cube_scale = 1
+        self.cube_width = move_cube._CUBE_WIDTH * self.cube_scale
         
         if self.obs_type == 'default':
             self.z_pos = 29
@@ -392,15 +400,16 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
         else:
             self.compute_reward = self.compute_reward_rrc
             
-        if goal_trajectory is None:
-            if difficulty != None:
-                task.GOAL_DIFFICULTY = difficulty
-            if steps_per_goal != None:
-                #: Number of time steps for which the first goal in the trajectory is active.
-                task.FIRST_GOAL_DURATION = steps_per_goal * step_size
-                #: Number of time steps for which following goals in the trajectory are active.
-                task.GOAL_DURATION = steps_per_goal * step_size
-            
+        # parameters of the sampled goal trajectories (None for the defaults of task)
+        self.goal_difficulty = difficulty
+        self.goal_duration = None if steps_per_goal is None else steps_per_goal * step_size
+        self.goal_banks = goal_banks or {}
+        goal_times = task.get_goal_start_times(self.goal_duration, self.goal_duration)
+        for bank_difficulty, bank in self.goal_banks.items():
+            if bank.difficulty != bank_difficulty or list(bank.times) != goal_times:
+                raise ValueError('goal bank for difficulty {} does not match the goal difficulty or '
+                                 'the goal durations of the env'.format(bank_difficulty))
+
 
     def step(self, action, initial=False):
         """Run one timestep of the environment's dynamics.
@@ -444,37 +453,52 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
             action_to_apply[6:9] = np.array([-self.action_space.high[0],self.action_space.high[0],-self.action_space.high[0]])        
         
         reward = 0.0
-        for _ in range(num_steps):
-            # send action to robot
+        if self.env_type == 'sim' and not self.visualization and not initial:
+            # hold the action for all steps in the platform and only create
+            # the observation of the last one
             robot_action = self._gym_action_to_robot_action(action_to_apply)
-            t = self.platform.append_desired_action(robot_action)
-            
-            if self.env_type == 'sim' and self.visualization:
-                # update goal visualization
-                goal = task.get_active_goal(
-                    self.info["trajectory"], t
-                )
-                self.goal_marker.set_state(goal.position, goal.orientation)
-                    
+            t, _, _, rrc_rewards = self.platform.step_many(
+                robot_action, num_steps, reward_fn=self._substep_rrc_rewards
+            )
             self.info["time_index"] = t
-            #TODO: No need to create obs until loop ended
             observation = self._create_raw_observation(
                 self.info["time_index"], action, obs_type='full'
             )
+            self.info["rrc_reward"] += rrc_rewards[0]
+            self.info["rrc_reward_pos"] += rrc_rewards[1]
+            self.info["rrc_reward_ori"] += rrc_rewards[2]
+        else:
+            for _ in range(num_steps):
+                # send action to robot
+                robot_action = self._gym_action_to_robot_action(action_to_apply)
+                t = self.platform.append_desired_action(robot_action)
             
-            rrc_rwd = self.compute_reward_rrc(observation["achieved_goal"],observation["desired_goal"],self.info)
-            rrc_rwd_pos = self.compute_pos_reward_rrc(observation["achieved_goal"],observation["desired_goal"],self.info)
-            rrc_rwd_ori = self.compute_ori_reward_rrc(pos_reward=rrc_rwd_pos, overall_reward=rrc_rwd)
+                if self.env_type == 'sim' and self.visualization:
+                    # update goal visualization
+                    goal = task.get_active_goal(
+                        self.info["trajectory"], t
+                    )
+                    self.goal_marker.set_state(goal.position, goal.orientation)
+                    
+                self.info["time_index"] = t
+                #TODO: No need to create obs until loop ended
+                observation = self._create_raw_observation(
+                    self.info["time_index"], action, obs_type='full'
+                )
             
-            self.info["rrc_reward"] += rrc_rwd
-            self.info["rrc_reward_pos"] += rrc_rwd_pos
-            self.info["rrc_reward_ori"] += rrc_rwd_ori
+                rrc_rwd = self.compute_reward_rrc(observation["achieved_goal"],observation["desired_goal"],self.info)
+                rrc_rwd_pos = self.compute_pos_reward_rrc(observation["achieved_goal"],observation["desired_goal"],self.info)
+                rrc_rwd_ori = self.compute_ori_reward_rrc(pos_reward=rrc_rwd_pos, overall_reward=rrc_rwd)
             
-            if initial:
-                observation = self._update_obj_vel(observation, initial)
-                observation = self.flatten_obs(observation)
-                self._active_goal = observation["desired_goal"]
-                break
+                self.info["rrc_reward"] += rrc_rwd
+                self.info["rrc_reward_pos"] += rrc_rwd_pos
+                self.info["rrc_reward_ori"] += rrc_rwd_ori
+            
+                if initial:
+                    observation = self._update_obj_vel(observation, initial)
+                    observation = self.flatten_obs(observation)
+                    self._active_goal = observation["desired_goal"]
+                    break
         
         is_done = self.info["time_index"] >= self._max_episode_steps * self.step_size or self.info["time_index"] >= task.EPISODE_LENGTH
         
@@ -493,13 +517,33 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
         
         return observation, reward, is_done, self.info
 
+    def _substep_rrc_rewards(self, t, camera_observation):
+        """rrc rewards (overall, position, orientation) of time step t.
+
+        Same as compute_reward_rrc, compute_pos_reward_rrc and
+        compute_ori_reward_rrc for the observation of step t.  The object pose
+        only changes with the camera rate and the goal every goal duration,
+        so the rewards are only recomputed if one of them changed.
+        """
+        goal = task.get_active_goal(self.info["trajectory"], t)
+        cache = self._substep_reward_cache
+        if cache is None or cache[0] is not camera_observation or cache[1] is not goal:
+            object_pose = camera_observation.filtered_object_pose
+            achieved_goal = move_cube.Pose(position=object_pose.position, orientation=object_pose.orientation)
+            rrc_rwd = -move_cube.evaluate_state(goal, achieved_goal, self.difficulty)
+            rrc_rwd_pos = -move_cube.evaluate_state(goal, achieved_goal, 3)
+            rrc_rwd_ori = self.compute_ori_reward_rrc(pos_reward=rrc_rwd_pos, overall_reward=rrc_rwd)
+            cache = (camera_observation, goal, (rrc_rwd, rrc_rwd_pos, rrc_rwd_ori))
+            self._substep_reward_cache = cache
+        return cache[2]
+
     def reset(self, difficulty=None, init_state='normal', noisy=False, noise_level=1):
         """Reset the environment."""
         
-        move_cube._CUBE_WIDTH = move_cube._CUBE_WIDTH * self.cube_scale
+        self.cube_width = move_cube._CUBE_WIDTH * self.cube_scale
         
         if self.goal_trajectory == None and difficulty != None:
-            task.GOAL_DIFFICULTY = difficulty
+            self.goal_difficulty = difficulty
         
         # hard-reset simulation
         del self.platform
@@ -526,7 +570,11 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
         
         # if no goal is given, sample one randomly
         if self.goal is None:
-            trajectory = task.sample_goal()
+            goal_bank = self.goal_banks.get(self.goal_difficulty)
+            if goal_bank is not None:
+                trajectory = goal_bank.sample()
+            else:
+                trajectory = task.sample_goal(self.goal_difficulty, self.goal_duration, self.goal_duration)
         else:
             trajectory = self.goal
         
@@ -534,14 +582,14 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
         if self.visualization and self.env_type == 'sim':
             if self.difficulty == 3:
                 self.goal_marker = trifinger_simulation.visual_objects.CubeMarker(
-                    width=task.move_cube._CUBE_WIDTH,
+                    width=self.cube_width,
                     position=trajectory[0][1].position,
                     orientation=trajectory[0][1].orientation,
                     pybullet_client_id=self.platform.simfinger._pybullet_client_id,
                 )
             elif self.difficulty == 4:
                 self.goal_marker = trifinger_simulation.visual_objects.CubeMarker2(
-                    # width=task.move_cube._CUBE_WIDTH,
+                    # width=self.cube_width,
                     position=trajectory[0][1].position,
                     orientation=trajectory[0][1].orientation,
                     pybullet_client_id=self.platform.simfinger._pybullet_client_id,
@@ -642,7 +690,7 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
             # [right far, near, left far]
             rob_position = np.array([0.45, 0.9, -1.9, 0.28, 0.8, -1.93, 0.35, 0.9, -1.9], dtype=np.float32)
             # initialize cube
-            cube_pos = (0, 0, (move_cube._CUBE_WIDTH / 2) + 0.062)
+            cube_pos = (0, 0, (self.cube_width / 2) + 0.062)
             cube_orient = trifingerpro_limits.object_orientation.default
             if noisy:
                 # Add small noise to prevent overfitting
@@ -659,7 +707,7 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
                 rob_position += np.random.normal(loc=0.0, scale=0.01, size=rob_position.shape)
                 x_noise = np.random.normal(loc=0.0, scale=0.01)
                 y_noise = np.random.normal(loc=0.0, scale=0.01)
-                cube_pos = (x_noise, y_noise, move_cube._CUBE_WIDTH / 2)
+                cube_pos = (x_noise, y_noise, self.cube_width / 2)
                 cube_orient[2] += np.random.normal(loc=0.0, scale=1)
         # Normal initialise - cube on ground somewhere, arms near center    
         else:
@@ -669,7 +717,7 @@ class SimtoRealEnv(BaseCubeTrajectoryEnv):
             if noisy:
                 x_noise = np.clip(np.random.normal(loc=0.0, scale=0.1), -0.1, 0.1) * noise_level
                 y_noise = np.clip(np.random.normal(loc=0.0, scale=0.1), -0.1, 0.1) * noise_level
-                cube_pos = (x_noise, y_noise, move_cube._CUBE_WIDTH / 2)
+                cube_pos = (x_noise, y_noise, self.cube_width / 2)
                 cube_orient[2] += np.random.normal(loc=0.0, scale=1) * noise_level
                 
         return rob_position, cube_pos, cube_orient
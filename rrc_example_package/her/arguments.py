@@ -51,6 +51,7 @@ def get_args():
     parser.add_argument('--increase-fps', type=int, default=0, help='whether to increase camera fps')
     parser.add_argument('--trajectory-aware', type=int, default=0, help='whether to make agent aware it is dealing with trajectories')
     parser.add_argument('--disable-arm3', type=int, default=0, help='whether to disable the robots 3rd arm')
+    parser.add_argument('--fused-updates', type=int, default=0, help='whether to prefetch the minibatches of all n-batches updates at once and sync actor and critic grads together')
     
     #Orientation:
     parser.add_argument('--orientation-threshold', type=int, default=30, help='orientation-threshold')
@@ -12,41 +12,69 @@ class her_sampler:
         self.steps_per_goal = steps_per_goal
         self.trajectory_aware = trajectory_aware
         self.args = args
-    
-    def sample_her_transitions(self, episode_batch, batch_size_in_transitions,epoch):
-        T = episode_batch['actions'].shape[1]
-        rollout_batch_size = episode_batch['actions'].shape[0]
-        batch_size = batch_size_in_transitions
+        # end of the goal segment of each time step, by episode length
+        self._segment_ends = {}
+
+    def _get_segment_ends(self, T):
+        if T not in self._segment_ends:
+            t = np.arange(T)
+            self._segment_ends[T] = (t // self.steps_per_goal + 1) * self.steps_per_goal
+        return self._segment_ends[T]
+
+    def sample_her_transitions(self, episode_batch, batch_size_in_transitions, epoch, n_batches=None):
+        """
+        sample transitions from the stored episodes and relabel their goals
+
+        episode_batch holds the episodes as stored in the replay buffer: 'obs', 'ag' and 'g' with
+        T + 1 and 'actions' with T steps per episode. The fields of each transition are gathered
+        with one indexed read per field. If n_batches is given, n_batches minibatches are sampled
+        at once and all fields are of shape [n_batches, batch_size, ...].
+
+        """
+        obs, ag, g, actions = (episode_batch[key] for key in ('obs', 'ag', 'g', 'actions'))
+        rollout_batch_size, T = actions.shape[:2]
+        batch_size = batch_size_in_transitions * (n_batches or 1)
         # select which rollouts and which timesteps to be used
         episode_idxs = np.random.randint(0, rollout_batch_size, batch_size)
         t_samples = np.random.randint(T, size=batch_size)
-        transitions = {key: episode_batch[key][episode_idxs, t_samples].copy() for key in episode_batch.keys()}
-        
         # Only sample 'achieved goals' for HER from time-span of current goal
-        T = self.steps_per_goal * np.ceil((t_samples + 1) / self.steps_per_goal)
-        
+        segment_ends = self._get_segment_ends(T)[t_samples]
         # her idx
-        her_indexes = np.where(np.random.uniform(size=batch_size) < self.future_p)
-        future_offset = np.random.uniform(size=batch_size) * (T - t_samples)
+        her_indexes = np.flatnonzero(np.random.uniform(size=batch_size) < self.future_p)
+        future_offset = np.random.uniform(size=batch_size) * (segment_ends - t_samples)
         future_offset = future_offset.astype(int)
         future_t = (t_samples + 1 + future_offset)[her_indexes]
-        # replace goal with achieved goal
-        future_ag = episode_batch['ag'][episode_idxs[her_indexes], future_t]
-        temp_g = transitions['g'].copy()
 
-        transitions['g'][her_indexes] = future_ag
-        
+        # flat index of the sampled steps in the episodes with T + 1 steps
+        idxs = episode_idxs * (T + 1) + t_samples
+        obs, ag, g = (_flatten_episodes(x) for x in (obs, ag, g))
+        transitions = {'obs': obs[idxs],
+                       'obs_next': obs[idxs + 1],
+                       'ag': ag[idxs],
+                       'ag_next': ag[idxs + 1],
+                       'g': g[idxs],
+                       'actions': _flatten_episodes(actions)[episode_idxs * T + t_samples],
+                       }
+
+        # replace goal with achieved goal
+        future_ag = ag[episode_idxs[her_indexes] * (T + 1) + future_t]
         if self.args.reward_type == "po_z" or self.args.reward_type == "p_o_z":
-            transitions['g'][:,2] = temp_g[:,2]
+            future_ag[:, 2] = transitions['g'][her_indexes, 2]
+        transitions['g'][her_indexes] = future_ag
 
         # to get the params to re-compute reward
         transitions['r'] = np.expand_dims(self.reward_func(transitions['ag_next'], transitions['g'], self.args.reward_type,epoch), 1)
-        transitions = {k: transitions[k].reshape(batch_size, *transitions[k].shape[1:]) for k in transitions.keys()}
-        temp_g_next = transitions['g_next'].copy()
         transitions['g_next'] = transitions['g'].copy()
         if self.trajectory_aware:
             # maintain goal changes in transitions where such a change takes place (not advised)
-            no_change = np.where(t_samples == (T - 1))
-            transitions['g_next'][no_change] = temp_g_next[no_change]
+            no_change = np.flatnonzero(t_samples == (segment_ends - 1))
+            transitions['g_next'][no_change] = g[idxs[no_change] + 1]
 
+        if n_batches is not None:
+            transitions = {k: v.reshape(n_batches, batch_size_in_transitions, *v.shape[1:]) for k, v in transitions.items()}
         return transitions
+
+
+def _flatten_episodes(x):
+    # [episodes, steps, ...] -> [episodes * steps, ...] (a view for the contiguous buffers)
+    return x.reshape(-1, *x.shape[2:])
@@ -14,12 +14,20 @@ def sync_networks(network):
     # set the flat params back to the network
     _set_flat_params_or_grads(network, flat_params, mode='params')
 
-def sync_grads(network):
-    flat_grads = _get_flat_params_or_grads(network, mode='grads')
+def sync_grads(*networks):
+    """
+    sum the grads of one or more networks across the cpus (with a single allreduce)
+
+    """
+    flat_grads = np.concatenate([_get_flat_params_or_grads(network, mode='grads') for network in networks])
     comm = MPI.COMM_WORLD
     global_grads = np.zeros_like(flat_grads)
     comm.Allreduce(flat_grads, global_grads, op=MPI.SUM)
-    _set_flat_params_or_grads(network, global_grads, mode='grads')
+    pointer = 0
+    for network in networks:
+        size = sum(param.data.numel() for param in network.parameters())
+        _set_flat_params_or_grads(network, global_grads[pointer:pointer + size], mode='grads')
+        pointer += size
 
 # get the flat grads or params
 def _get_flat_params_or_grads(network, mode='params'):
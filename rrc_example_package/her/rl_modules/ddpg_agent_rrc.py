@@ -85,6 +85,8 @@ class ddpg_agent_rrc:
         self.her_module = her_sampler(self.args.replay_strategy, self.args.replay_k, self.env.compute_reward, self.env.steps_per_goal, self.args.trajectory_aware,args = self.args)
         # create the replay buffer
         self.buffer = replay_buffer(self.env_params, self.args.buffer_size, self.her_module.sample_her_transitions)
+        # reused tensors of the prefetched minibatches of the fused updates
+        self._batch_tensors = None
         # path to save the model
         self.model_path = os.path.join(self.args.save_dir, self.args.exp_dir)
         self.csv = CsvCreator()
@@ -233,11 +235,17 @@ class ddpg_agent_rrc:
                     # store the episodes
                     self.buffer.store_episode([mb_obs, mb_ag, mb_g, mb_actions])
                     self._update_normalizer([mb_obs, mb_ag, mb_g, mb_actions])
-                    for _ in range(self.args.n_batches):
-                        # train the network
-                        a_loss, q_loss = self._update_network()
-                        actor_loss += [a_loss]
-                        critic_loss += [q_loss]
+                    if self.args.fused_updates:
+                        # train the network on all minibatches of the cycle prefetched at once
+                        a_losses, q_losses = self._update_network_fused(self.args.n_batches)
+                        actor_loss += a_losses
+                        critic_loss += q_losses
+                    else:
+                        for _ in range(self.args.n_batches):
+                            # train the network
+                            a_loss, q_loss = self._update_network()
+                            actor_loss += [a_loss]
+                            critic_loss += [q_loss]
                     # soft update
                     self._soft_update_target_network(self.actor_target_network, self.actor_network)
                     self._soft_update_target_network(self.critic_target_network, self.critic_network)
@@ -294,19 +302,13 @@ class ddpg_agent_rrc:
     # update the normalizer
     def _update_normalizer(self, episode_batch):
         mb_obs, mb_ag, mb_g, mb_actions = episode_batch
-        mb_obs_next = mb_obs[:, 1:, :]
-        mb_ag_next = mb_ag[:, 1:, :]
-        mb_g_next = mb_g[:, 1:, :]
         # get the number of normalization transitions
         num_transitions = mb_actions.shape[1] # Only using one rollout????
         # create the new buffer to store them
         buffer_temp = {'obs': mb_obs, 
                        'ag': mb_ag,
-                       'g': mb_g[:, :-1, :], 
+                       'g': mb_g, 
                        'actions': mb_actions, 
-                       'obs_next': mb_obs_next,
-                       'ag_next': mb_ag_next,
-                        'g_next': mb_g_next
                        }
         transitions = self.her_module.sample_her_transitions(buffer_temp, num_transitions,self.epoch)
         obs, g = transitions['obs'], transitions['g']
@@ -326,8 +328,11 @@ class ddpg_agent_rrc:
 
     # soft update
     def _soft_update_target_network(self, target, source):
-        for target_param, param in zip(target.parameters(), source.parameters()):
-            target_param.data.copy_((1 - self.args.polyak) * param.data + self.args.polyak * target_param.data)
+        target_params = [param.data for param in target.parameters()]
+        source_params = [param.data for param in source.parameters()]
+        # target = polyak * target + (1 - polyak) * source, in place for all params at once
+        torch._foreach_mul_(target_params, self.args.polyak)
+        torch._foreach_add_(target_params, source_params, alpha=1 - self.args.polyak)
 
     # update the network
     def _update_network(self):
@@ -356,6 +361,53 @@ class ddpg_agent_rrc:
             inputs_next_norm_tensor = inputs_next_norm_tensor.cuda()
             actions_tensor = actions_tensor.cuda()
             r_tensor = r_tensor.cuda()
+        actor_loss, critic_loss = self._update_step(inputs_norm_tensor, inputs_next_norm_tensor, actions_tensor, r_tensor)
+        return actor_loss.numpy(), critic_loss.numpy()
+
+    def _update_network_fused(self, n_batches):
+        """
+        do n_batches updates on minibatches which are sampled and pre-processed at once
+
+        the gradients of the actor and the critic are synced in one allreduce per update
+
+        """
+        inputs_norm, inputs_next_norm, actions, r = self._prefetch_batches(n_batches)
+        actor_losses, critic_losses = [], []
+        for k in range(n_batches):
+            actor_loss, critic_loss = self._update_step(inputs_norm[k], inputs_next_norm[k], actions[k], r[k], fused_sync=True)
+            actor_losses.append(actor_loss)
+            critic_losses.append(critic_loss)
+        return list(torch.stack(actor_losses).cpu().numpy()), list(torch.stack(critic_losses).cpu().numpy())
+
+    def _prefetch_batches(self, n_batches):
+        """
+        sample and pre-process n_batches minibatches into tensors of shape [n_batches, batch_size, ...]
+
+        the (pinned, if using gpu) cpu tensors are reused by the following calls
+
+        """
+        transitions = self.buffer.sample(self.args.batch_size, self.epoch, n_batches)
+        if self.args.reward_type == "po_z" or self.args.reward_type == "p_o_z":
+            transitions['r'] += self.get_z_reward(transitions['obs'], transitions['g'])
+        o, g = self._preproc_og(transitions['obs'], transitions['g'])
+        o_next, g_next = self._preproc_og(transitions['obs_next'], transitions['g_next'])
+        shape = (n_batches, self.args.batch_size)
+        if self._batch_tensors is None or self._batch_tensors[0].shape[:2] != shape:
+            sizes = [self.env_params['obs'] + self.env_params['goal']] * 2 + [self.env_params['action'], 1]
+            self._batch_tensors = [torch.empty(shape + (size,), dtype=torch.float32, pin_memory=self.args.cuda) for size in sizes]
+        inputs_norm, inputs_next_norm, actions, r = (tensor.numpy() for tensor in self._batch_tensors)
+        obs_dim = self.env_params['obs']
+        inputs_norm[..., :obs_dim] = self.o_norm.normalize(o)
+        inputs_norm[..., obs_dim:] = self.g_norm.normalize(g)
+        inputs_next_norm[..., :obs_dim] = self.o_norm.normalize(o_next)
+        inputs_next_norm[..., obs_dim:] = self.g_norm.normalize(g_next)
+        actions[...] = transitions['actions']
+        r[...] = transitions['r']
+        if self.args.cuda:
+            return [tensor.cuda(non_blocking=True) for tensor in self._batch_tensors]
+        return self._batch_tensors
+
+    def _update_step(self, inputs_norm_tensor, inputs_next_norm_tensor, actions_tensor, r_tensor, fused_sync=False):
         # calculate the target Q value function
         with torch.no_grad():
             # do the normalization
@@ -379,18 +431,29 @@ class ddpg_agent_rrc:
         actions_real = self.actor_network(inputs_norm_tensor)
         actor_loss = -self.critic_network(inputs_norm_tensor, actions_real).mean()
         actor_loss += self.args.action_l2 * (actions_real / self.env_params['action_max']).pow(2).mean()
-        # start to update the network
-        self.actor_optim.zero_grad()
-        actor_loss.backward()
-        sync_grads(self.actor_network)
-        self.actor_optim.step()
-        # update the critic_network
-        self.critic_optim.zero_grad()
-        critic_loss.backward()
-        sync_grads(self.critic_network)
-        self.critic_optim.step()
-        
-        return actor_loss.detach().numpy(), critic_loss.detach().numpy()
+        if fused_sync:
+            # the critic loss does not depend on the actor, so both networks can be updated
+            # from the same gradients with a single sync
+            self.actor_optim.zero_grad()
+            actor_loss.backward()
+            self.critic_optim.zero_grad()
+            critic_loss.backward()
+            sync_grads(self.actor_network, self.critic_network)
+            self.actor_optim.step()
+            self.critic_optim.step()
+        else:
+            # start to update the network
+            self.actor_optim.zero_grad()
+            actor_loss.backward()
+            sync_grads(self.actor_network)
+            self.actor_optim.step()
+            # update the critic_network
+            self.critic_optim.zero_grad()
+            critic_loss.backward()
+            sync_grads(self.critic_network)
+            self.critic_optim.step()
+
+        return actor_loss.detach(), critic_loss.detach()
     
     def get_z_reward(self, obs, g):
         obs = np.expand_dims(obs[...,self.env.z_pos], axis=-1)
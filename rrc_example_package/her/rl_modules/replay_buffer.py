@@ -37,18 +37,13 @@ class replay_buffer:
             self.n_transitions_stored += self.T * batch_size
     
     # sample the data from the replay buffer
-    def sample(self, batch_size, epoch):
+    def sample(self, batch_size, epoch, n_batches=None):
         temp_buffers = {}
         with self.lock:
             for key in self.buffers.keys():
                 temp_buffers[key] = self.buffers[key][:self.current_size]
-        temp_all_g = temp_buffers['g'].copy()
-        temp_buffers['g'] = temp_all_g[:, :-1, :]
-        temp_buffers['obs_next'] = temp_buffers['obs'][:, 1:, :]
-        temp_buffers['ag_next'] = temp_buffers['ag'][:, 1:, :]
-        temp_buffers['g_next'] = temp_all_g[:, 1:, :]
-        # sample transitions
-        transitions = self.sample_func(temp_buffers, batch_size, epoch)
+        # sample transitions (n_batches minibatches at once if given)
+        transitions = self.sample_func(temp_buffers, batch_size, epoch, n_batches)
         return transitions
 
     def _get_storage_idx(self, inc=None):
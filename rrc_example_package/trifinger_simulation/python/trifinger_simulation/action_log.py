@@ -0,0 +1,495 @@
+"""Chunked, columnar action logs and a streaming replay verifier.
+
+The default action log written by
+:meth:`trifinger_simulation.TriFingerPlatform.store_action_log` is one big
+pickled dictionary with a list of per-step entries.  Replaying it requires
+loading the whole log into memory and comparing every step field by field.
+
+This module provides an alternative format in which the steps are stored in
+chunks of fixed size.  Each chunk is a dictionary of NumPy arrays (one
+"column" per logged field), so a reader can process the log incrementally and
+compare whole chunks at once.
+
+The file starts with the bytes :data:`MAGIC` followed by the format version
+(two bytes, little endian), then a sequence of pickled records
+``(kind, payload)``:
+
+- ``("header", dict)``:  Initial robot position, initial object pose and
+  the list of columns.  Always the first record.
+- ``("chunk", dict)``:  Maps column names to arrays with one row per step.
+- ``("final", dict)``:  Final object pose (if the object is tracked).
+
+Use :func:`is_chunked_action_log` to distinguish it from the legacy format.
+"""
+import copy
+import multiprocessing
+import pickle
+import struct
+import typing
+
+import numpy as np
+
+
+#: Identifier at the start of the file (not a valid start of a pickle).
+MAGIC = b"\x93TFACTIONLOG"
+#: Version of the chunked log format.
+FORMAT_VERSION = 1
+_VERSION_FORMAT = "<H"
+
+#: Default number of steps per chunk.
+DEFAULT_CHUNK_SIZE = 1000
+
+#: Columns describing the applied action.
+ACTION_COLUMNS = (
+    "action_torque",
+    "action_position",
+    "action_position_kp",
+    "action_position_kd",
+)
+#: Columns that are compared during replay.
+ROBOT_COLUMNS = ("robot_position", "robot_velocity", "robot_torque")
+#: Object columns, only present if the object pose is logged.
+OBJECT_COLUMNS = ("object_position", "object_orientation")
+
+_COLUMN_DESCRIPTIONS = {
+    "robot_position": "robot position",
+    "robot_velocity": "robot velocity",
+    "robot_torque": "robot torque",
+    "object_position": "object position",
+    "object_orientation": "object orientation",
+}
+
+
+class ReplayDivergence(AssertionError):
+    """Raised when a replayed step does not match the logged one.
+
+    Derived from :class:`AssertionError`, so existing callers that catch the
+    errors of ``np.testing.assert_array_equal`` keep working.
+    """
+
+    def __init__(self, t, column, expected, actual):
+        super().__init__(
+            "Step %d: Recorded %s does not match with the one achieved by the"
+            " replay.\n  recorded: %s\n  replay:   %s"
+            % (t, _COLUMN_DESCRIPTIONS.get(column, column), expected, actual)
+        )
+        #: int: Time index of the first diverging step.
+        self.t = t
+        #: str: Name of the first diverging column.
+        self.column = column
+        self.expected = expected
+        self.actual = actual
+
+    def __reduce__(self):
+        # needed to pass the exception between processes
+        return (
+            type(self),
+            (self.t, self.column, self.expected, self.actual),
+        )
+
+
+class ActionLogWriter:
+    """Write an action log in the chunked format.
+
+    Steps are written into preallocated column buffers which are dumped to
+    the file whenever ``chunk_size`` steps are collected, so memory usage
+    does not grow with the length of the episode.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        initial_robot_position,
+        initial_object_pose=None,
+        log_object_pose: bool = True,
+        n_joints: int = 9,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        """Initialize.
+
+        Args:
+            filename:  Path to the output file.  Existing files are
+                overwritten.
+            initial_robot_position:  Initial joint positions of the robot.
+            initial_object_pose:  Initial pose of the object (any object with
+                attributes ``position`` and ``orientation``).
+            log_object_pose:  Whether object poses are logged for each step.
+            n_joints:  Number of joints of the robot.
+            chunk_size:  Number of steps per chunk.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive.")
+
+        self._chunk_size = chunk_size
+        self._n = 0
+
+        shapes = {"t": ()}
+        for name in ACTION_COLUMNS + ROBOT_COLUMNS:
+            shapes[name] = (n_joints,)
+        if log_object_pose:
+            shapes["object_position"] = (3,)
+            shapes["object_orientation"] = (4,)
+
+        self._buffers = {
+            name: np.empty(
+                (chunk_size,) + shape,
+                dtype=np.int64 if name == "t" else np.float64,
+            )
+            for name, shape in shapes.items()
+        }
+        self._log_object_pose = log_object_pose
+
+        self._fh = open(filename, "wb")
+        self._fh.write(MAGIC + struct.pack(_VERSION_FORMAT, FORMAT_VERSION))
+        self._dump(
+            "header",
+            {
+                "initial_robot_position": np.array(initial_robot_position),
+                "initial_object_pose": copy.copy(initial_object_pose),
+                "columns": list(shapes.keys()),
+            },
+        )
+
+    def _dump(self, kind, payload):
+        pickle.dump((kind, payload), self._fh, pickle.HIGHEST_PROTOCOL)
+
+    def append(self, t: int, action, robot_observation, object_pose=None):
+        """Add one step to the log.
+
+        Args:
+            t:  Time index of the step.
+            action:  The applied :class:`~trifinger_simulation.Action`.
+            robot_observation:  Robot observation of step t.
+            object_pose:  Object pose of step t.  Required if the writer was
+                created with ``log_object_pose=True``.
+        """
+        i = self._n
+        buffers = self._buffers
+
+        buffers["t"][i] = t
+        buffers["action_torque"][i] = action.torque
+        buffers["action_position"][i] = action.position
+        buffers["action_position_kp"][i] = action.position_kp
+        buffers["action_position_kd"][i] = action.position_kd
+        buffers["robot_position"][i] = robot_observation.position
+        buffers["robot_velocity"][i] = robot_observation.velocity
+        buffers["robot_torque"][i] = robot_observation.torque
+        if self._log_object_pose:
+            buffers["object_position"][i] = object_pose.position
+            buffers["object_orientation"][i] = object_pose.orientation
+
+        self._n += 1
+        if self._n == self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the currently buffered steps as one chunk."""
+        if self._n == 0:
+            return
+        chunk = {
+            name: buf[: self._n].copy() for name, buf in self._buffers.items()
+        }
+        self._dump("chunk", chunk)
+        self._n = 0
+
+    def close(self, final_object_pose=None, t: int = None):
+        """Flush remaining steps, write the final pose and close the file.
+
+        Args:
+            final_object_pose:  Final pose of the object (optional).
+            t:  Time index at which the final pose was observed.
+        """
+        if self._fh.closed:
+            return
+        self.flush()
+        if final_object_pose is not None:
+            self._dump(
+                "final", {"t": t, "pose": copy.copy(final_object_pose)}
+            )
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ActionLogReader:
+    """Incrementally read an action log in the chunked format."""
+
+    def __init__(self, filename: str):
+        """Open the log and read its header.
+
+        Args:
+            filename:  Path to the log file.
+
+        Raises:
+            ValueError:  If the file is not a chunked action log or has an
+                unsupported version.
+        """
+        self._fh = open(filename, "rb")
+        try:
+            header = self._read_header(filename)
+        except Exception:
+            self._fh.close()
+            raise
+
+        #: Initial joint positions of the robot.
+        self.initial_robot_position = header["initial_robot_position"]
+        #: Initial pose of the object.
+        self.initial_object_pose = header["initial_object_pose"]
+        #: Names of the logged columns.
+        self.columns = header["columns"]
+        #: Whether object poses are logged.
+        self.has_object_pose = "object_position" in self.columns
+        #: Final object pose record (``{"t": ..., "pose": ...}``).  Only set
+        #: after :meth:`chunks` has been fully consumed.
+        self.final_object_pose = None
+
+    def _read_header(self, filename):
+        version = _read_version(self._fh)
+        if version is None:
+            raise ValueError("%s is not a chunked action log." % filename)
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                "%s has unsupported chunked action log version %d."
+                % (filename, version)
+            )
+        try:
+            kind, header = pickle.load(self._fh)
+        except Exception as e:
+            raise ValueError(
+                "Failed to read the header of %s: %s" % (filename, e)
+            ) from e
+        if kind != "header":
+            raise ValueError("%s has no header record." % filename)
+        return header
+
+    def chunks(self) -> typing.Iterator[typing.Dict[str, np.ndarray]]:
+        """Iterate over the chunks of the log.
+
+        Only one chunk is kept in memory at a time.
+        """
+        while True:
+            try:
+                kind, payload = pickle.load(self._fh)
+            except EOFError:
+                break
+            if kind == "chunk":
+                yield payload
+            elif kind == "final":
+                self.final_object_pose = payload
+        self._fh.close()
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_version(fh) -> typing.Optional[int]:
+    """Read magic and version of a chunked log (None if not chunked)."""
+    size = len(MAGIC) + struct.calcsize(_VERSION_FORMAT)
+    prefix = fh.read(size)
+    if len(prefix) < size or not prefix.startswith(MAGIC):
+        return None
+    return struct.unpack(_VERSION_FORMAT, prefix[len(MAGIC) :])[0]
+
+
+def is_chunked_action_log(filename: str) -> bool:
+    """Check if the given file is an action log in the chunked format.
+
+    Only the first bytes of the file are read.
+    """
+    with open(filename, "rb") as fh:
+        return _read_version(fh) is not None
+
+
+def write_chunked_action_log(
+    log: dict, filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+):
+    """Write an action log dictionary in the chunked format.
+
+    Args:
+        log:  Action log as stored by
+            :meth:`~trifinger_simulation.TriFingerPlatform.store_action_log`.
+        filename:  Path to which the chunked log is written.
+        chunk_size:  Number of steps per chunk.
+    """
+    actions = log["actions"]
+    log_object_pose = bool(actions) and "object_pose" in actions[0]
+
+    writer = ActionLogWriter(
+        filename,
+        log["initial_robot_position"],
+        log.get("initial_object_pose"),
+        log_object_pose=log_object_pose,
+        n_joints=len(log["initial_robot_position"]),
+        chunk_size=chunk_size,
+    )
+    for entry in actions:
+        writer.append(
+            entry["t"],
+            entry["action"],
+            entry["robot_observation"],
+            entry.get("object_pose"),
+        )
+
+    final = log.get("final_object_pose")
+    if final is not None:
+        writer.close(final["pose"], final["t"])
+    else:
+        writer.close()
+
+
+def convert_action_log(
+    legacy_logfile: str, output_file: str, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """Convert a log written by ``store_action_log`` to the chunked format.
+
+    Args:
+        legacy_logfile:  Path to the pickled legacy log.
+        output_file:  Path to which the chunked log is written.
+        chunk_size:  Number of steps per chunk.
+    """
+    with open(legacy_logfile, "rb") as fh:
+        log = pickle.load(fh)
+
+    write_chunked_action_log(log, output_file, chunk_size)
+
+
+def _first_divergence(expected, actual):
+    """Return index of the first row in which the arrays differ (or None)."""
+    # array_equal is a single vectorized pass, only search on failure
+    if np.array_equal(expected, actual):
+        return None
+    mismatch = expected != actual
+    if mismatch.ndim > 1:
+        mismatch = mismatch.reshape(len(mismatch), -1).any(axis=1)
+    return int(np.flatnonzero(mismatch)[0])
+
+
+def verify_replay(
+    reader: ActionLogReader,
+    platform,
+    reward_fn: typing.Callable[[int, np.ndarray], float] = None,
+) -> typing.Tuple[float, int]:
+    """Replay the actions of a chunked log and verify the resulting states.
+
+    For each chunk, the actions are applied to the platform and the resulting
+    observations are written into preallocated arrays.  These are then
+    compared to the logged columns with one vectorized equality check per
+    column.
+
+    Args:
+        reader:  Reader of the chunked action log.
+        platform:  The :class:`~trifinger_simulation.TriFingerPlatform`,
+            initialized to the same state as during logging.
+        reward_fn:  Optional function ``reward_fn(t, object_position)``
+            returning the reward of a step.  The rewards of all steps are
+            summed up.
+
+    Returns:
+        Tuple ``(accumulated_reward, n_steps)``.
+
+    Raises:
+        ReplayDivergence:  At the first step where the replay does not match
+            the log.
+    """
+    Action = platform.Action
+    check_object = reader.has_object_pose
+    replay = None
+    accumulated_reward = 0
+    n_steps = 0
+
+    for chunk in reader.chunks():
+        n = len(chunk["t"])
+        if replay is None or len(replay["t"]) < n:
+            replay = {
+                name: np.empty_like(chunk[name])
+                for name in ("t",) + ROBOT_COLUMNS + OBJECT_COLUMNS
+                if name in chunk
+            }
+
+        torques = chunk["action_torque"]
+        positions = chunk["action_position"]
+        kps = chunk["action_position_kp"]
+        kds = chunk["action_position_kd"]
+        for i in range(n):
+            action = Action(torque=torques[i], position=positions[i])
+            action.position_kp = kps[i]
+            action.position_kd = kds[i]
+
+            t = platform.append_desired_action(action)
+
+            robot_obs = platform.get_robot_observation(t)
+            replay["t"][i] = t
+            replay["robot_position"][i] = robot_obs.position
+            replay["robot_velocity"][i] = robot_obs.velocity
+            replay["robot_torque"][i] = robot_obs.torque
+
+            if check_object or reward_fn is not None:
+                cube_pose = platform.get_camera_observation(
+                    t
+                ).filtered_object_pose
+                if check_object:
+                    replay["object_position"][i] = cube_pose.position
+                    replay["object_orientation"][i] = cube_pose.orientation
+                if reward_fn is not None:
+                    accumulated_reward += reward_fn(t, cube_pose.position)
+
+        # report the earliest diverging step over all columns
+        divergence = None
+        for name in replay:
+            i = _first_divergence(chunk[name], replay[name][:n])
+            if i is not None and (divergence is None or i < divergence[0]):
+                divergence = (i, name)
+        if divergence is not None:
+            i, name = divergence
+            raise ReplayDivergence(
+                int(chunk["t"][i]), name, chunk[name][i], replay[name][i]
+            )
+
+        n_steps += n
+
+    return accumulated_reward, n_steps
+
+
+def map_parallel(
+    function: typing.Callable,
+    args_list: typing.Sequence[tuple],
+    n_processes: int = None,
+) -> list:
+    """Call ``function(*args)`` for each entry of ``args_list`` in parallel.
+
+    Each call runs in a separate worker process, so every worker has its own
+    pybullet client.  Exceptions are not raised but returned in place of the
+    result, so a single failing log does not abort the others.
+
+    Args:
+        function:  Module-level (i.e. picklable) function.
+        args_list:  List of argument tuples.
+        n_processes:  Number of worker processes.  Defaults to the number of
+            CPUs.
+
+    Returns:
+        List with the result (or exception) of each call, in the order of
+        ``args_list``.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(n_processes, maxtasksperchild=1) as pool:
+        return pool.starmap(_call_catching, [(function, a) for a in args_list])
+
+
+def _call_catching(function, args):
+    try:
+        return function(*args)
+    except (Exception, SystemExit) as e:
+        # SystemExit is caught as well, as it would otherwise terminate the
+        # worker process
+        return e
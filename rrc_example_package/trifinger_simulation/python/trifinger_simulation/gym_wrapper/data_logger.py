@@ -1,4 +1,37 @@
+"""Logging of the episodes of the gym environments.
+
+Each step of an episode is written into preallocated column arrays with a
+fixed dtype (joint positions, tip positions and timestamps), which grow by
+doubling their capacity when full.
+
+By default the completed episodes are kept in memory and can be pickled with
+:meth:`DataLogger.store`.  If the logger is given a file name, completed
+episodes are instead appended to that file by a background thread and
+dropped from memory, so memory usage stays bounded for long experiments.
+
+The episode file is a plain sequence of NumPy ``.npy`` records (see
+:mod:`numpy.lib.format`), five per episode in the order of
+:data:`EPISODE_FIELDS`.  It can be appended to and is read lazily with
+:class:`EpisodeFile`.
+"""
 import pickle
+import queue
+import threading
+
+import numpy as np
+
+
+#: Fields of an episode (in the order in which they are written to file).
+EPISODE_FIELDS = (
+    "joint_goal",
+    "tip_goal",
+    "joint_positions",
+    "tip_positions",
+    "timestamps",
+)
+
+#: Initial number of steps for which the column arrays are allocated.
+INITIAL_CAPACITY = 1024
 
 
 class EpisodeData:
@@ -7,38 +40,243 @@ class EpisodeData:
     will be logged.
     """
 
-    def __init__(self, joint_goal, tip_goal):
-        self.joint_goal = joint_goal
-        self.tip_goal = tip_goal
-        self.joint_positions = []
-        self.tip_positions = []
-        self.timestamps = []
+    def __init__(self, joint_goal, tip_goal, capacity=INITIAL_CAPACITY):
+        self.joint_goal = np.asarray(joint_goal, dtype=np.float64)
+        self.tip_goal = np.asarray(tip_goal, dtype=np.float64)
+        self._capacity = capacity
+        self._n = 0
+        # allocated with the first step (the sizes are not known before)
+        self._joint_positions = None
+        self._tip_positions = None
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def joint_positions(self):
+        if self._joint_positions is None:
+            return np.empty((0, 0))
+        return self._joint_positions[: self._n]
+
+    @property
+    def tip_positions(self):
+        if self._tip_positions is None:
+            return np.empty((0, 0))
+        return self._tip_positions[: self._n]
+
+    @property
+    def timestamps(self):
+        return self._timestamps[: self._n]
 
     def append(self, joint_pos, tip_pos, timestamp):
-        self.joint_positions.append(joint_pos)
-        self.tip_positions.append(tip_pos)
-        self.timestamps.append(timestamp)
+        if self._joint_positions is None:
+            self._joint_positions = np.empty(
+                (self._capacity, np.size(joint_pos)), dtype=np.float64
+            )
+            self._tip_positions = np.empty(
+                (self._capacity, np.size(tip_pos)), dtype=np.float64
+            )
+        elif self._n == self._capacity:
+            self._grow()
+
+        self._joint_positions[self._n] = np.ravel(joint_pos)
+        self._tip_positions[self._n] = np.ravel(tip_pos)
+        self._timestamps[self._n] = timestamp
+        self._n += 1
+
+    def _grow(self):
+        self._capacity *= 2
+        for name in ("_joint_positions", "_tip_positions", "_timestamps"):
+            old = getattr(self, name)
+            new = np.empty((self._capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self._n] = old[: self._n]
+            setattr(self, name, new)
+
+    def to_dict(self):
+        """Get the episode as dictionary of arrays (trimmed to its length)."""
+        return {name: np.array(getattr(self, name)) for name in EPISODE_FIELDS}
 
 
 class DataLogger:
     """
-    Dumps the env episodic data to a pickle file
+    Logs the env episodic data, either in memory (to be pickled with
+    :meth:`store`) or to an episode file (see :class:`EpisodeFile`).
     """
 
-    def __init__(self):
+    def __init__(self, filename=None, max_queued_episodes=8):
+        """Initialize.
+
+        Args:
+            filename (str):  If set, completed episodes are appended to this
+                file on a background thread instead of being kept in memory.
+                Call :meth:`close` at the end to write the last episode.
+            max_queued_episodes (int):  Maximum number of completed episodes
+                waiting to be written.  If the writer falls behind,
+                :meth:`new_episode` blocks.
+        """
         self.episodes = []
         self._curr = None
+        self.filename = filename
+        self._writer = None
+        if filename is not None:
+            self._writer = _EpisodeWriter(filename, max_queued_episodes)
 
     def new_episode(self, joint_goal, tip_goal):
-        if self._curr:
-            # convert to dict for saving so loading has no dependencies
-            self.episodes.append(self._curr.__dict__)
-
+        self._finish_episode()
         self._curr = EpisodeData(joint_goal, tip_goal)
 
+    def _finish_episode(self):
+        if self._curr is not None:
+            # convert to dict for saving so loading has no dependencies
+            if self._writer is not None:
+                self._writer.put(self._curr.to_dict())
+            else:
+                self.episodes.append(self._curr.to_dict())
+        self._curr = None
+
     def append(self, joint_pos, tip_pos, timestamp):
         self._curr.append(joint_pos, tip_pos, timestamp)
 
     def store(self, filename):
+        """Pickle the completed episodes kept in memory to the given file."""
+        if self._writer is not None:
+            raise RuntimeError(
+                "Episodes are written to %s, use close() instead."
+                % self.filename
+            )
         with open(filename, "wb") as file_handle:
             pickle.dump(self.episodes, file_handle)
+
+    def close(self):
+        """Write the current episode and wait until all are written."""
+        if self._writer is not None:
+            self._finish_episode()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _EpisodeWriter:
+    """Appends episodes to an episode file on a background thread."""
+
+    def __init__(self, filename, max_queued_episodes):
+        self._queue = queue.Queue(maxsize=max_queued_episodes)
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(filename,), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, filename):
+        try:
+            with open(filename, "ab") as fh:
+                while True:
+                    episode = self._queue.get()
+                    if episode is None:
+                        break
+                    for name in EPISODE_FIELDS:
+                        np.lib.format.write_array(
+                            fh, episode[name], allow_pickle=False
+                        )
+                    fh.flush()
+        except Exception as e:
+            self._error = e
+            # unblock producers waiting for the queue
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError(
+                "Failed to write episodes: %s" % self._error
+            ) from self._error
+
+    def put(self, episode):
+        self._raise_error()
+        self._queue.put(episode)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+
+class EpisodeFile:
+    """Lazy reader for the episode files written by :class:`DataLogger`.
+
+    Opening the file only reads the record headers.  The data of an episode
+    is memory-mapped when the episode is accessed.
+
+    Example:
+
+    .. code-block:: Python
+
+        episodes = EpisodeFile("episodes.npy")
+        for episode in episodes:
+            print(episode["timestamps"][-1] - episode["timestamps"][0])
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._records = []
+        with open(filename, "rb") as fh:
+            while fh.read(1):
+                fh.seek(-1, 1)
+                version = np.lib.format.read_magic(fh)
+                if version == (1, 0):
+                    header = np.lib.format.read_array_header_1_0(fh)
+                else:
+                    header = np.lib.format.read_array_header_2_0(fh)
+                shape, fortran_order, dtype = header
+                offset = fh.tell()
+                self._records.append((shape, fortran_order, dtype, offset))
+                fh.seek(int(np.prod(shape)) * dtype.itemsize, 1)
+
+        if len(self._records) % len(EPISODE_FIELDS):
+            raise ValueError(
+                "%s does not contain complete episodes (the writing process"
+                " may have been killed)." % filename
+            )
+
+    def __len__(self):
+        return len(self._records) // len(EPISODE_FIELDS)
+
+    def __getitem__(self, index):
+        """Get the episode as dictionary of (read-only) arrays."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("episode index out of range")
+
+        n_fields = len(EPISODE_FIELDS)
+        records = self._records[index * n_fields : (index + 1) * n_fields]
+        return {
+            name: self._load(*record)
+            for name, record in zip(EPISODE_FIELDS, records)
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _load(self, shape, fortran_order, dtype, offset):
+        if np.prod(shape) == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(
+            self.filename,
+            dtype=dtype,
+            mode="r",
+            offset=offset,
+            shape=shape,
+            order="F" if fortran_order else "C",
+        )
@@ -25,6 +25,7 @@ class TriFingerPush(gym.Env):
         control_rate_s,
         finger_type,
         enable_visualization,
+        log_filename=None,
     ):
         """Intializes the constituents of the pushing environment.
 
@@ -44,6 +45,10 @@ class TriFingerPush(gym.Env):
                 :meth:`.finger_types_data.get_valid_finger_types`
             enable_visualization (bool): if the simulation env is to be
                 visualized
+            log_filename (str): If set, the logged episodes are appended to
+                this file (see :class:`.data_logger.EpisodeFile`) instead of
+                being kept in memory.  Call :meth:`close` at the end, so
+                that the last episodes are written.
         """
 
         #: an instance of the simulated robot depending on the desired
@@ -107,7 +112,7 @@ class TriFingerPush(gym.Env):
         self.action_space = self.spaces.get_scaled_action_space()
 
         #: a logger to enable logging of observations if desired
-        self.logger = DataLogger()
+        self.logger = DataLogger(log_filename)
 
         #: the object that has to be pushed
         self.block = collision_objects.Block()
@@ -268,3 +273,7 @@ class TriFingerPush(gym.Env):
             self._get_state(observation, action, True),
             self.unscaled_observation_space,
         )
+
+    def close(self):
+        """Write the remaining logged episodes to the log file (if any)."""
+        self.logger.close()
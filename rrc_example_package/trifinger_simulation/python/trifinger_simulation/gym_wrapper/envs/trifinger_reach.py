@@ -27,6 +27,7 @@ class TriFingerReach(gym.Env):
         use_real_robot=False,
         finger_config_suffix="0",
         synchronize=False,
+        log_filename=None,
     ):
         """Intializes the constituents of the reaching environment.
 
@@ -66,6 +67,10 @@ class TriFingerReach(gym.Env):
             synchronize (bool): Set this to True if you want to train
                 independently on three fingers in separate processes, but
                 have them synchronized. ([default] False)
+            log_filename (str): If set, the logged episodes are appended to
+                this file (see :class:`.data_logger.EpisodeFile`) instead of
+                being kept in memory.  Call :meth:`close` at the end, so
+                that the last episodes are written.
         """
         #: an instance of a simulated, or a real robot depending on
         #: what is desired.
@@ -135,7 +140,7 @@ class TriFingerReach(gym.Env):
         self.action_space = self.spaces.get_scaled_action_space()
 
         #: a logger to enable logging of observations if desired
-        self.logger = DataLogger()
+        self.logger = DataLogger(log_filename)
 
         # sets up smooothing
         if "is_test" in smoothing_params:
@@ -366,6 +371,10 @@ class TriFingerReach(gym.Env):
             self.unscaled_observation_space,
         )
 
+    def close(self):
+        """Write the remaining logged episodes to the log file (if any)."""
+        self.logger.close()
+
     def update_smoothing(self):
         """
         Update the smoothing coefficient with which the action to be
@@ -95,6 +95,16 @@ class SimFinger:
         )
         self.__setup_pybullet_simulation(robot_position_offset)
 
+        # preallocated arrays for the state read once per simulation tick
+        # (see _read_state())
+        number_of_joints = len(self.pybullet_joint_indices)
+        self._state_position = np.zeros(number_of_joints)
+        self._state_velocity = np.zeros(number_of_joints)
+        self._state_tip_force = np.zeros(len(self.pybullet_tip_link_indices))
+        self._tip_link_to_index = {
+            link: i for i, link in enumerate(self.pybullet_tip_link_indices)
+        }
+
         self.kinematics = pinocchio_utils.Kinematics(
             self.finger_urdf_path, self.tip_link_names
         )
@@ -184,10 +194,13 @@ class SimFinger:
             copy.copy(action.position),
         )
 
-        self._applied_action_t = self._set_desired_action(action)
+        # read the state once and use it for both the control and the
+        # observation (setting the motor torques does not change it)
+        state = self._read_state()
+        self._applied_action_t = self._set_desired_action(action, state)
 
         # save current observation, then step simulation
-        self._observation_t = self._get_latest_observation()
+        self._observation_t = self._get_latest_observation(state)
         self._step_simulation()
 
         self._t += 1
@@ -292,26 +305,61 @@ class SimFinger:
             )
         return self._get_latest_observation()
 
-    def _get_latest_observation(self):
-        """Get observation of the current state.
+    def _read_state(self):
+        """Read joint states and fingertip contact forces of the current tick.
+
+        Uses one query for all joints and one for all contacts of the robot
+        and writes the results to preallocated arrays.
 
         Returns:
-            observation (Observation): the joint positions, velocities, and
-            torques of the joints.
+            tuple: (joint positions, joint velocities, tip contact forces).
+            The arrays are overwritten by the next call, so copy them if they
+            need to be kept.
         """
-        observation = Observation()
         current_joint_states = pybullet.getJointStates(
             self.finger_id,
             self.pybullet_joint_indices,
             physicsClientId=self._pybullet_client_id,
         )
-
-        observation.position = np.array(
-            [joint[0] for joint in current_joint_states]
-        )
-        observation.velocity = np.array(
-            [joint[1] for joint in current_joint_states]
+        self._state_position[:] = [joint[0] for joint in current_joint_states]
+        self._state_velocity[:] = [joint[1] for joint in current_joint_states]
+
+        # contacts are reported with the link of the finger as link A, so
+        # filtering them by link here is equivalent to one query per tip
+        self._state_tip_force[:] = 0.0
+        for contact_point in pybullet.getContactPoints(
+            bodyA=self.finger_id,
+            physicsClientId=self._pybullet_client_id,
+        ):
+            tip = self._tip_link_to_index.get(contact_point[3])
+            if tip is not None:
+                self._state_tip_force[tip] += contact_point[9]
+
+        return (
+            self._state_position,
+            self._state_velocity,
+            self._state_tip_force,
         )
+
+    def _get_latest_observation(self, state=None):
+        """Get observation of the current state.
+
+        Args:
+            state: State of the current tick as returned by
+                :meth:`_read_state`.  If not set, it is read from the
+                simulation.
+
+        Returns:
+            observation (Observation): the joint positions, velocities, and
+            torques of the joints.
+        """
+        if state is None:
+            state = self._read_state()
+        position, velocity, tip_force = state
+
+        observation = Observation()
+        observation.position = position.copy()
+        observation.velocity = velocity.copy()
         # pybullet.getJointStates only contains actual joint torques in
         # POSITION_CONTROL and VELOCITY_CONTROL mode.  In TORQUE_CONTROL mode
         # only zeros are reported, the actual torque is exactly the same as the
@@ -323,41 +371,25 @@ class SimFinger:
             # self.__applied_torque does not exist), set it to zero
             observation.torque = np.zeros(len(observation.velocity))
 
-        finger_contact_states = [
-            pybullet.getContactPoints(
-                bodyA=self.finger_id,
-                linkIndexA=tip,
-                physicsClientId=self._pybullet_client_id,
-            )
-            for tip in self.pybullet_tip_link_indices
-        ]
-        tip_forces = []
-        for i in range(len(finger_contact_states)):
-            directed_contact_force = 0.0
-            try:
-                for contact_point in finger_contact_states[i]:
-                    directed_contact_force += np.array(contact_point[9])
-            except IndexError:
-                pass
-            tip_forces.append(directed_contact_force)
-        observation.tip_force = np.array(tip_forces)
-
         # The measurement of the push sensor of the real robot lies in the
         # interval [0, 1].  It does not go completely to zero, so add a bit of
         # "no contact" offset.  It saturates somewhere around 5 N.
         push_sensor_saturation_force_N = 5.0
         push_sensor_no_contact_value = 0.05
-        observation.tip_force /= push_sensor_saturation_force_N
+        observation.tip_force = tip_force / push_sensor_saturation_force_N
         observation.tip_force += push_sensor_no_contact_value
         np.clip(observation.tip_force, 0.0, 1.0, out=observation.tip_force)
 
         return observation
 
-    def _set_desired_action(self, desired_action):
+    def _set_desired_action(self, desired_action, state=None):
         """Set the given action after performing safety checks.
 
         Args:
             desired_action (Action): Joint positions or torques or both
+            state: State of the current tick as returned by
+                :meth:`_read_state`.  If not set, it is read from the
+                simulation.
 
         Returns:
             applied_action:  The action that is actually applied after
@@ -386,17 +418,23 @@ class SimFinger:
             desired_action.position_kd, self.velocity_gains
         )
 
-        torque_command = np.asarray(copy.copy(desired_action.torque))
+        if state is None:
+            state = self._read_state()
+        current_position, current_velocity, _ = state
+
+        torque_command = np.array(desired_action.torque, dtype=float)
         if not np.isnan(desired_action.position).all():
-            torque_command += np.array(
-                self.__compute_pd_control_torques(
-                    desired_action.position,
-                    applied_action.position_kp,
-                    applied_action.position_kd,
-                )
+            torque_command += self.__compute_pd_control_torques(
+                desired_action.position,
+                current_position,
+                current_velocity,
+                applied_action.position_kp,
+                applied_action.position_kd,
             )
 
-        applied_action.torque = self.__safety_check_torques(torque_command)
+        applied_action.torque = self.__safety_check_torques(
+            torque_command, current_velocity
+        )
 
         self.__set_pybullet_motor_torques(applied_action.torque)
 
@@ -434,86 +472,64 @@ class SimFinger:
             physicsClientId=self._pybullet_client_id,
         )
 
-    def __safety_check_torques(self, desired_torques):
+    def __safety_check_torques(self, desired_torques, current_velocity):
         """
         Perform a check on the torques being sent to be applied to
         the motors so that they do not exceed the safety torque limit
 
         Args:
             desired_torques (array): The torques desired to be
-                applied to the motors
+                applied to the motors.  Modified in place.
+            current_velocity (array): Current joint velocities.
 
         Returns:
             applied_torques (array): The torques that can be actually
             applied to the motors (and will be applied)
         """
         applied_torques = np.clip(
-            np.asarray(desired_torques),
+            desired_torques,
             -self.max_motor_torque,
             +self.max_motor_torque,
-        )
-
-        current_joint_states = pybullet.getJointStates(
-            self.finger_id,
-            self.pybullet_joint_indices,
-            physicsClientId=self._pybullet_client_id,
-        )
-        current_velocity = np.array(
-            [joint[1] for joint in current_joint_states]
+            out=desired_torques,
         )
         applied_torques -= self.safety_kd * current_velocity
-
-        applied_torques = np.clip(
-            np.asarray(applied_torques),
+        np.clip(
+            applied_torques,
             -self.max_motor_torque,
             +self.max_motor_torque,
+            out=applied_torques,
         )
 
         return applied_torques
 
-    def __compute_pd_control_torques(self, joint_positions, kp=None, kd=None):
+    def __compute_pd_control_torques(
+        self, joint_positions, current_position, current_velocity, kp, kd
+    ):
         """
         Compute torque command to reach given target position using a PD
         controller.
 
         Args:
             joint_positions (array-like, shape=(n,)):  Desired joint positions.
+            current_position (array, shape=(n,)):  Current joint positions.
+            current_velocity (array, shape=(n,)):  Current joint velocities.
             kp (array-like, shape=(n,)): P-gains, one for each joint.
             kd (array-like, shape=(n,)): D-gains, one for each joint.
 
         Returns:
-            List of torques to be sent to the joints of the finger in order to
+            Array of torques to be sent to the joints of the finger in order to
             reach the specified joint_positions.
         """
-        if kp is None:
-            kp = self.position_gains
-        if kd is None:
-            kd = self.velocity_gains
-
-        current_joint_states = pybullet.getJointStates(
-            self.finger_id,
-            self.pybullet_joint_indices,
-            physicsClientId=self._pybullet_client_id,
-        )
-        current_position = np.array(
-            [joint[0] for joint in current_joint_states]
-        )
-        current_velocity = np.array(
-            [joint[1] for joint in current_joint_states]
+        joint_torques = np.asarray(kp) * (
+            np.asarray(joint_positions) - current_position
         )
-
-        position_error = joint_positions - current_position
-
-        position_feedback = np.asarray(kp) * position_error
-        velocity_feedback = np.asarray(kd) * current_velocity
-
-        joint_torques = position_feedback - velocity_feedback
+        joint_torques -= np.asarray(kd) * current_velocity
 
         # set nan entries to zero (nans occur on joints for which the target
         # position was set to nan)
         joint_torques[np.isnan(joint_torques)] = 0.0
 
-        return joint_torques.tolist()
+        return joint_torques
 
     def __validate_time_index(self, t):
         """Raise error if t does not match with self._t."""
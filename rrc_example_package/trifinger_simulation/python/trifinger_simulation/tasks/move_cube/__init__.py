@@ -220,6 +220,72 @@ def sample_goal(difficulty):
     return goal
 
 
+def sample_goals(difficulty, n, random_state=None):
+    """Sample n goal poses at once.
+
+    The poses follow the same distribution as the ones of
+    :func:`sample_goal` (but a given random state does not give the same
+    poses as n calls of :func:`sample_goal`).
+
+    Args:
+        difficulty (int):  Difficulty level (see :func:`sample_goal`).
+        n (int):  Number of goals.
+        random_state (np.random.RandomState):  Random number generator.  If
+            not set, the one of this module is used.
+
+    Returns:
+        Tuple (positions, orientations) of arrays of shape (n, 3) and (n, 4).
+    """
+    if random_state is None:
+        random_state = random
+
+    def random_xy():
+        radius = _max_cube_com_distance_to_center * np.sqrt(
+            random_state.random_sample(n)
+        )
+        theta = random_state.uniform(0, 2 * np.pi, n)
+        return radius * np.cos(theta), radius * np.sin(theta)
+
+    no_orientation = np.tile([0.0, 0.0, 0.0, 1.0], (n, 1))
+
+    if difficulty == -1:
+        x, y = random_xy()
+        z = np.full(n, _CUBE_WIDTH / 2)
+        up_face = random_state.choice(len(_base_orientations), n)
+        yaw_angle = random_state.uniform(0, 2 * np.pi, n)
+        base_quats = np.array([r.as_quat() for r in _base_orientations])
+        up_face_rot = Rotation.from_quat(base_quats[up_face])
+        orientation = (
+            Rotation.from_euler("z", yaw_angle[:, None]) * up_face_rot
+        ).as_quat()
+
+    elif difficulty == 1:
+        x, y = random_xy()
+        z = np.full(n, _CUBE_WIDTH / 2)
+        orientation = no_orientation
+
+    elif difficulty == 2:
+        x = np.zeros(n)
+        y = np.zeros(n)
+        z = np.full(n, _min_height + 0.05)
+        orientation = no_orientation
+
+    elif difficulty == 3:
+        x, y = random_xy()
+        z = random_state.uniform(_min_height, _max_height, n)
+        orientation = no_orientation
+
+    elif difficulty == 4:
+        x, y = random_xy()
+        z = random_state.uniform(_cube_3d_radius, _max_height, n)
+        orientation = Rotation.random(n, random_state=random_state).as_quat()
+
+    else:
+        raise ValueError("Invalid difficulty %d" % difficulty)
+
+    return np.stack((x, y, z), axis=-1), orientation
+
+
 def validate_goal(goal):
     """Validate that the given pose is a valid goal (e.g. no collision)
 
@@ -28,6 +28,9 @@ by :data:`EPISODE_LENGTH`.
 The cost of each step is computed using :func:`evaluate_state`.
 """
 import json
+import os
+import shutil
+import tempfile
 import typing
 
 import numpy as np
@@ -82,7 +85,35 @@ def seed(seed: int):
     move_cube.seed(seed)
 
 
-def sample_goal() -> Trajectory:
+def get_goal_start_times(
+    first_goal_duration: int = None, goal_duration: int = None
+) -> typing.List[int]:
+    """Get the time steps at which the goals of a trajectory become active.
+
+    Args:
+        first_goal_duration:  Duration of the first goal.  Defaults to
+            :data:`FIRST_GOAL_DURATION`.
+        goal_duration:  Duration of the following goals.  Defaults to
+            :data:`GOAL_DURATION`.
+
+    Returns:
+        The start time steps of all goals within :data:`EPISODE_LENGTH`.
+    """
+    if first_goal_duration is None:
+        first_goal_duration = FIRST_GOAL_DURATION
+    if goal_duration is None:
+        goal_duration = GOAL_DURATION
+
+    return [0] + list(
+        range(first_goal_duration, EPISODE_LENGTH, goal_duration)
+    )
+
+
+def sample_goal(
+    difficulty: int = None,
+    first_goal_duration: int = None,
+    goal_duration: int = None,
+) -> Trajectory:
     """Sample a goal trajectory with random steps.
 
     The number of goals in the trajectory is depending on the episode length
@@ -90,22 +121,203 @@ def sample_goal() -> Trajectory:
     :data:`FIRST_GOAL_DURATION` steps, the following ones a duration of
     :data:`GOAL_DURATION`.
 
+    Args:
+        difficulty:  Difficulty of the goals.  Defaults to
+            :data:`GOAL_DIFFICULTY`.
+        first_goal_duration:  Defaults to :data:`FIRST_GOAL_DURATION`.
+        goal_duration:  Defaults to :data:`GOAL_DURATION`.
+
     Returns:
         Trajectory as a list of tuples ``(t, position)`` where ``t`` marks the
         time step from which the goal is active.
     """
-    trajectory = []
-
-    first_goal = move_cube.sample_goal(GOAL_DIFFICULTY)
-    trajectory.append((0, first_goal))
-    t = FIRST_GOAL_DURATION
-
-    while t < EPISODE_LENGTH:
-        goal = move_cube.sample_goal(GOAL_DIFFICULTY)
-        trajectory.append((t, goal))
-        t += GOAL_DURATION
-        
-    return trajectory
+    if difficulty is None:
+        difficulty = GOAL_DIFFICULTY
+
+    return [
+        (t, move_cube.sample_goal(difficulty))
+        for t in get_goal_start_times(first_goal_duration, goal_duration)
+    ]
+
+
+class GoalTrajectoryBank:
+    """A fixed set of pre-sampled goal trajectories.
+
+    Sampling a trajectory from the bank is O(1), which makes it cheap to
+    sample a new trajectory at every reset.  The goals are stored in stacked
+    arrays, which can be saved to a directory and loaded memory-mapped, so
+    that all processes of a training (e.g. the MPI workers) share one bank
+    in memory.
+
+    Example:
+
+    .. code-block:: Python
+
+        bank = GoalTrajectoryBank.load_or_generate(
+            "goals_difficulty_3", 100000, difficulty=3, seed=0
+        )
+        trajectory = bank.sample()
+    """
+
+    _INFO_FILE = "info.json"
+    _ARRAY_FILES = ("times", "positions", "orientations")
+
+    def __init__(self, times, positions, orientations, difficulty):
+        """Initialize.
+
+        Args:
+            times:  Start time steps of the goals, shape (n_goals,).
+            positions:  Goal positions, shape (size, n_goals, 3).
+            orientations:  Goal orientations, shape (size, n_goals, 4).
+            difficulty:  Difficulty with which the goals were sampled.
+        """
+        n_goals = len(times)
+        if (
+            positions.shape[1:] != (n_goals, 3)
+            or orientations.shape[1:] != (n_goals, 4)
+            or len(positions) != len(orientations)
+        ):
+            raise ValueError("Shapes of times and goals do not match")
+
+        self.times = times
+        self.positions = positions
+        self.orientations = orientations
+        self.difficulty = difficulty
+
+    @classmethod
+    def generate(
+        cls,
+        size: int,
+        difficulty: int = None,
+        first_goal_duration: int = None,
+        goal_duration: int = None,
+        seed: int = None,
+    ) -> "GoalTrajectoryBank":
+        """Sample a new bank.
+
+        Args:
+            size:  Number of trajectories.
+            difficulty:  Difficulty of the goals.  Defaults to
+                :data:`GOAL_DIFFICULTY`.
+            first_goal_duration:  Defaults to :data:`FIRST_GOAL_DURATION`.
+            goal_duration:  Defaults to :data:`GOAL_DURATION`.
+            seed:  Seed for sampling the goals.  The same arguments and seed
+                result in the same bank.
+        """
+        if difficulty is None:
+            difficulty = GOAL_DIFFICULTY
+
+        times = np.array(
+            get_goal_start_times(first_goal_duration, goal_duration)
+        )
+        positions, orientations = move_cube.sample_goals(
+            difficulty,
+            size * len(times),
+            random_state=np.random.RandomState(seed),
+        )
+
+        return cls(
+            times,
+            positions.reshape(size, len(times), 3),
+            orientations.reshape(size, len(times), 4),
+            difficulty,
+        )
+
+    def save(self, directory: str):
+        """Save the bank to the given directory (which must not exist).
+
+        The directory is written under a temporary name first and renamed
+        when complete, so concurrent processes either see a complete bank or
+        none.
+        """
+        directory = os.path.abspath(directory)
+        tmp_directory = tempfile.mkdtemp(
+            prefix=os.path.basename(directory) + ".",
+            dir=os.path.dirname(directory),
+        )
+        try:
+            for name in self._ARRAY_FILES:
+                np.save(
+                    os.path.join(tmp_directory, name + ".npy"),
+                    getattr(self, name),
+                )
+            with open(os.path.join(tmp_directory, self._INFO_FILE), "w") as f:
+                json.dump({"difficulty": self.difficulty}, f)
+
+            os.rename(tmp_directory, directory)
+        except BaseException:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(
+        cls, directory: str, mmap_mode: str = "r"
+    ) -> "GoalTrajectoryBank":
+        """Load a bank saved with :meth:`save`.
+
+        Args:
+            directory:  Directory of the bank.
+            mmap_mode:  Memory-map mode of the arrays (see
+                :func:`numpy.load`).  Set to None to load them into memory.
+        """
+        with open(os.path.join(directory, cls._INFO_FILE), "r") as f:
+            info = json.load(f)
+        arrays = [
+            np.load(
+                os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode
+            )
+            for name in cls._ARRAY_FILES
+        ]
+
+        return cls(*arrays, difficulty=info["difficulty"])
+
+    @classmethod
+    def load_or_generate(
+        cls, directory: str, size: int, **kwargs
+    ) -> "GoalTrajectoryBank":
+        """Load the bank from directory or generate and save it there first.
+
+        Keyword arguments are passed to :meth:`generate`.  Note that they are
+        not compared to the ones of an existing bank.
+        """
+        if not os.path.isdir(directory):
+            try:
+                cls.generate(size, **kwargs).save(directory)
+            except OSError:
+                # another process saved the bank in the meantime
+                if not os.path.isdir(directory):
+                    raise
+
+        return cls.load(directory)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index: int) -> Trajectory:
+        """Get the trajectory with the given index."""
+        return [
+            (
+                int(t),
+                move_cube.Pose(
+                    np.array(self.positions[index, i]),
+                    np.array(self.orientations[index, i]),
+                ),
+            )
+            for i, t in enumerate(self.times)
+        ]
+
+    def sample(self, random_state=None) -> Trajectory:
+        """Get a random trajectory of the bank.
+
+        Args:
+            random_state (np.random.RandomState):  Random number generator.
+                If not set, the one of :mod:`move_cube` is used (see
+                :func:`seed`).
+        """
+        if random_state is None:
+            random_state = move_cube.random
+
+        return self[random_state.randint(len(self))]
 
 
 def validate_goal(trajectory: Trajectory):
@@ -13,18 +13,27 @@ states.
 
 For each step the reward is computed.  The cumulative reward over all steps is
 printed in the end.
+
+Logs in the chunked format of :mod:`trifinger_simulation.action_log` are
+detected automatically.  They are read incrementally and verified chunk by
+chunk (see :func:`replay_chunked_action_log`).
 """
 import argparse
 import json
 import pickle
 import sys
+import typing
+
 import numpy as np
 
-from trifinger_simulation import trifinger_platform
+from trifinger_simulation import action_log, trifinger_platform
 from trifinger_simulation.tasks import move_cube_on_trajectory as mct
 
 
 def replay_action_log(logfile: str, trajectory: mct.Trajectory) -> float:
+    if action_log.is_chunked_action_log(logfile):
+        return replay_chunked_action_log(logfile, trajectory)
+
     with open(logfile, "rb") as fh:
         log = pickle.load(fh)
 
@@ -155,6 +164,118 @@ def replay_action_log(logfile: str, trajectory: mct.Trajectory) -> float:
     return accumulated_reward
 
 
+def replay_chunked_action_log(
+    logfile: str, trajectory: mct.Trajectory
+) -> float:
+    """Replay and verify an action log in the chunked format.
+
+    Same as :func:`replay_action_log` but the log is streamed from the file
+    and the replayed states are compared chunk-wise.  The first diverging
+    step is reported.
+
+    Args:
+        logfile:  Path to the chunked action log.
+        trajectory:  Goal trajectory used for the reward computation.
+
+    Returns:
+        The accumulated reward.
+    """
+    reader = action_log.ActionLogReader(logfile)
+
+    # initialize cube at the centre
+    initial_object_pose = mct.move_cube.Pose(
+        position=mct.INITIAL_CUBE_POSITION
+    )
+
+    platform = trifinger_platform.TriFingerPlatform(
+        visualization=False,
+        initial_object_pose=initial_object_pose,
+        enable_action_log=False,
+    )
+
+    # verify that the robot is initialized to the same position as in the log
+    # file
+    initial_robot_position = platform.get_robot_observation(0).position
+    if not np.array_equal(
+        initial_robot_position, reader.initial_robot_position
+    ):
+        reader.close()
+        print("Failed.", file=sys.stderr)
+        print(
+            "Initial robot position does not match with log file.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    def reward_fn(t, cube_position):
+        return -mct.evaluate_state(trajectory, t, cube_position)
+
+    accumulated_reward, n_actions = action_log.verify_replay(
+        reader, platform, reward_fn
+    )
+
+    # verify that the number of logged actions matches with the episode length
+    assert (
+        n_actions == mct.EPISODE_LENGTH
+    ), "Number of actions in log does not match with expected episode length."
+
+    if reader.final_object_pose is None:
+        print("Failed.", file=sys.stderr)
+        print(
+            "Log file has no final object pose (it may be truncated).",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    t = platform.get_current_timeindex()
+    camera_obs = platform.get_camera_observation(t)
+    assert isinstance(
+        camera_obs, trifinger_platform.TriCameraObjectObservation
+    )
+    cube_pose = camera_obs.object_pose
+    final_pose = reader.final_object_pose["pose"]
+
+    print("Accumulated Reward:", accumulated_reward)
+
+    # verify that actual and logged final object pose match
+    if not (
+        np.array_equal(cube_pose.position, final_pose.position)
+        and np.array_equal(cube_pose.orientation, final_pose.orientation)
+    ):
+        print("Failed.", file=sys.stderr)
+        print(
+            "Recorded object pose does not match with the one achieved by the"
+            " replay",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    print("Passed.")
+
+    return accumulated_reward
+
+
+def replay_action_logs(
+    jobs: typing.Sequence[typing.Tuple[str, mct.Trajectory]],
+    n_processes: int = None,
+) -> list:
+    """Replay and verify multiple action logs in parallel.
+
+    Each log is replayed in its own worker process with a separate simulation.
+
+    Args:
+        jobs:  List of ``(logfile, trajectory)`` tuples.
+        n_processes:  Number of worker processes.  Defaults to the number of
+            CPUs.
+
+    Returns:
+        List with the accumulated reward of each log, in the order of
+        ``jobs``.  For logs that failed verification, the exception is
+        returned instead.
+    """
+    return action_log.map_parallel(replay_action_log, jobs, n_processes)
+
+
 def add_arguments(parser):
     parser.add_argument(
         "--logfile",
@@ -22,8 +22,11 @@ by :data:`EPISODE_LENGTH`.
 
 The cost of each step is computed using the camera images.  Based on the
 colour, it is determined how many "die pixels" are outside of the target
-regions (see :func:`evaluate_state`).
+regions (see :func:`evaluate_state`).  For computing it in every step, the
+masks can be stored as packed bits (see :func:`pack_masks`,
+:func:`evaluate_state_packed` and :class:`GoalMaskCache`).
 """
+import collections
 import itertools
 import json
 import random
@@ -283,6 +286,70 @@ def evaluate_state(
     return num_outside_pixels
 
 
+if hasattr(np, "bitwise_count"):
+
+    def _popcount(packed: np.ndarray) -> int:
+        """Number of set bits in the given uint8 array."""
+        return int(np.bitwise_count(packed).sum())
+
+else:
+    _POPCOUNT_TABLE = np.array(
+        [bin(i).count("1") for i in range(256)], dtype=np.uint8
+    )
+
+    def _popcount(packed: np.ndarray) -> int:
+        """Number of set bits in the given uint8 array."""
+        return int(_POPCOUNT_TABLE[packed].sum(dtype=np.int64))
+
+
+def pack_masks(
+    masks: typing.Sequence[np.ndarray], downsample: int = 1
+) -> typing.List[np.ndarray]:
+    """Pack masks into bits for use with :func:`evaluate_state_packed`.
+
+    Every non-zero pixel of a mask corresponds to a set bit.
+
+    Args:
+        masks: Single-channel masks (e.g. one per camera).
+        downsample: If greater than one, only every ``downsample``-th pixel
+            of each row and column is kept.
+
+    Returns:
+        List of flat uint8 arrays with eight pixels per element.
+    """
+    return [
+        np.packbits(np.asarray(mask)[::downsample, ::downsample] != 0)
+        for mask in masks
+    ]
+
+
+def evaluate_state_packed(
+    goal_masks: typing.Sequence[np.ndarray],
+    actual_masks: typing.Sequence[np.ndarray],
+    downsample: int = 1,
+) -> int:
+    """Compute the cost of :func:`evaluate_state` on packed masks.
+
+    Args:
+        goal_masks: Goal masks packed with :func:`pack_masks`.
+        actual_masks: Actual masks packed with :func:`pack_masks` (using the
+            same ``downsample`` as the goal masks).
+        downsample: The ``downsample`` used for packing the masks.  The
+            number of pixels is scaled by ``downsample**2``, so that the cost
+            stays comparable to the one of the full-resolution masks.
+
+    Returns:
+        The cost of the given state.  Same as :func:`evaluate_state` of the
+        unpacked masks if ``downsample`` is one, an approximation of it
+        otherwise.
+    """
+    num_outside_pixels = 0
+    for goal, actual in zip(goal_masks, actual_masks):
+        num_outside_pixels += _popcount(np.bitwise_and(actual, ~goal))
+
+    return num_outside_pixels * downsample ** 2
+
+
 def visualize_2d(target_positions: Goal):
     """Visualise the target positions in 2d.
 
@@ -337,6 +404,9 @@ def generate_goal_mask(
         List of masks.  The number and order of masks corresponds to the input
         ``camera_parameters``.
     """
+    corners = np.concatenate([_get_cell_corners_3d(pos) for pos in goal])
+    face_corners = np.asarray(FACE_CORNERS)
+
     masks = []
     for cam in camera_parameters:
         mask = np.zeros((cam.height, cam.width), dtype=np.uint8)
@@ -346,26 +416,75 @@ def generate_goal_mask(
         rmat = cam.tf_world_to_camera[:3, :3]
         rvec = Rotation.from_matrix(rmat).as_rotvec()
 
-        for pos in goal:
-            corners = _get_cell_corners_3d(pos)
-
-            # project corner points into the image
-            projected_corners, _ = cv2.projectPoints(
-                corners,
-                rvec,
-                tvec,
-                cam.camera_matrix,
-                cam.distortion_coefficients,
-            )
+        # project the corner points of all dice into the image at once
+        projected_corners, _ = cv2.projectPoints(
+            corners,
+            rvec,
+            tvec,
+            cam.camera_matrix,
+            cam.distortion_coefficients,
+        )
+        # shape (n_dice, 8, 1, 2)
+        projected_corners = projected_corners.reshape(len(goal), 8, 1, 2)
 
-            # draw faces in mask
-            for face_corner_idx in FACE_CORNERS:
-                points = np.array(
-                    [projected_corners[i] for i in face_corner_idx],
-                    dtype=np.int32,
-                )
+        # draw faces in mask
+        for die_corners in projected_corners:
+            for points in die_corners[face_corners].astype(np.int32):
                 mask = cv2.fillConvexPoly(mask, points, 255)
 
         masks.append(mask)
 
     return masks
+
+
+class GoalMaskCache:
+    """Goal masks of the most recently used goals.
+
+    Generating the goal masks (see :func:`generate_goal_mask`) requires
+    rendering all dice for all cameras, so they are only generated once per
+    goal and kept together with their packed version (see
+    :func:`pack_masks`).
+    """
+
+    def __init__(
+        self,
+        camera_parameters: typing.Sequence[camera.CameraParameters],
+        downsample: int = 1,
+        max_size: int = 8,
+    ):
+        """
+        Args:
+            camera_parameters: List of camera parameters, one per camera.
+            downsample: ``downsample`` used for packing the masks.
+            max_size: Maximum number of goals for which the masks are kept.
+        """
+        self.camera_parameters = camera_parameters
+        self.downsample = downsample
+        self.max_size = max_size
+        self._cache: typing.OrderedDict[
+            str, typing.Tuple[typing.List[np.ndarray], typing.List[np.ndarray]]
+        ] = collections.OrderedDict()
+
+    def get(
+        self, goal: Goal
+    ) -> typing.Tuple[typing.List[np.ndarray], typing.List[np.ndarray]]:
+        """Get the goal masks of the given goal.
+
+        Returns:
+            Tuple ``(masks, packed_masks)`` with the output of
+            :func:`generate_goal_mask` and its packed version.
+        """
+        key = goal_to_json(goal)
+        try:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        masks = generate_goal_mask(self.camera_parameters, goal)
+        entry = (masks, pack_masks(masks, self.downsample))
+        self._cache[key] = entry
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+        return entry
@@ -8,7 +8,7 @@ import typing
 
 from .tasks import move_cube, rearrange_dice
 from .sim_finger import SimFinger, int_to_rgba
-from . import camera, collision_objects, trifingerpro_limits
+from . import action_log, camera, collision_objects, trifingerpro_limits
 
 
 class ObjectType(enum.Enum):
@@ -134,7 +134,8 @@ class TriFingerPlatform:
         enable_cameras: bool = False,
         time_step_s: float = 0.001,
         object_type: ObjectType = ObjectType.COLORED_CUBE,
-        cube_scale=1
+        cube_scale=1,
+        enable_action_log: bool = True,
     ):
         """Initialize.
 
@@ -155,6 +156,10 @@ class TriFingerPlatform:
             object_type:  Which type of object to load.  This also influences
                 some other aspects: When using the cube, the camera observation
                 will contain an attribute ``object_pose``.
+            enable_action_log:  Set to false to not record the action log.
+                This saves a deep copy of action and observations in every
+                step (e.g. when replaying an existing log) but
+                :meth:`store_action_log` cannot be used then.
         """
         #: Camera rate in frames per second.  Observations of camera and
         #: object pose will only be updated with this rate.
@@ -234,6 +239,7 @@ class TriFingerPlatform:
 
         # Initialize log
         # ==============
+        self._enable_action_log = enable_action_log
         self._action_log = {
             "initial_robot_position": copy.copy(initial_robot_position),
             "initial_object_pose": copy.copy(initial_object_pose),
@@ -258,6 +264,85 @@ class TriFingerPlatform:
         Arguments/return value are the same as for
         :meth:`pybullet.SimFinger.append_desired_action`.
         """
+        has_camera_update = self._update_camera_observation()
+
+        t = self.simfinger.append_desired_action(action)
+
+        if has_camera_update:
+            self._set_camera_observation_timestamp(t)
+
+        if self._enable_action_log:
+            self._log_action(t, action)
+
+        return t
+
+    def step_many(self, action, n, reward_fn=None):
+        """Apply the same action for ``n`` consecutive time steps.
+
+        This is equivalent to calling :meth:`append_desired_action` ``n``
+        times with ``action`` (time indices, camera updates and action log
+        behave the same) but avoids a round trip through the caller per time
+        step.  Only what changes from step to step is updated in the loop:
+        the torques of the controller (for position actions and the safety
+        damping) and, with the camera rate, the camera observation.
+
+        Args:
+            action: The action that is applied in all steps.
+            n: Number of time steps.  Has to be at least one.
+            reward_fn: Optional function ``reward_fn(t, camera_observation)``
+                which is called after each step with its time index and
+                camera observation.  Its return values (scalars or arrays)
+                are summed over all steps.
+
+        Returns:
+            tuple: ``(t, robot_observation, camera_observation, reward_sum)``
+            with the time index of the last step, the observations returned
+            by :meth:`get_robot_observation` and
+            :meth:`get_camera_observation` for it and the sum of the outputs
+            of ``reward_fn`` (None if ``reward_fn`` is not set).
+
+        Raises:
+            ValueError: If ``n`` is less than one.
+        """
+        if n < 1:
+            raise ValueError("Number of steps has to be at least one.")
+
+        reward_sum = None
+        for _ in range(n):
+            has_camera_update = self._update_camera_observation()
+
+            t = self.simfinger.append_desired_action(action)
+
+            if has_camera_update:
+                self._set_camera_observation_timestamp(t)
+
+            if self._enable_action_log:
+                self._log_action(t, action)
+
+            if reward_fn is not None:
+                reward = np.asarray(
+                    reward_fn(t, self._camera_observation_t), dtype=float
+                )
+                if reward_sum is None:
+                    reward_sum = reward
+                else:
+                    reward_sum = reward_sum + reward
+
+        return (
+            t,
+            self.get_robot_observation(t),
+            self._camera_observation_t,
+            reward_sum,
+        )
+
+    def _update_camera_observation(self):
+        """Update camera and object observation if the camera rate is due.
+
+        Returns:
+            bool: True if the observation was updated.  In this case its
+            timestamp still needs to be set once the time index of the step
+            is known (see :meth:`_set_camera_observation_timestamp`).
+        """
         # update camera and object observations only with the rate of the
         # cameras
         next_t = self.simfinger._t + 1
@@ -268,25 +353,26 @@ class TriFingerPlatform:
             )
             self._camera_observation_t = self._get_current_camera_observation()
 
-        t = self.simfinger.append_desired_action(action)
+        return has_camera_update
 
+    def _set_camera_observation_timestamp(self, t):
         # The correct timestamp can only be acquired now that t is given.
         # Update it accordingly in the object and camera observations
-        if has_camera_update:
-            camera_timestamp_s = self.get_timestamp_ms(t) / 1000
-            for i in range(len(self._camera_observation_t.cameras)):
-                self._camera_observation_t.cameras[
-                    i
-                ].timestamp = camera_timestamp_s
-
-            if self._has_object_tracking:
-                self._camera_observation_t.object_pose.timestamp = (
-                    camera_timestamp_s
-                )
-                self._camera_observation_t.filtered_object_pose.timestamp = (
-                    camera_timestamp_s
-                )
+        camera_timestamp_s = self.get_timestamp_ms(t) / 1000
+        for i in range(len(self._camera_observation_t.cameras)):
+            self._camera_observation_t.cameras[
+                i
+            ].timestamp = camera_timestamp_s
 
+        if self._has_object_tracking:
+            self._camera_observation_t.object_pose.timestamp = (
+                camera_timestamp_s
+            )
+            self._camera_observation_t.filtered_object_pose.timestamp = (
+                camera_timestamp_s
+            )
+
+    def _log_action(self, t, action):
         # write the desired action to the log
         camera_obs = self.get_camera_observation(t)
         robot_obs = self.get_robot_observation(t)
@@ -300,8 +386,6 @@ class TriFingerPlatform:
         # make a deep copy of log_entry to ensure all reference ties are cut
         self._action_log["actions"].append(copy.deepcopy(log_entry))
 
-        return t
-
     def _get_current_object_pose(self):
         assert self._has_object_tracking
 
@@ -378,13 +462,22 @@ class TriFingerPlatform:
                 " step or the next one."
             )
 
-    def store_action_log(self, filename):
+    def store_action_log(self, filename, chunk_size=None):
         """Store the action log to a JSON file.
 
         Args:
             filename (str):  Path to the JSON file to which the log shall be
                 written.  If the file exists already, it will be overwritten.
+            chunk_size (int):  If set, the log is written in the chunked
+                format of :mod:`trifinger_simulation.action_log` with the
+                given number of steps per chunk.  Logs in this format can be
+                verified incrementally during replay.
         """
+        if not self._enable_action_log:
+            raise RuntimeError(
+                "Action log is disabled for this TriFingerPlatform instance."
+            )
+
         t = self.get_current_timeindex()
         camera_obs = self.get_camera_observation(t)
 
@@ -394,5 +487,11 @@ class TriFingerPlatform:
                 "pose": camera_obs.object_pose,
             }
 
+        if chunk_size is not None:
+            action_log.write_chunked_action_log(
+                self._action_log, filename, chunk_size
+            )
+            return
+
         with open(filename, "wb") as fh:
             pickle.dump(self._action_log, fh)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import numpy as np
+import pytest
+
+from trifinger_simulation import TriFingerPlatform, action_log
+
+
+def run_platform(n_steps, seed=0):
+    rng = np.random.RandomState(seed)
+    platform = TriFingerPlatform(visualization=False)
+    for _ in range(n_steps):
+        torque = rng.uniform(-0.1, 0.1, size=9)
+        platform.append_desired_action(platform.Action(torque=torque))
+    return platform
+
+
+def test_write_and_read_chunks(tmpdir):
+    n_steps = 25
+    platform = run_platform(n_steps)
+    logfile = str(tmpdir / "action_log.p")
+    platform.store_action_log(logfile, chunk_size=10)
+
+    assert action_log.is_chunked_action_log(logfile)
+
+    reader = action_log.ActionLogReader(logfile)
+    assert reader.has_object_pose
+    chunks = list(reader.chunks())
+    assert [len(c["t"]) for c in chunks] == [10, 10, 5]
+
+    logged = platform._action_log["actions"]
+    t = np.concatenate([c["t"] for c in chunks])
+    np.testing.assert_array_equal(t, [e["t"] for e in logged])
+    robot_position = np.concatenate([c["robot_position"] for c in chunks])
+    np.testing.assert_array_equal(
+        robot_position, [e["robot_observation"].position for e in logged]
+    )
+    assert reader.final_object_pose["t"] == n_steps - 1
+
+
+def test_legacy_log_is_not_chunked(tmpdir):
+    platform = run_platform(3)
+    logfile = str(tmpdir / "action_log.p")
+    platform.store_action_log(logfile)
+
+    assert not action_log.is_chunked_action_log(logfile)
+
+
+def test_unsupported_version(tmpdir):
+    platform = run_platform(3)
+    logfile = str(tmpdir / "action_log.p")
+    platform.store_action_log(logfile, chunk_size=10)
+
+    with open(logfile, "rb") as fh:
+        data = fh.read()
+    assert data.startswith(action_log.MAGIC)
+    n = len(action_log.MAGIC)
+    with open(logfile, "wb") as fh:
+        fh.write(data[:n] + b"\xff\xff" + data[n + 2 :])
+
+    assert action_log.is_chunked_action_log(logfile)
+    with pytest.raises(ValueError):
+        action_log.ActionLogReader(logfile)
+
+
+def test_verify_replay(tmpdir):
+    platform = run_platform(30)
+    logfile = str(tmpdir / "action_log.p")
+    platform.store_action_log(logfile, chunk_size=8)
+
+    reader = action_log.ActionLogReader(logfile)
+    replay_platform = TriFingerPlatform(
+        visualization=False, enable_action_log=False
+    )
+    reward, n_steps = action_log.verify_replay(
+        reader, replay_platform, lambda t, position: 1.0
+    )
+    assert n_steps == 30
+    assert reward == 30.0
+
+
+def test_verify_replay_reports_first_divergence(tmpdir):
+    platform = run_platform(30)
+    # manipulate one logged step
+    platform._action_log["actions"][17]["robot_observation"].torque[2] += 1
+    platform._action_log["actions"][21]["object_pose"].position[0] += 1
+    logfile = str(tmpdir / "action_log.p")
+    platform.store_action_log(logfile, chunk_size=8)
+
+    reader = action_log.ActionLogReader(logfile)
+    replay_platform = TriFingerPlatform(
+        visualization=False, enable_action_log=False
+    )
+    with pytest.raises(action_log.ReplayDivergence) as e:
+        action_log.verify_replay(reader, replay_platform)
+
+    assert e.value.t == 17
+    assert e.value.column == "robot_torque"
+
+
+def test_disabled_action_log():
+    platform = TriFingerPlatform(visualization=False, enable_action_log=False)
+    platform.append_desired_action(platform.Action())
+
+    with pytest.raises(RuntimeError):
+        platform.store_action_log("/dev/null")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import pickle
+
+import numpy as np
+import pytest
+
+from trifinger_simulation.gym_wrapper.data_logger import (
+    DataLogger,
+    EpisodeData,
+    EpisodeFile,
+)
+
+
+def log_episodes(logger, n_episodes, n_steps, seed=0):
+    rng = np.random.RandomState(seed)
+    expected = []
+    for _ in range(n_episodes):
+        joint_goal = rng.uniform(size=9)
+        tip_goal = [rng.uniform(size=3) for _ in range(3)]
+        logger.new_episode(joint_goal, tip_goal)
+        joint_positions = rng.uniform(size=(n_steps, 9))
+        tip_positions = rng.uniform(size=(n_steps, 3, 3))
+        timestamps = np.arange(n_steps) * 0.001
+        for q, tips, t in zip(joint_positions, tip_positions, timestamps):
+            logger.append(q, list(tips), t)
+        expected.append(
+            {
+                "joint_goal": joint_goal,
+                "tip_goal": np.array(tip_goal),
+                "joint_positions": joint_positions,
+                "tip_positions": tip_positions.reshape(n_steps, 9),
+                "timestamps": timestamps,
+            }
+        )
+    return expected
+
+
+def assert_episode_equal(episode, expected):
+    assert episode.keys() == expected.keys()
+    for name, value in expected.items():
+        np.testing.assert_array_equal(episode[name], value)
+
+
+def test_episode_data_grows():
+    episode = EpisodeData(np.zeros(9), np.zeros(9), capacity=4)
+    for i in range(10):
+        episode.append(np.full(9, i), np.full(9, -i), i * 0.1)
+
+    assert len(episode) == 10
+    assert episode.joint_positions.shape == (10, 9)
+    np.testing.assert_array_equal(episode.joint_positions[:, 0], range(10))
+    np.testing.assert_array_equal(episode.tip_positions[:, 0], -np.arange(10))
+    np.testing.assert_allclose(episode.timestamps, np.arange(10) * 0.1)
+
+
+def test_store_in_memory(tmpdir):
+    logger = DataLogger()
+    expected = log_episodes(logger, 3, 20)
+    logfile = str(tmpdir / "episodes.p")
+    logger.store(logfile)
+
+    # like before, the last (unfinished) episode is not stored
+    with open(logfile, "rb") as fh:
+        episodes = pickle.load(fh)
+    assert len(episodes) == 2
+    for episode, expected_episode in zip(episodes, expected):
+        assert_episode_equal(episode, expected_episode)
+
+
+def test_write_episode_file(tmpdir):
+    logfile = str(tmpdir / "episodes.npy")
+    with DataLogger(logfile, max_queued_episodes=1) as logger:
+        expected = log_episodes(logger, 5, 2000)
+        # completed episodes are not kept in memory
+        assert logger.episodes == []
+        with pytest.raises(RuntimeError):
+            logger.store(str(tmpdir / "episodes.p"))
+
+    episodes = EpisodeFile(logfile)
+    assert len(episodes) == 5
+    for episode, expected_episode in zip(episodes, expected):
+        assert_episode_equal(episode, expected_episode)
+    assert_episode_equal(episodes[-1], expected[-1])
+    with pytest.raises(IndexError):
+        episodes[5]
+
+
+def test_append_to_episode_file(tmpdir):
+    logfile = str(tmpdir / "episodes.npy")
+    expected = []
+    for seed in range(2):
+        with DataLogger(logfile) as logger:
+            expected += log_episodes(logger, 2, 10, seed=seed)
+        # an empty episode is written as well
+        with DataLogger(logfile) as logger:
+            logger.new_episode(np.zeros(9), np.zeros(9))
+
+    episodes = EpisodeFile(logfile)
+    assert len(episodes) == 6
+    assert_episode_equal(episodes[0], expected[0])
+    assert_episode_equal(episodes[3], expected[2])
+    assert episodes[2]["joint_positions"].shape == (0, 0)
+    assert episodes[2]["timestamps"].shape == (0,)
+
+
+def test_incomplete_episode_file(tmpdir):
+    logfile = str(tmpdir / "episodes.npy")
+    with DataLogger(logfile) as logger:
+        log_episodes(logger, 1, 10)
+    with open(logfile, "ab") as fh:
+        np.lib.format.write_array(fh, np.zeros(9))
+
+    with pytest.raises(ValueError):
+        EpisodeFile(logfile)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import unittest
+import numpy as np
+
+import pybullet
+
+from trifinger_simulation.sim_finger import SimFinger
+from trifinger_simulation import collision_objects, trifingerpro_limits
+
+
+class TestSimFingerState(unittest.TestCase):
+    """Test that the state read once per tick is served consistently."""
+
+    def setUp(self):
+        self.finger = SimFinger(finger_type="trifingerpro")
+
+    def test_applied_torque_matches_observation(self):
+        """The PD/safety torques are computed from the observed state."""
+        finger = self.finger
+        target = trifingerpro_limits.robot_position.default + 0.3
+        action = finger.Action(torque=[0.05] * 9, position=target)
+
+        for _ in range(50):
+            t = finger.append_desired_action(action)
+            observation = finger.get_observation(t)
+            applied_action = finger.get_applied_action(t)
+
+            expected = action.torque + (
+                finger.position_gains * (target - observation.position)
+                - finger.velocity_gains * observation.velocity
+            )
+            expected = np.clip(
+                expected, -finger.max_motor_torque, finger.max_motor_torque
+            )
+            expected -= finger.safety_kd * observation.velocity
+            expected = np.clip(
+                expected, -finger.max_motor_torque, finger.max_motor_torque
+            )
+
+            np.testing.assert_array_almost_equal(
+                applied_action.torque, expected
+            )
+            np.testing.assert_array_equal(
+                observation.torque, applied_action.torque
+            )
+
+    def test_observation_is_not_overwritten(self):
+        """Observations do not share memory with the per-tick state."""
+        finger = self.finger
+        action = finger.Action(torque=[0.2] * 9)
+
+        t = finger.append_desired_action(action)
+        first = finger.get_observation(t)
+        position = first.position.copy()
+        velocity = first.velocity.copy()
+        for _ in range(10):
+            t = finger.append_desired_action(action)
+            finger.get_observation(t + 1)
+
+        np.testing.assert_array_equal(first.position, position)
+        np.testing.assert_array_equal(first.velocity, velocity)
+
+    def test_tip_force_matches_per_tip_contacts(self):
+        """The single contact query gives the same forces as one per tip."""
+        finger = self.finger
+        finger.reset_finger_positions_and_velocities(
+            trifingerpro_limits.robot_position.default
+        )
+        # static plate a bit below the tips, onto which the fingers fall
+        tip_z = min(
+            tip[2]
+            for tip in finger.kinematics.forward_kinematics(
+                trifingerpro_limits.robot_position.default
+            )
+        )
+        collision_objects.Cuboid(
+            position=(0, 0, tip_z - 0.025),
+            orientation=(0, 0, 0, 1),
+            half_extents=(0.2, 0.2, 0.005),
+            mass=0,
+            pybullet_client_id=finger._pybullet_client_id,
+        )
+        action = finger.Action()
+
+        tip_force_seen = False
+        for _ in range(500):
+            t = finger.append_desired_action(action)
+            observation = finger.get_observation(t + 1)
+
+            expected = np.array(
+                [
+                    sum(
+                        contact[9]
+                        for contact in pybullet.getContactPoints(
+                            bodyA=finger.finger_id,
+                            linkIndexA=tip,
+                            physicsClientId=finger._pybullet_client_id,
+                        )
+                    )
+                    for tip in finger.pybullet_tip_link_indices
+                ]
+            )
+            expected = np.clip(expected / 5.0 + 0.05, 0.0, 1.0)
+            np.testing.assert_array_almost_equal(
+                observation.tip_force, expected
+            )
+            tip_force_seen |= np.any(expected > 0.05)
+
+        self.assertTrue(tip_force_seen)
+
+
+if __name__ == "__main__":
+    unittest.main()
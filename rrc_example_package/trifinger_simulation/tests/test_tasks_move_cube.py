@@ -167,6 +167,39 @@ def test_sample_goal_difficulty_4_no_initial_pose():
         assert goal.position[2] >= move_cube._min_height
 
 
+@pytest.mark.parametrize("difficulty", [-1, 1, 2, 3, 4])
+def test_sample_goals(difficulty):
+    positions, orientations = move_cube.sample_goals(
+        difficulty, 1000, random_state=np.random.RandomState(42)
+    )
+    assert positions.shape == (1000, 3)
+    assert orientations.shape == (1000, 4)
+
+    for position, orientation in zip(positions, orientations):
+        try:
+            move_cube.validate_goal(move_cube.Pose(position, orientation))
+        except move_cube.InvalidGoalError as e:
+            pytest.fail(
+                msg="Invalid goal: {}  pose is {}, {}".format(
+                    e, e.position, e.orientation
+                ),
+            )
+
+    # same range of heights as the goals of sample_goal
+    heights = [
+        move_cube.sample_goal(difficulty).position[2] for _ in range(1000)
+    ]
+    assert positions[:, 2].min() >= min(heights) - 0.01
+    assert positions[:, 2].max() <= max(heights) + 0.01
+
+    # the same seed results in the same goals
+    positions2, orientations2 = move_cube.sample_goals(
+        difficulty, 1000, random_state=np.random.RandomState(42)
+    )
+    np.testing.assert_array_equal(positions, positions2)
+    np.testing.assert_array_equal(orientations, orientations2)
+
+
 def test_evaluate_state_difficulty_1():
     difficulty = 1
     pose_origin = move_cube.Pose()
@@ -26,6 +26,86 @@ def test_validate_sampling():
             pytest.fail(f"Unexpected error {e} for trajectory {traj}")
 
 
+def test_sample_goal_arguments():
+    difficulty = mct.GOAL_DIFFICULTY
+    traj = mct.sample_goal(
+        difficulty=4, first_goal_duration=3000, goal_duration=1000
+    )
+
+    # the module defaults are not modified
+    assert mct.GOAL_DIFFICULTY == difficulty
+    assert [t for t, _ in traj] == mct.get_goal_start_times(3000, 1000)
+    assert [t for t, _ in traj[:3]] == [0, 3000, 4000]
+    assert traj[-1][0] < mct.EPISODE_LENGTH
+    # difficulty 4 goals have an orientation
+    assert any(
+        not np.array_equal(goal.orientation, [0, 0, 0, 1]) for _, goal in traj
+    )
+
+
+def test_goal_trajectory_bank():
+    bank = mct.GoalTrajectoryBank.generate(
+        50,
+        difficulty=3,
+        first_goal_duration=30000,
+        goal_duration=20000,
+        seed=1,
+    )
+    assert len(bank) == 50
+    assert bank.difficulty == 3
+
+    times = mct.get_goal_start_times(30000, 20000)
+    for i in range(len(bank)):
+        traj = bank[i]
+        assert [t for t, _ in traj] == times
+        mct.validate_goal([(t, goal.position) for t, goal in traj])
+
+    # same seed, same bank
+    bank2 = mct.GoalTrajectoryBank.generate(
+        50,
+        difficulty=3,
+        first_goal_duration=30000,
+        goal_duration=20000,
+        seed=1,
+    )
+    np.testing.assert_array_equal(bank.positions, bank2.positions)
+
+    # sampling is reproducible with a seeded random state
+    traj1 = bank.sample(np.random.RandomState(5))
+    traj2 = bank.sample(np.random.RandomState(5))
+    for (t1, goal1), (t2, goal2) in zip(traj1, traj2):
+        assert t1 == t2
+        np.testing.assert_array_equal(goal1.position, goal2.position)
+
+
+def test_goal_trajectory_bank_save_load(tmp_path):
+    directory = tmp_path / "bank"
+    bank = mct.GoalTrajectoryBank.load_or_generate(
+        str(directory), 20, difficulty=4, seed=0
+    )
+    assert directory.is_dir()
+    # only the bank is left in tmp_path (no temporary directories)
+    assert list(tmp_path.iterdir()) == [directory]
+
+    loaded = mct.GoalTrajectoryBank.load(str(directory))
+    assert isinstance(loaded.positions, np.memmap)
+    assert loaded.difficulty == 4
+    np.testing.assert_array_equal(loaded.times, bank.times)
+    np.testing.assert_array_equal(loaded.positions, bank.positions)
+    np.testing.assert_array_equal(loaded.orientations, bank.orientations)
+
+    # an existing bank is loaded, not generated again
+    loaded = mct.GoalTrajectoryBank.load_or_generate(
+        str(directory), 20, difficulty=4, seed=1
+    )
+    np.testing.assert_array_equal(loaded.positions, bank.positions)
+
+    with pytest.raises(OSError):
+        bank.save(str(directory))
+    # the temporary directory of the failed save is removed
+    assert list(tmp_path.iterdir()) == [directory]
+
+
 def test_get_active_goal():
     traj = [
         (0, (0, 0, 0)),
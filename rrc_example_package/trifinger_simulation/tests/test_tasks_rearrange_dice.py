@@ -4,6 +4,7 @@ import pathlib
 
 import numpy as np
 
+from trifinger_simulation import camera as sim_camera
 from trifinger_simulation.tasks import rearrange_dice as task
 
 
@@ -265,3 +266,90 @@ def test_evaluate_state_value_255():
     cost = task.evaluate_state(goal, actual)
     # cost is number of actual pixels outside of goal
     assert cost == 4
+
+
+def test_evaluate_state_packed_value_255():
+    goal = [
+        np.array([[0, 0, 0], [0, 255, 255], [0, 255, 255]]),
+        np.array([[255, 255, 0], [255, 255, 0], [0, 0, 0]]),
+        np.array([[0, 255, 0], [255, 0, 255], [0, 255, 0]]),
+    ]
+    actual = [
+        np.array([[0, 0, 0], [255, 255, 0], [255, 255, 0]]),
+        np.array([[255, 255, 0], [255, 255, 0], [0, 0, 0]]),
+        np.array([[0, 0, 255], [0, 0, 255], [0, 0, 255]]),
+    ]
+
+    cost = task.evaluate_state_packed(
+        task.pack_masks(goal), task.pack_masks(actual)
+    )
+    assert cost == 4
+
+
+def test_evaluate_state_packed_random_masks():
+    # the packed cost is exactly the cost of the unpacked masks (including
+    # masks whose number of pixels is not a multiple of 8)
+    rng = np.random.default_rng(42)
+    for shape in [(270, 270), (37, 53)]:
+        for _ in range(10):
+            goal = [
+                rng.choice([0, 255], size=shape).astype(np.uint8)
+                for _ in range(3)
+            ]
+            actual = [
+                rng.choice([0, 255], size=shape).astype(np.uint8)
+                for _ in range(3)
+            ]
+
+            expected = task.evaluate_state(goal, actual)
+            cost = task.evaluate_state_packed(
+                task.pack_masks(goal), task.pack_masks(actual)
+            )
+            assert cost == expected
+
+
+def test_evaluate_state_packed_downsample():
+    # for masks consisting of 2x2 blocks, downsampling by 2 is exact
+    rng = np.random.default_rng(42)
+    block = np.ones((2, 2), dtype=np.uint8)
+    goal = [
+        np.kron(rng.choice([0, 255], size=(135, 135)), block)
+        for _ in range(3)
+    ]
+    actual = [
+        np.kron(rng.choice([0, 255], size=(135, 135)), block)
+        for _ in range(3)
+    ]
+
+    expected = task.evaluate_state(goal, actual)
+    cost = task.evaluate_state_packed(
+        task.pack_masks(goal, downsample=2),
+        task.pack_masks(actual, downsample=2),
+        downsample=2,
+    )
+    assert cost == expected
+
+
+def test_goal_mask_cache():
+    camera_params = sim_camera.load_camera_parameters(
+        pathlib.Path(__file__).parent / "test_camera", "camera{id}_full.yml"
+    )
+    cache = task.GoalMaskCache(camera_params, max_size=2)
+
+    goal = task.sample_goal()
+    masks, packed = cache.get(goal)
+
+    # same goal is served from the cache
+    assert cache.get(goal)[0] is masks
+    assert cache.get([tuple(pos) for pos in goal])[0] is masks
+
+    expected_masks = task.generate_goal_mask(camera_params, goal)
+    for mask, expected in zip(masks, expected_masks):
+        np.testing.assert_array_equal(mask, expected)
+    # the goal is exactly inside the goal masks
+    assert task.evaluate_state_packed(packed, task.pack_masks(masks)) == 0
+
+    # least recently used goals are dropped
+    cache.get(task.sample_goal())
+    cache.get(task.sample_goal())
+    assert cache.get(goal)[0] is not masks
@@ -100,3 +100,83 @@ def test_object_pose_observation():
     np.testing.assert_array_almost_equal(
         obs.filtered_object_pose.orientation, pose.orientation
     )
+
+
+def test_step_many_equals_append_desired_action():
+    platform_loop = TriFingerPlatform(visualization=False)
+    platform_many = TriFingerPlatform(visualization=False)
+    action = platform_loop.Action(
+        torque=[0.05] * 9,
+        position=platform_loop.spaces.robot_position.default + 0.2,
+    )
+
+    # cross a camera update and use two calls to check that the time index
+    # continues
+    for n in (150, 73):
+        for _ in range(n):
+            t_loop = platform_loop.append_desired_action(action)
+        t_many, robot_obs, camera_obs, reward = platform_many.step_many(
+            action, n
+        )
+
+        assert t_many == t_loop
+        assert platform_many.get_current_timeindex() == t_loop
+        assert reward is None
+
+        for t in (t_many, t_many + 1):
+            expected = platform_loop.get_robot_observation(t)
+            actual = platform_many.get_robot_observation(t)
+            np.testing.assert_array_equal(actual.position, expected.position)
+            np.testing.assert_array_equal(actual.velocity, expected.velocity)
+            np.testing.assert_array_equal(actual.torque, expected.torque)
+
+        np.testing.assert_array_equal(
+            robot_obs.position,
+            platform_loop.get_robot_observation(t_loop).position,
+        )
+        np.testing.assert_array_equal(
+            platform_many.get_applied_action(t_many).torque,
+            platform_loop.get_applied_action(t_loop).torque,
+        )
+
+        expected_camera_obs = platform_loop.get_camera_observation(t_loop)
+        assert camera_obs is platform_many.get_camera_observation(t_many)
+        assert (
+            camera_obs.cameras[0].timestamp
+            == expected_camera_obs.cameras[0].timestamp
+        )
+        np.testing.assert_array_equal(
+            camera_obs.object_pose.position,
+            expected_camera_obs.object_pose.position,
+        )
+        np.testing.assert_array_equal(
+            camera_obs.object_pose.orientation,
+            expected_camera_obs.object_pose.orientation,
+        )
+
+    assert len(platform_many._action_log["actions"]) == len(
+        platform_loop._action_log["actions"]
+    )
+
+
+def test_step_many_reward_fn():
+    platform = TriFingerPlatform(visualization=False)
+    action = platform.Action()
+    calls = []
+
+    def reward_fn(t, camera_observation):
+        assert camera_observation is platform.get_camera_observation(t)
+        calls.append(t)
+        return (1.0, t)
+
+    t, _, _, reward = platform.step_many(action, 20, reward_fn=reward_fn)
+
+    assert calls == list(range(20))
+    assert t == 19
+    np.testing.assert_array_equal(reward, [20, sum(range(20))])
+
+
+def test_step_many_invalid_n():
+    platform = TriFingerPlatform(visualization=False)
+    with pytest.raises(ValueError):
+        platform.step_many(platform.Action(), 0)